@@ -7,22 +7,341 @@ Licensed under MIT License with attribution requirements
 https://github.com/CodeQueenie/InspireSearch---AI_Powered_Visual_Search_Engine
 """
 import os
-from flask import Flask, render_template, request, redirect, url_for, flash, jsonify
+import time
+import hashlib
+import mimetypes
+import numpy as np
+from flask import (Flask, render_template, request, redirect, url_for, flash, jsonify, abort, Response, g,
+                   send_file)
 from werkzeug.utils import secure_filename
 from app.image_search import ImageSearch
-from app.utils import allowed_file, save_uploaded_file, get_relative_path
+from app.sharded_search import ShardedImageSearch
+from app.sharding import read_layout
+from app.embedding_cache import EmbeddingCache
+from app.request_coalescer import QueryCoalescer, QueueFullError
+from app.query_store import QueryImageStore
+from app.index_versions import BackgroundIndexBuilder
+from app.dataset_watcher import DatasetWatcher
+from app.facets import SearchFilter
+from app.dataset_sources import is_archive_locator, split_locator
+from app.embedding_backends import configure_threads
+from app.thumbnails import THUMBNAIL_SIZES
+from app.metrics import REGISTRY, CONTENT_TYPE, stage, count_error, start_trace, end_trace
+from app.query_fusion import COMBINE_MODES, combine_embeddings
+from app.utils import allowed_file, get_relative_path, similarity_scores, parse_box
 
 # Initialize Flask app
 app = Flask(__name__)
 app.secret_key = os.urandom(24)
-app.config["UPLOAD_FOLDER"] = "static/uploads"
+app.config["DATASET"] = "static/dataset"  # Image directory, tar/zip archive, glob of archives or CSV/JSONL manifest
 app.config["MAX_CONTENT_LENGTH"] = 16 * 1024 * 1024  # 16MB max upload size
+app.config["EMBEDDING_CACHE_BYTES"] = 64 * 1024 * 1024  # Memory budget for cached query embeddings
+app.config["EMBEDDING_CACHE_DIR"] = None  # Set to a directory to keep cached embeddings across restarts
+app.config["WARM_UP_ON_START"] = True  # Load the model and index before serving when run directly
+app.config["COALESCE_REQUESTS"] = True  # Batch concurrent searches into one model call and index search
+app.config["COALESCE_MAX_BATCH"] = 16  # Most searches served by one batch
+app.config["COALESCE_MAX_WAIT_MS"] = 5  # Longest a search waits for others to join its batch
+app.config["INFERENCE_WORKERS"] = 1  # Threads running the model; more only help with spare CPU cores or GPUs
+app.config["INFERENCE_QUEUE_SIZE"] = 64  # Queries waiting for the model before new searches get a 503, 0 for no limit
+app.config["INFERENCE_TIMEOUT_SECONDS"] = 30  # Longest a search waits for the model before giving up with a 503
+app.config["RETRY_AFTER_SECONDS"] = 2  # Retry-After sent with 503 responses when the server is busy
+app.config["TF_INTRA_OP_THREADS"] = 0  # TensorFlow threads within one operation, 0 for TensorFlow's default
+app.config["TF_INTER_OP_THREADS"] = 0  # TensorFlow threads across independent operations, 0 for TensorFlow's default
+app.config["DECODE_IN_PROCESSES"] = False  # Decode images for index builds in worker processes; each one re-imports this file
+app.config["INDEX_SHARDS"] = 0  # Split the index across this many worker processes, 0 for one index
+app.config["API_MAX_IMAGES"] = 32  # Most query images accepted by one API request
+app.config["API_MAX_TOP_K"] = 100  # Largest top_k accepted by the API
+app.config["API_MAX_RANGE_RESULTS"] = 1000  # Most results per image from an API range search
+app.config["SEARCH_MIN_SCORE"] = None  # Hide web results below this similarity (0-100), cosine indexes only
+app.config["COLLAPSE_DUPLICATES"] = True  # Show one image per duplicate cluster, once index_images.py --find-duplicates has run
+app.config["QUERY_IMAGE_STORE_ITEMS"] = 256  # Uploads kept in memory for the results page, 0 for none
+app.config["QUERY_IMAGE_STORE_BYTES"] = 64 * 1024 * 1024  # Memory budget for kept uploads
+app.config["QUERY_IMAGE_TTL_SECONDS"] = 600  # How long the results page can show an upload
+app.config["INDEX_VERSIONS_KEPT"] = 2  # Index versions kept on disk after a background rebuild
+app.config["INDEX_VERSION_POLL_SECONDS"] = 5  # How often to check for versions published by other processes
+app.config["INDEX_BUILD_RETRY_SECONDS"] = 300  # After a failed build, how long before a request starts another
+app.config["WATCH_DATASET"] = False  # Stream dataset changes into the live index (enable in one process only)
+app.config["WATCH_INTERVAL_SECONDS"] = 2  # How often the dataset watcher checks for changes
+app.config["WATCH_PERSIST_SECONDS"] = 60  # Least time between saves of the updated index
+app.config["SERVER_TIMING_HEADER"] = False  # Add a Server-Timing header with each response's stage timings
+app.config["THUMBNAIL_DIR"] = "static/thumbnails"  # Result thumbnails cache, None to show full-size images
+app.config["THUMBNAIL_SIZES"] = THUMBNAIL_SIZES  # Longest side of each thumbnail size, in pixels
+app.config["RESULT_THUMBNAIL_SIZE"] = 256  # Thumbnail size shown on results pages (twice that on high-DPI screens)
 
-# Create upload folder if it doesn't exist
-os.makedirs(app.config["UPLOAD_FOLDER"], exist_ok=True)
+# TensorFlow reads its thread counts once, before the model loads
+if app.config["TF_INTRA_OP_THREADS"] or app.config["TF_INTER_OP_THREADS"]:
+    configure_threads(app.config["TF_INTRA_OP_THREADS"], app.config["TF_INTER_OP_THREADS"])
 
-# Initialize the image search engine
-search_engine = ImageSearch(index_path="static/index", dataset_path="static/dataset")
+# Initialize the image search engine (the model and index load on first use).
+# Decode worker processes are spawned, so each would run this file's setup
+# again, watcher included; builds in the app decode on threads unless enabled
+num_shards = app.config["INDEX_SHARDS"] or read_layout("static/index")
+if num_shards:
+    search_engine = ShardedImageSearch(index_path="static/index", dataset_path=app.config["DATASET"],
+                                       num_shards=num_shards, thumbnail_dir=app.config["THUMBNAIL_DIR"],
+                                       thumbnail_sizes=app.config["THUMBNAIL_SIZES"],
+                                       decode_in_processes=app.config["DECODE_IN_PROCESSES"])
+else:
+    search_engine = ImageSearch(index_path="static/index", dataset_path=app.config["DATASET"],
+                                thumbnail_dir=app.config["THUMBNAIL_DIR"],
+                                thumbnail_sizes=app.config["THUMBNAIL_SIZES"],
+                                decode_in_processes=app.config["DECODE_IN_PROCESSES"])
+
+# Rebuild the index in the background and hot-swap new versions in. Sharded
+# indexes are built offline with index_images.py --shard instead
+index_builder = None
+if not num_shards:
+    index_builder = BackgroundIndexBuilder(search_engine,
+                                           keep_versions=app.config["INDEX_VERSIONS_KEPT"],
+                                           poll_seconds=app.config["INDEX_VERSION_POLL_SECONDS"],
+                                           retry_seconds=app.config["INDEX_BUILD_RETRY_SECONDS"])
+
+# Add, update and remove dataset images in the live index as files change.
+# Archives and manifests are re-read by rebuilding the index instead
+dataset_watcher = None
+if app.config["WATCH_DATASET"] and index_builder is not None and os.path.isdir(app.config["DATASET"]):
+    dataset_watcher = DatasetWatcher(search_engine,
+                                     interval=app.config["WATCH_INTERVAL_SECONDS"],
+                                     persist_seconds=app.config["WATCH_PERSIST_SECONDS"],
+                                     should_pause=lambda: index_builder.is_running() or
+                                                          search_engine.index is None)
+    dataset_watcher.start()
+
+# Cache query embeddings by upload content so repeated searches skip the model
+embedding_cache = EmbeddingCache(max_bytes=app.config["EMBEDDING_CACHE_BYTES"],
+                                 cache_dir=app.config["EMBEDDING_CACHE_DIR"])
+
+# Every model call runs on the coalescer's fixed pool of inference threads,
+# fed by a bounded queue; concurrent searches are batched unless disabled
+coalesce = app.config["COALESCE_REQUESTS"]
+coalescer = QueryCoalescer(search_engine,
+                           max_batch_size=app.config["COALESCE_MAX_BATCH"] if coalesce else 1,
+                           max_wait_ms=app.config["COALESCE_MAX_WAIT_MS"] if coalesce else 0,
+                           num_workers=app.config["INFERENCE_WORKERS"],
+                           max_queue=app.config["INFERENCE_QUEUE_SIZE"])
+
+# Uploads are searched from memory; the results page fetches the query image
+# from this short-lived store instead of from a file on disk
+query_images = QueryImageStore(max_items=app.config["QUERY_IMAGE_STORE_ITEMS"],
+                               max_bytes=app.config["QUERY_IMAGE_STORE_BYTES"],
+                               ttl_seconds=app.config["QUERY_IMAGE_TTL_SECONDS"])
+
+def indexed_images():
+    """
+    Number of vectors in the live index.
+    
+    Returns:
+        Vector count, 0 if there is no index yet
+    """
+    index = search_engine.index
+    if index is None:
+        return 0
+    if num_shards:
+        return sum(shard.ntotal for shard in index)
+    return index.ntotal
+
+# Request latency and counts; stage timings and errors are recorded by the
+# search engine itself. Values other objects already track are read at scrape time
+REQUEST_SECONDS = REGISTRY.histogram("inspiresearch_request_seconds",
+                                     "Time to serve a request, by endpoint", ("endpoint",))
+REQUESTS = REGISTRY.counter("inspiresearch_requests_total",
+                            "Requests served, by endpoint and status code", ("endpoint", "status"))
+REGISTRY.callback("inspiresearch_index_vectors", "Vectors in the live index", indexed_images)
+REGISTRY.callback("inspiresearch_embedding_cache_hits_total", "Query embeddings found in memory",
+                  lambda: embedding_cache.hits, kind="counter")
+REGISTRY.callback("inspiresearch_embedding_cache_disk_hits_total", "Query embeddings found on disk",
+                  lambda: embedding_cache.disk_hits, kind="counter")
+REGISTRY.callback("inspiresearch_embedding_cache_misses_total", "Query embeddings computed by the model",
+                  lambda: embedding_cache.misses, kind="counter")
+REGISTRY.callback("inspiresearch_embedding_cache_bytes", "Memory used by cached query embeddings",
+                  lambda: embedding_cache.stats()["bytes"])
+REGISTRY.callback("inspiresearch_coalesced_batches_total", "Batches served by the query coalescer",
+                  lambda: coalescer.batches, kind="counter")
+REGISTRY.callback("inspiresearch_coalesced_queries_total", "Queries served by the query coalescer",
+                  lambda: coalescer.queries, kind="counter")
+REGISTRY.callback("inspiresearch_inference_queue_depth", "Queries waiting for an inference thread",
+                  coalescer.queue_depth)
+REGISTRY.callback("inspiresearch_inference_rejected_total", "Queries turned away because the inference queue was full",
+                  lambda: coalescer.rejected, kind="counter")
+REGISTRY.callback("inspiresearch_inference_timeouts_total", "Queries that waited too long for an inference thread",
+                  lambda: coalescer.timed_out, kind="counter")
+REGISTRY.callback("inspiresearch_query_images_stored", "Uploads kept for results pages",
+                  lambda: len(query_images))
+
+def find_similar(image_bytes, query_features, top_k, min_score=None, distinct=False):
+    """
+    Embed a query image if needed and search the index.
+    
+    Args:
+        image_bytes: Encoded bytes of the uploaded query image
+        query_features: Cached feature vector, or None to run the model
+        top_k: Number of similar images to return
+        min_score: Optional smallest cosine similarity returned
+        distinct: Return one image per duplicate cluster
+        
+    Returns:
+        Tuple of (features, results), features is None if the image couldn't be read
+        
+    Raises:
+        QueueFullError: If the inference queue is full
+    """
+    query_image = None
+    if query_features is None:
+        query_image = search_engine.load_query_image(image_bytes)
+        if query_image is None:
+            return None, []
+    return coalescer.search(image=query_image, features=query_features, top_k=top_k,
+                            min_score=min_score, distinct=distinct,
+                            timeout=app.config["INFERENCE_TIMEOUT_SECONDS"])
+
+def server_busy():
+    """
+    Turn a request away because the inference queue is full.
+    
+    Returns:
+        503 response with a Retry-After header, JSON for API requests
+    """
+    retry_after = str(app.config["RETRY_AFTER_SECONDS"])
+    if request.path.startswith("/api/"):
+        response = jsonify({"error": "Server busy, please retry later", "retry_after": retry_after})
+    else:
+        flash("The server is busy. Please try again in a moment.")
+        response = Response(render_template("index.html"))
+    response.status_code = 503
+    response.headers["Retry-After"] = retry_after
+    return response
+
+def ensure_index():
+    """
+    Make sure there is an index to search, starting a background build if
+    there isn't one yet.
+    
+    A build that failed isn't started again by every request; the builder
+    waits INDEX_BUILD_RETRY_SECONDS, and its status reports the error.
+    
+    Returns:
+        Boolean indicating if the index is ready to search
+    """
+    if search_engine.index is not None:
+        return True
+    if index_builder is not None:
+        index_builder.start_if_needed()
+        return False
+    if os.path.exists(search_engine.index_file):
+        return search_engine.load_index()
+    return search_engine.build_index()
+
+@app.before_request
+def start_request_trace():
+    """
+    Start timing the request and collecting its stage timings.
+    """
+    g.request_started = time.perf_counter()
+    g.trace = start_trace()
+
+@app.before_request
+def check_index_version():
+    """
+    Pick up index versions published by other processes.
+    """
+    if index_builder is not None:
+        index_builder.poll()
+
+@app.after_request
+def record_request(response):
+    """
+    Record the request's latency and status, and report its stage timings
+    in a Server-Timing header if enabled.
+    
+    Args:
+        response: The response being sent
+        
+    Returns:
+        The response
+    """
+    started = g.get("request_started")
+    if started is not None:
+        # Unmatched URLs share one label so scanners can't grow the metrics
+        endpoint = request.endpoint or "unmatched"
+        REQUEST_SECONDS.observe(time.perf_counter() - started, endpoint)
+        REQUESTS.inc(endpoint, response.status_code)
+        trace = g.get("trace")
+        if app.config["SERVER_TIMING_HEADER"] and trace is not None and trace.stages:
+            response.headers["Server-Timing"] = trace.server_timing()
+    return response
+
+@app.teardown_request
+def end_request_trace(error=None):
+    """
+    Stop collecting stage timings for this thread.
+    """
+    end_trace()
+
+def static_filename(path):
+    """
+    Path of a dataset image inside the static folder, for url_for("static").
+    
+    Args:
+        path: Indexed image path or archive locator
+        
+    Returns:
+        Path relative to the static folder, or None for images in archives
+        or outside the static folder, e.g. listed in a CSV/JSONL manifest
+    """
+    if is_archive_locator(path):
+        return None
+    static_folder = os.path.realpath(app.static_folder)
+    full_path = os.path.realpath(path)
+    try:
+        if os.path.commonpath([full_path, static_folder]) != static_folder:
+            return None
+    except ValueError:
+        # Paths on different drives
+        return None
+    return os.path.relpath(full_path, static_folder).replace(os.sep, "/")
+
+def format_results(results):
+    """
+    Add template paths, image and thumbnail URLs and similarity scores to
+    search results.
+    
+    Thumbnail URLs carry a prefix of the image's content hash, so browsers
+    can cache them indefinitely and still see a changed image.
+    
+    Args:
+        results: Search results from the search engine
+        
+    Returns:
+        List of dicts with id, path, url, thumbnail_url, thumbnails (URL by
+        size), distance and similarity
+    """
+    formatted = []
+    for result, similarity in zip(results, similarity_scores(results)):
+        # Get the relative path for use in templates
+        path = get_relative_path(result["path"])
+        # Images Flask can't serve as static files are read by id
+        filename = static_filename(result["path"])
+        if filename is None:
+            url = url_for("dataset_image", image_id=result["id"])
+        else:
+            url = url_for("static", filename=filename)
+        thumbnails = {}
+        if search_engine.thumbnails is not None:
+            digest = search_engine.content_digest(result["id"])
+            thumbnails = {size: url_for("thumbnail", size=size, image_id=result["id"],
+                                        v=digest[:16] if digest else None)
+                          for size in search_engine.thumbnails.sizes}
+        formatted.append({
+            "id": result.get("id"),
+            "path": path,
+            "url": url,
+            "thumbnail_url": thumbnails.get(app.config["RESULT_THUMBNAIL_SIZE"], url),
+            "thumbnails": thumbnails,
+            "distance": result["distance"],
+            "similarity": similarity,
+            "fused_score": result.get("fused_score"),
+        })
+    return formatted
 
 @app.route("/")
 def index():
@@ -61,59 +380,384 @@ def search():
             flash("Invalid file type. Please upload a PNG or JPEG image.")
             return redirect(request.url)
         
-        # Save the uploaded file
-        file_path = save_uploaded_file(file, app.config["UPLOAD_FOLDER"])
-        if not file_path:
-            flash("Error saving uploaded file")
-            return redirect(request.url)
+        # Read the upload into memory; it is never written to disk
+        with stage("read_upload"):
+            upload_bytes = file.read()
         
-        # Check if the index exists, if not, build it
-        if search_engine.index is None:
-            if not os.path.exists(search_engine.index_file):
-                flash("Building image index for the first time. This may take a moment...")
-                search_engine.build_index()
+        # Check if the index exists, if not, build it in the background
+        if not ensure_index():
+            if index_builder is not None and index_builder.state == "failed":
+                flash("The image index could not be built. See /index/status for the error.")
             else:
-                search_engine.load_index()
+                flash("The image index is being built. Please try again in a moment.")
+            return redirect(url_for("index"))
         
-        # Search for similar images
-        results = search_engine.search(file_path, top_k=5)
+        # Search for similar images, reusing the cached embedding if there is one.
+        # Keys include the embedding backend, whose vectors differ per model
+        with stage("cache_lookup"):
+            cache_key = EmbeddingCache.key_for(upload_bytes, namespace=search_engine.embedding_id)
+            cached_features = embedding_cache.get(cache_key)
+        min_score = app.config["SEARCH_MIN_SCORE"]
+        query_features, results = find_similar(upload_bytes, cached_features, top_k=5,
+                                               min_score=min_score / 100 if min_score is not None else None,
+                                               distinct=app.config["COLLAPSE_DUPLICATES"])
+        if query_features is None:
+            flash("Could not process the uploaded image")
+            return redirect(url_for("index"))
+        if cached_features is None:
+            embedding_cache.put(cache_key, query_features)
         
         # Process results for display
-        processed_results = []
-        
-        # Find the maximum distance to normalize similarity scores
-        max_distance = 0
-        for result in results:
-            max_distance = max(max_distance, result["distance"])
-        
-        # Ensure we don't divide by zero
-        if max_distance == 0:
-            max_distance = 1
-            
-        for result in results:
-            # Get the relative path for use in templates
-            relative_path = get_relative_path(result["path"])
-            
-            # Convert distance to similarity score (0-100%)
-            # Lower distance means higher similarity
-            similarity = 100 * (1 - (result["distance"] / max_distance))
-            
-            processed_results.append({
-                "path": relative_path,
-                "distance": result["distance"],
-                "similarity": round(similarity, 1)  # Round to 1 decimal place
-            })
-        
-        # Get the relative path of the query image
-        query_image = get_relative_path(file_path)
-        
-        return render_template("results.html", 
-                              query_image=query_image, 
-                              results=processed_results)
+        processed_results = format_results(results)
+        
+        # Keep the query image briefly so the results page can show it
+        token = query_images.put(upload_bytes, file.mimetype or "application/octet-stream")
+        query_image_url = url_for("query_image", token=token) if token else None
+        
+        with stage("render"):
+            return render_template("results.html", 
+                                  query_image_url=query_image_url, 
+                                  results=processed_results)
+    except QueueFullError:
+        return server_busy()
     except Exception as e:
+        print(f"Error in search: {e}")
+        count_error("search_route")
         flash(f"An error occurred: {str(e)}")
         return redirect(url_for("index"))
 
+@app.route("/api/v1/search", methods=["POST"])
+def api_search():
+    """
+    Search with one or more uploaded images and return JSON.
+    
+    Accepts a multipart request with one or more "file" parts and optional
+    top_k, min_score (0-100), mode and distinct form or query parameters.
+    Mode "knn" returns the top_k matches, cut off below min_score; mode
+    "range" returns every match scoring at least min_score. distinct=false
+    keeps every copy of duplicated images. category, folder, date_from and
+    date_to restrict the results to matching images. One "box" per file
+    ("left,top,right,bottom" in pixels, empty for the whole image) searches
+    with that region only. combine=mean or combine=rrf searches with all
+    images as one query instead of one query each. All images are embedded
+    together on the inference threads and searched with one index search.
+    Responds 503 with a Retry-After header when the inference queue is full.
+    
+    Returns:
+        JSON object with one entry per uploaded image, in upload order, or a
+        single entry for a combined query
+    """
+    try:
+        files = request.files.getlist("file")
+        if not files:
+            return jsonify({"error": "No file part"}), 400
+        if len(files) > app.config["API_MAX_IMAGES"]:
+            return jsonify({"error": f"At most {app.config['API_MAX_IMAGES']} images per request"}), 400
+        
+        try:
+            top_k = int(request.values.get("top_k", 5))
+        except ValueError:
+            return jsonify({"error": "top_k must be an integer"}), 400
+        if not 1 <= top_k <= app.config["API_MAX_TOP_K"]:
+            return jsonify({"error": f"top_k must be between 1 and {app.config['API_MAX_TOP_K']}"}), 400
+        
+        # Scores are on the same 0-100 scale as the "score" of each result
+        min_score = request.values.get("min_score")
+        if min_score is not None:
+            try:
+                min_score = float(min_score)
+            except ValueError:
+                return jsonify({"error": "min_score must be a number"}), 400
+            if not 0 <= min_score <= 100:
+                return jsonify({"error": "min_score must be between 0 and 100"}), 400
+        mode = request.values.get("mode", "knn")
+        if mode not in ("knn", "range"):
+            return jsonify({"error": "mode must be knn or range"}), 400
+        if mode == "range" and min_score is None:
+            return jsonify({"error": "Range search needs a min_score"}), 400
+        distinct = request.values.get("distinct")
+        if distinct is None:
+            distinct = app.config["COLLAPSE_DUPLICATES"]
+        elif distinct.lower() in ("1", "true", "yes"):
+            distinct = True
+        elif distinct.lower() in ("0", "false", "no"):
+            distinct = False
+        else:
+            return jsonify({"error": "distinct must be true or false"}), 400
+        try:
+            search_filter = SearchFilter.from_params(request.values)
+        except ValueError:
+            return jsonify({"error": "date_from and date_to must be ISO 8601 dates"}), 400
+        combine = request.values.get("combine", "none")
+        if combine not in ("none",) + COMBINE_MODES:
+            return jsonify({"error": "combine must be none, mean or rrf"}), 400
+        if combine == "rrf" and mode == "range":
+            return jsonify({"error": "combine=rrf needs mode knn"}), 400
+        try:
+            boxes = [parse_box(value) for value in request.values.getlist("box")]
+        except ValueError:
+            return jsonify({"error": "box must be left,top,right,bottom in pixels"}), 400
+        if boxes and len(boxes) != len(files):
+            return jsonify({"error": "Give one box per file, empty for the whole image"}), 400
+        boxes = boxes or [None] * len(files)
+        
+        if not ensure_index():
+            status = index_builder.status() if index_builder is not None else None
+            return jsonify({"error": "Index not available yet", "index": status}), 503
+        
+        # Decode each upload from memory, reusing cached embeddings where possible
+        queries = []
+        for file, box in zip(files, boxes):
+            query = {"filename": file.filename, "box": box, "features": None, "image": None, "error": None}
+            queries.append(query)
+            if not allowed_file(file.filename):
+                query["error"] = "Invalid file type. Please upload a PNG or JPEG image."
+                continue
+            with stage("read_upload"):
+                upload_bytes = file.read()
+            # A crop embeds differently from the whole image
+            namespace = search_engine.embedding_id if box is None else f"{search_engine.embedding_id}|box={box}"
+            with stage("cache_lookup"):
+                query["cache_key"] = EmbeddingCache.key_for(upload_bytes, namespace=namespace)
+                query["features"] = embedding_cache.get(query["cache_key"])
+            if query["features"] is None:
+                query["image"] = search_engine.load_query_image(upload_bytes, box)
+                if query["image"] is None:
+                    query["error"] = "Could not process the uploaded image"
+        
+        # A combined query needs every image
+        failed = [q for q in queries if q["error"] is not None]
+        if combine != "none" and failed:
+            return jsonify({"error": f"{failed[0]['filename']}: {failed[0]['error']}"}), 400
+        
+        # The cache misses are embedded together on the inference threads
+        to_embed = [q for q in queries if q["error"] is None and q["features"] is None]
+        if to_embed:
+            features = coalescer.embed([q["image"] for q in to_embed],
+                                       timeout=app.config["INFERENCE_TIMEOUT_SECONDS"])
+            for query, row in zip(to_embed, features):
+                query["features"] = row
+                embedding_cache.put(query["cache_key"], row)
+        
+        # One index search for every valid query
+        valid = [q for q in queries if q["error"] is None]
+        if valid and combine != "none":
+            features = np.stack([q["features"] for q in valid])
+            cosine_min = min_score / 100 if min_score is not None else None
+            if mode == "range":
+                results = search_engine.range_search_batch(combine_embeddings(features), cosine_min,
+                                                           max_results=app.config["API_MAX_RANGE_RESULTS"],
+                                                           distinct=distinct, search_filter=search_filter)[0]
+            else:
+                results = search_engine.search_combined(features, top_k=top_k, combine=combine,
+                                                        min_score=cosine_min, distinct=distinct,
+                                                        search_filter=search_filter)
+            queries = [{"filenames": [q["filename"] for q in valid], "boxes": [q["box"] for q in valid],
+                        "error": None, "results": results}]
+        elif valid:
+            features = np.stack([q["features"] for q in valid])
+            cosine_min = min_score / 100 if min_score is not None else None
+            if mode == "range":
+                results = search_engine.range_search_batch(features, cosine_min,
+                                                           max_results=app.config["API_MAX_RANGE_RESULTS"],
+                                                           distinct=distinct, search_filter=search_filter)
+            else:
+                results = search_engine.search_batch(features, top_k=top_k, min_score=cosine_min,
+                                                     distinct=distinct, search_filter=search_filter)
+            for query, query_results in zip(valid, results):
+                query["results"] = query_results
+        
+        response = []
+        for query in queries:
+            if "filenames" in query:
+                entry = {"filenames": query["filenames"]}
+                if any(box is not None for box in query["boxes"]):
+                    entry["boxes"] = query["boxes"]
+            else:
+                entry = {"filename": query["filename"]}
+                if query["box"] is not None:
+                    entry["box"] = query["box"]
+            if query["error"] is not None:
+                entry["error"] = query["error"]
+            else:
+                entry["results"] = []
+                for result in format_results(query["results"]):
+                    item = {
+                        "id": result["id"],
+                        "path": result["path"],
+                        "url": result["url"],
+                        "thumbnail_url": result["thumbnail_url"],
+                        "thumbnails": {str(size): url for size, url in result["thumbnails"].items()},
+                        "distance": result["distance"],
+                        "score": result["similarity"],
+                    }
+                    if result["fused_score"] is not None:
+                        item["fused_score"] = result["fused_score"]
+                    entry["results"].append(item)
+            response.append(entry)
+        
+        return jsonify({"mode": mode, "top_k": top_k, "min_score": min_score, "distinct": distinct,
+                        "combine": combine,
+                        "filter": search_filter.to_dict() if search_filter is not None else None,
+                        "embedding": search_engine.embedding_id, "queries": response})
+    except QueueFullError:
+        return server_busy()
+    except Exception as e:
+        print(f"Error in API search: {e}")
+        count_error("api_search")
+        return jsonify({"error": "An error occurred while processing your request"}), 500
+
+@app.route("/api/v1/facets")
+def api_facets():
+    """
+    Count indexed images per category and folder, for building filters.
+    
+    Accepts the same category, folder, date_from and date_to parameters as
+    /api/v1/search to count only matching images.
+    
+    Returns:
+        JSON object with the number of images, counts per category and
+        folder, and the date range
+    """
+    try:
+        search_filter = SearchFilter.from_params(request.values)
+    except ValueError:
+        return jsonify({"error": "date_from and date_to must be ISO 8601 dates"}), 400
+    if not ensure_index():
+        status = index_builder.status() if index_builder is not None else None
+        return jsonify({"error": "Index not available yet", "index": status}), 503
+    counts = search_engine.facet_counts(search_filter)
+    if counts is None:
+        return jsonify({"error": "An error occurred while counting images"}), 500
+    return jsonify(counts)
+
+@app.route("/query-image/<token>")
+def query_image(token):
+    """
+    Serve an uploaded query image from the in-memory store.
+    
+    Args:
+        token: Token returned when the image was stored
+        
+    Returns:
+        The image, or 404 once it has expired
+    """
+    entry = query_images.get(token)
+    if entry is None:
+        abort(404)
+    data, mimetype = entry
+    max_age = app.config["QUERY_IMAGE_TTL_SECONDS"]
+    return Response(data, mimetype=mimetype, headers={"Cache-Control": f"private, max-age={max_age}"})
+
+@app.route("/dataset-image/<int:image_id>")
+def dataset_image(image_id):
+    """
+    Serve an indexed image that isn't in the static folder: one stored
+    inside a tar or zip archive, or listed in a CSV/JSONL manifest with a
+    path elsewhere on disk.
+    
+    Archive members are read with one seek to the offset saved in the
+    index, so archives never need to be unpacked.
+    
+    Args:
+        image_id: Id of the image in the index
+        
+    Returns:
+        The image, or 404 if there is no such image
+    """
+    if search_engine.index is None:
+        abort(404)
+    try:
+        image = search_engine.read_image(image_id)
+    except (IndexError, KeyError, OSError) as e:
+        print(f"Error reading dataset image {image_id}: {e}")
+        image = None
+    if image is None:
+        abort(404)
+    path, data = image
+    mimetype = mimetypes.guess_type(split_locator(path)[1] if is_archive_locator(path) else path)[0] or "application/octet-stream"
+    return Response(data, mimetype=mimetype, headers={"Cache-Control": "public, max-age=3600"})
+
+@app.route("/thumbnails/<int:size>/<int:image_id>")
+def thumbnail(size, image_id):
+    """
+    Serve a thumbnail of an indexed image, creating it if it is missing.
+    
+    Thumbnails are usually written while the index is built. They are
+    stored by content hash, which is also their ETag; a request whose "v"
+    parameter matches the hash may be cached for a year.
+    
+    Args:
+        size: Longest side of the thumbnail, one of THUMBNAIL_SIZES
+        image_id: Id of the image in the index
+        
+    Returns:
+        JPEG thumbnail, 304 if the client's copy is current, or 404
+    """
+    thumbnails = search_engine.thumbnails
+    if thumbnails is None or size not in thumbnails.sizes or search_engine.index is None:
+        abort(404)
+    try:
+        digest = search_engine.content_digest(image_id)
+        if digest is None or not os.path.exists(thumbnails.path(digest, size)):
+            # Indexes built before digests were saved hash the image here
+            image = search_engine.read_image(image_id)
+            if image is None:
+                abort(404)
+            data = image[1]
+            digest = digest or hashlib.sha256(data).hexdigest()
+            with stage("thumbnail"):
+                if not thumbnails.create(data, digest):
+                    abort(404)
+    except (IndexError, KeyError, OSError) as e:
+        print(f"Error creating thumbnail of image {image_id}: {e}")
+        abort(404)
+    
+    response = send_file(os.path.abspath(thumbnails.path(digest, size)), mimetype="image/jpeg",
+                         etag=f"{digest}-{size}", conditional=True)
+    if request.args.get("v") == digest[:16]:
+        response.headers["Cache-Control"] = "public, max-age=31536000, immutable"
+    else:
+        response.headers["Cache-Control"] = "public, max-age=3600"
+    return response
+
+@app.route("/index/status")
+def index_status():
+    """
+    Report the live index version and the progress of any rebuild.
+    
+    Returns:
+        JSON object with the index status
+    """
+    if index_builder is None:
+        return jsonify({"state": "sharded", "active_version": None, "active_images": indexed_images()})
+    status = index_builder.status()
+    if dataset_watcher is not None:
+        status["watcher"] = dataset_watcher.status()
+    return jsonify(status)
+
+@app.route("/cache/stats")
+def cache_stats():
+    """
+    Report embedding cache hit and miss counters.
+    
+    Returns:
+        JSON object with cache statistics
+    """
+    return jsonify(embedding_cache.stats())
+
+@app.route("/metrics")
+def metrics():
+    """
+    Expose latency histograms and counters for Prometheus.
+    
+    Each server process keeps its own metrics, so scrape every process.
+    
+    Returns:
+        Metrics in the Prometheus text exposition format
+    """
+    return Response(REGISTRY.render(), content_type=CONTENT_TYPE)
+
 @app.route("/about")
 def about():
     """
@@ -135,6 +779,8 @@ def too_large(e):
     Returns:
         Redirect to the index page with an error message
     """
+    if request.path.startswith("/api/"):
+        return jsonify({"error": "File too large. Maximum size is 16MB."}), 413
     flash("File too large. Maximum size is 16MB.")
     return redirect(url_for("index"))
 
@@ -149,21 +795,30 @@ def server_error(e):
     Returns:
         Redirect to the index page with an error message
     """
+    if request.path.startswith("/api/"):
+        return jsonify({"error": "An error occurred while processing your request"}), 500
     flash("An error occurred while processing your request.")
     return redirect(url_for("index"))
 
 if __name__ == "__main__":
     try:
         # Check if we have sample images in the dataset folder
-        dataset_path = "static/dataset"
-        if not os.path.exists(dataset_path) or not os.listdir(dataset_path):
-            print("Warning: No images found in the dataset folder. Please add some images to 'static/dataset'.")
+        has_images = bool(search_engine.source.list())
+        if not has_images:
+            print(f"Warning: No images found in {app.config['DATASET']}. Please add some images to 'static/dataset'.")
         
         # Check if we have an index, if not, build it if there are images
-        if not os.path.exists(search_engine.index_file) and os.path.exists(dataset_path) and os.listdir(dataset_path):
+        if not os.path.exists(search_engine.index_file) and has_images:
             print("Building image index for the first time. This may take a moment...")
-            search_engine.build_index()
+            if index_builder is not None:
+                index_builder.start()
+            else:
+                search_engine.build_index()
+        
+        if app.config["WARM_UP_ON_START"]:
+            search_engine.warm_up()
         
-        app.run(debug=True)
+        # The reloader would run this module, and the build and warm-up above, a second time
+        app.run(debug=True, use_reloader=False)
     except Exception as e:
         print(f"Error starting application: {e}")
@@ -0,0 +1,502 @@
+"""
+InspireSearch - AI-Powered Visual Search Engine
+Dataset sources: image directories, tar/zip shards and manifests of paths
+
+A dataset is named by one string, and open_dataset() picks how to read it:
+
+  static/dataset              directory of image files, walked recursively
+  shards/images-000.tar       uncompressed tar archive
+  shards/*.tar                glob matching several tar or zip archives
+  images.zip                  zip archive
+  images.csv, images.jsonl    manifest with one image path per row
+
+Images inside archives are named by locators such as
+"shards/images-000.tar::cats/0001.jpg". Listing an archive only reads its
+member headers; indexing then reads the image data once, front to back,
+handing images to the extraction pipeline as they are read, so memory
+holds only the batches in flight. Each image's position in its archive is
+stored in the metadata, so a result image is served with a single seek and
+read, without unpacking the archive.
+
+Compressed tars are rejected: they have no offsets to seek to, so every
+result image and thumbnail would decompress the archive up to its member.
+Decompress them into plain .tar shards first.
+
+Copyright (c) 2025 Nicole LeGuern
+Licensed under MIT License with attribution requirements
+https://github.com/CodeQueenie/InspireSearch---AI_Powered_Visual_Search_Engine
+"""
+import os
+import csv
+import glob
+import json
+import time
+import zlib
+import struct
+import hashlib
+import tarfile
+import zipfile
+import posixpath
+from app.facets import image_attributes, parse_date
+from app.manifest import file_hash
+
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg")
+ARCHIVE_EXTENSIONS = (".tar", ".zip")
+COMPRESSED_TAR_EXTENSIONS = (".tar.gz", ".tgz", ".tar.bz2", ".tar.xz")
+MANIFEST_EXTENSIONS = (".csv", ".jsonl")
+
+# Separates the archive path from the member name in a locator
+LOCATOR_SEPARATOR = "::"
+
+# Zip local file header: signature, versions, flags, method, times, crc,
+# sizes, then the lengths of the file name and extra field
+_ZIP_LOCAL_HEADER = struct.Struct("<4s5H3L2H")
+
+def is_archive_locator(path):
+    """
+    Whether a path names an image inside an archive.
+
+    Args:
+        path: Image path or locator
+
+    Returns:
+        Boolean
+    """
+    return LOCATOR_SEPARATOR in path
+
+def split_locator(locator):
+    """
+    Split a locator into its archive path and member name.
+
+    Args:
+        locator: Locator such as "shards/images-000.tar::cats/0001.jpg"
+
+    Returns:
+        Tuple of (archive path, member name)
+    """
+    archive, member = locator.split(LOCATOR_SEPARATOR, 1)
+    return archive, member
+
+def _is_image(name):
+    """
+    Whether a file name has an image extension.
+    """
+    return name.lower().endswith(IMAGE_EXTENSIONS)
+
+def _read_zip_member(f, header_offset, compressed_size):
+    """
+    Read one zip member from its local header without parsing the central directory.
+
+    Args:
+        f: Binary file object of the zip archive
+        header_offset: Offset of the member's local file header
+        compressed_size: Size of the member's compressed data
+
+    Returns:
+        The member's bytes
+    """
+    f.seek(header_offset)
+    header = _ZIP_LOCAL_HEADER.unpack(f.read(_ZIP_LOCAL_HEADER.size))
+    if header[0] != b"PK\x03\x04":
+        raise ValueError(f"No zip member at offset {header_offset}")
+    method, name_length, extra_length = header[3], header[9], header[10]
+    f.seek(header_offset + _ZIP_LOCAL_HEADER.size + name_length + extra_length)
+    data = f.read(compressed_size)
+    if method == zipfile.ZIP_STORED:
+        return data
+    if method == zipfile.ZIP_DEFLATED:
+        return zlib.decompress(data, -15)
+    raise ValueError(f"Unsupported zip compression method {method}")
+
+class DirectorySource:
+    """
+    Image files under a directory.
+    """
+
+    def __init__(self, path):
+        """
+        Initialize the source.
+
+        Args:
+            path: Dataset directory
+        """
+        self.path = path
+
+    def list(self):
+        """
+        Find every image in the dataset.
+
+        Returns:
+            Sorted list of image paths
+        """
+        image_files = []
+        for root, _, files in os.walk(self.path):
+            for file in files:
+                if _is_image(file):
+                    image_files.append(os.path.join(root, file))
+        return sorted(image_files)
+
+    def exists(self, path):
+        """
+        Whether an image is still in the dataset.
+        """
+        return os.path.exists(path)
+
+    def stat(self, path):
+        """
+        Size and modification time of an image.
+
+        Returns:
+            Tuple of (size in bytes, mtime)
+        """
+        stat = os.stat(path)
+        return stat.st_size, stat.st_mtime
+
+    def hash(self, path):
+        """
+        SHA-256 hex digest of an image's contents.
+        """
+        return file_hash(path)
+
+    def locate(self, path):
+        """
+        Position of an image inside its archive.
+
+        Returns:
+            Tuple of (offset, length), (-1, -1) for files on disk
+        """
+        return -1, -1
+
+    def attributes(self, path, mtime):
+        """
+        Category, folder and date of an image, see app/facets.py.
+
+        Args:
+            path: Image path
+            mtime: Modification time from stat
+
+        Returns:
+            Dict with "category", "folder" and "date"
+        """
+        return image_attributes(path, self.path, mtime=mtime)
+
+    def iter_data(self, paths):
+        """
+        Images to feed to BatchFeatureExtractor.iter_batches.
+
+        Files on disk are opened by the decode workers themselves, in parallel.
+
+        Args:
+            paths: Image paths
+
+        Yields:
+            Image paths
+        """
+        yield from paths
+
+    def image_source(self, path):
+        """
+        Something load_image can decode, e.g. for quantization calibration.
+        """
+        return path
+
+    def read(self, path, offset=-1, length=-1):
+        """
+        Read an image's encoded bytes.
+
+        Args:
+            path: Image path
+            offset: Unused for files on disk
+            length: Unused for files on disk
+
+        Returns:
+            Bytes
+        """
+        with open(path, "rb") as f:
+            return f.read()
+
+class ManifestSource(DirectorySource):
+    """
+    Image files listed in a CSV or JSON Lines manifest.
+
+    Each row names an image in a "path" column or key (the first CSV column
+    if there is no header named "path"); relative paths are resolved against
+    the manifest's directory. Optional "category" and "date" columns set
+    those attributes, like a sidecar file would.
+    """
+
+    def __init__(self, manifest_path):
+        """
+        Initialize the source.
+
+        Args:
+            manifest_path: Path to a .csv or .jsonl manifest
+        """
+        super().__init__(os.path.dirname(manifest_path) or ".")
+        self.manifest_path = manifest_path
+        self._overrides = {}
+
+    def _rows(self):
+        """
+        Read the manifest one row at a time.
+
+        Yields:
+            Dicts with at least a "path" key
+        """
+        with open(self.manifest_path, "r", encoding="utf-8", newline="") as f:
+            if self.manifest_path.lower().endswith(".jsonl"):
+                for line in f:
+                    if line.strip():
+                        yield json.loads(line)
+                return
+            reader = csv.reader(f)
+            header = next(reader, None)
+            if header is None:
+                return
+            if "path" not in header:
+                yield {"path": header[0]}
+                header = ["path"]
+            for values in reader:
+                if values:
+                    yield dict(zip(header, values))
+
+    def list(self):
+        """
+        Read the image paths from the manifest.
+
+        Returns:
+            Sorted list of image paths
+        """
+        image_files = set()
+        self._overrides = {}
+        for row in self._rows():
+            path = row.get("path")
+            if not path or not _is_image(path):
+                continue
+            if not os.path.isabs(path):
+                path = os.path.normpath(os.path.join(self.path, path))
+            image_files.add(path)
+            overrides = {name: row[name] for name in ("category", "date") if row.get(name)}
+            if overrides:
+                self._overrides[path] = overrides
+        return sorted(image_files)
+
+    def attributes(self, path, mtime):
+        """
+        Category, folder and date of an image, with manifest columns taking precedence.
+        """
+        attributes = super().attributes(path, mtime)
+        overrides = self._overrides.get(path, {})
+        if "category" in overrides:
+            attributes["category"] = str(overrides["category"])
+        if "date" in overrides:
+            attributes["date"] = parse_date(overrides["date"])
+        return attributes
+
+class ArchiveSource:
+    """
+    Images stored in tar or zip archives.
+
+    Member headers are scanned once and cached; image data is only read by
+    iter_data, in archive order, and by read, which seeks straight to it.
+    """
+
+    def __init__(self, spec):
+        """
+        Initialize the source.
+
+        Args:
+            spec: Archive path, or a glob matching several archives
+        """
+        self.spec = spec
+        if any(c in spec for c in "*?["):
+            matches = sorted(glob.glob(spec))
+            self.archives = [p for p in matches if p.lower().endswith(ARCHIVE_EXTENSIONS)]
+            skipped = [p for p in matches if p.lower().endswith(COMPRESSED_TAR_EXTENSIONS)]
+            if skipped:
+                print(f"Skipping {len(skipped)} compressed tar archives matching {spec}; "
+                      "decompress them into .tar shards to index them")
+        else:
+            self.archives = [spec]
+        self._members = None
+
+    @staticmethod
+    def _is_zip(archive):
+        return archive.lower().endswith(".zip")
+
+    def _scan(self):
+        """
+        Read the member headers of every archive.
+
+        Returns:
+            Dict mapping locator to (size, mtime, offset, length)
+        """
+        if self._members is not None:
+            return self._members
+        members = {}
+        for archive in self.archives:
+            if not os.path.exists(archive):
+                print(f"Archive not found: {archive}")
+                continue
+            if self._is_zip(archive):
+                with zipfile.ZipFile(archive) as zf:
+                    for info in zf.infolist():
+                        if info.is_dir() or not _is_image(info.filename):
+                            continue
+                        mtime = time.mktime(info.date_time + (0, 0, -1))
+                        members[f"{archive}{LOCATOR_SEPARATOR}{info.filename}"] = (
+                            info.file_size, mtime, info.header_offset, info.compress_size)
+            else:
+                # Headers only: tarfile seeks past the data of an uncompressed tar
+                with tarfile.open(archive, "r:") as tar:
+                    for member in tar:
+                        if not member.isfile() or not _is_image(member.name):
+                            continue
+                        members[f"{archive}{LOCATOR_SEPARATOR}{member.name}"] = (
+                            member.size, float(member.mtime), member.offset_data, member.size)
+        self._members = members
+        return members
+
+    def list(self):
+        """
+        Find every image in the archives.
+
+        Returns:
+            Sorted list of locators
+        """
+        self._members = None
+        return sorted(self._scan())
+
+    def exists(self, locator):
+        """
+        Whether an image is still in its archive.
+        """
+        return locator in self._scan()
+
+    def stat(self, locator):
+        """
+        Size and modification time recorded in the archive.
+
+        Returns:
+            Tuple of (size in bytes, mtime)
+        """
+        size, mtime, _, _ = self._scan()[locator]
+        return size, mtime
+
+    def hash(self, locator):
+        """
+        SHA-256 hex digest of an image's contents.
+        """
+        return hashlib.sha256(self.read(locator, *self.locate(locator))).hexdigest()
+
+    def locate(self, locator):
+        """
+        Position of an image inside its archive.
+
+        Returns:
+            Tuple of (offset, length): the data offset and size in a tar, or
+            the local header offset and compressed size in a zip
+        """
+        _, _, offset, length = self._scan()[locator]
+        return offset, length
+
+    def attributes(self, locator, mtime):
+        """
+        Category, folder and date of an image.
+
+        The folder is the member's directory inside the archive and the
+        category its top-level folder.
+
+        Args:
+            locator: Image locator
+            mtime: Modification time recorded in the archive
+
+        Returns:
+            Dict with "category", "folder" and "date"
+        """
+        _, member = split_locator(locator)
+        folder = posixpath.dirname(member).strip("/")
+        return {"category": folder.split("/")[0], "folder": folder, "date": mtime}
+
+    def iter_data(self, locators):
+        """
+        Read images sequentially, one pass over each archive in member order.
+
+        Args:
+            locators: Locators of the images wanted
+
+        Yields:
+            Tuples of (locator, encoded bytes)
+        """
+        by_archive = {}
+        for locator in locators:
+            archive, member = split_locator(locator)
+            by_archive.setdefault(archive, set()).add(member)
+
+        for archive, wanted in by_archive.items():
+            if self._is_zip(archive):
+                with zipfile.ZipFile(archive) as zf:
+                    infos = sorted((zf.getinfo(m) for m in wanted), key=lambda info: info.header_offset)
+                    for info in infos:
+                        yield f"{archive}{LOCATOR_SEPARATOR}{info.filename}", zf.read(info)
+                continue
+            # Stream mode reads the archive front to back without seeking
+            with tarfile.open(archive, "r|") as tar:
+                for member in tar:
+                    if member.name not in wanted:
+                        continue
+                    yield f"{archive}{LOCATOR_SEPARATOR}{member.name}", tar.extractfile(member).read()
+                    wanted.discard(member.name)
+                    if not wanted:
+                        break
+
+    def image_source(self, locator):
+        """
+        Something load_image can decode, e.g. for quantization calibration.
+        """
+        return self.read(locator, *self.locate(locator))
+
+    def read(self, locator, offset=-1, length=-1):
+        """
+        Read an image's encoded bytes.
+
+        Args:
+            locator: Image locator
+            offset: Offset stored by locate, -1 to look it up in the
+                member headers
+            length: Length stored by locate
+
+        Returns:
+            Bytes
+        """
+        archive, _ = split_locator(locator)
+        if offset < 0:
+            offset, length = self.locate(locator)
+        with open(archive, "rb") as f:
+            if self._is_zip(archive):
+                return _read_zip_member(f, offset, length)
+            f.seek(offset)
+            return f.read(length)
+
+def open_dataset(spec):
+    """
+    Open a dataset for indexing and serving.
+
+    Args:
+        spec: Directory, archive path, glob of archives, or .csv/.jsonl manifest
+
+    Returns:
+        DirectorySource, ArchiveSource or ManifestSource
+
+    Raises:
+        ValueError: If spec names a compressed tar archive
+    """
+    lower = spec.lower()
+    if lower.endswith(COMPRESSED_TAR_EXTENSIONS):
+        raise ValueError(f"Compressed tar archives can't be served without decompressing them on "
+                         f"every read; decompress {spec} into a .tar shard first")
+    if lower.endswith(MANIFEST_EXTENSIONS):
+        return ManifestSource(spec)
+    if lower.endswith(ARCHIVE_EXTENSIONS) or any(c in spec for c in "*?["):
+        return ArchiveSource(spec)
+    return DirectorySource(spec)
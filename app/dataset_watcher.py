@@ -0,0 +1,201 @@
+"""
+InspireSearch - AI-Powered Visual Search Engine
+Watch the dataset directory and stream changes into the live index
+
+Uses filesystem events from the optional watchdog package (inotify on
+Linux) when it is installed, and falls back to polling the dataset.
+
+Copyright (c) 2025 Nicole LeGuern
+Licensed under MIT License with attribution requirements
+https://github.com/CodeQueenie/InspireSearch---AI_Powered_Visual_Search_Engine
+"""
+import time
+import threading
+
+class DatasetWatcher:
+    """
+    Keep a serving ImageSearch in step with its dataset directory.
+
+    Added and modified images are embedded in small batches and added to
+    the in-memory index; deleted images are removed. The updated index is
+    persisted every persist_seconds. Run one watcher per index: each
+    persist publishes a new index version that other processes load.
+    """
+
+    def __init__(self, search_engine, interval=2.0, batch_size=16, persist_seconds=60.0,
+                 rescan_seconds=300.0, use_events=True, should_pause=None):
+        """
+        Initialize the watcher.
+
+        Args:
+            search_engine: ImageSearch serving the index to update
+            interval: Seconds between checks for changes
+            batch_size: Number of images embedded per model call
+            persist_seconds: Least time between saves of the updated index
+            rescan_seconds: Seconds between full dataset scans in event mode,
+                catching anything the events missed
+            use_events: Use watchdog filesystem events if the package is installed
+            should_pause: Optional function returning True while updates must
+                wait, e.g. during a background rebuild
+        """
+        self.search_engine = search_engine
+        self.interval = interval
+        self.batch_size = batch_size
+        self.persist_seconds = persist_seconds
+        self.rescan_seconds = rescan_seconds
+        self.use_events = use_events
+        self.should_pause = should_pause
+        self.mode = None
+        self._observer = None
+        self._changed = set()
+        self._changed_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self.embedded = 0
+        self.removed = 0
+        self.persisted = 0
+        self.last_error = None
+        self._unsaved = False
+        self._last_persist = time.monotonic()
+        self._last_scan = 0.0
+
+    def _start_observer(self):
+        """
+        Subscribe to filesystem events under the dataset directory.
+
+        Returns:
+            Boolean indicating if events are available
+        """
+        try:
+            from watchdog.observers import Observer
+            from watchdog.events import FileSystemEventHandler
+        except ImportError:
+            print("watchdog is not installed, polling the dataset for changes")
+            return False
+
+        watcher = self
+
+        class _Handler(FileSystemEventHandler):
+            def on_any_event(self, event):
+                if event.is_directory:
+                    # Directory moves and deletes need a full scan
+                    if event.event_type in ("moved", "deleted"):
+                        watcher._note_change(None)
+                    return
+                watcher._note_change(event.src_path)
+                dest_path = getattr(event, "dest_path", None)
+                if dest_path:
+                    watcher._note_change(dest_path)
+
+        self._observer = Observer()
+        self._observer.schedule(_Handler(), self.search_engine.dataset_path, recursive=True)
+        self._observer.daemon = True
+        self._observer.start()
+        return True
+
+    def _note_change(self, path):
+        """
+        Record a path reported by a filesystem event.
+
+        Args:
+            path: Changed file path, or None to request a full scan
+        """
+        with self._changed_lock:
+            self._changed.add(path)
+        self._wake.set()
+
+    def _take_changes(self):
+        """
+        Collect the paths to check this round.
+
+        Returns:
+            List of paths, or None for a full dataset scan
+        """
+        now = time.monotonic()
+        with self._changed_lock:
+            changed, self._changed = self._changed, set()
+        if self.mode == "poll" or None in changed or now - self._last_scan >= self.rescan_seconds:
+            self._last_scan = now
+            return None
+        return sorted(changed)
+
+    def start(self):
+        """
+        Start watching on a background thread.
+        """
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self.mode = "events" if self.use_events and self._start_observer() else "poll"
+        self._thread = threading.Thread(target=self._run, name="dataset-watcher", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """
+        Stop watching and save any unsaved updates.
+        """
+        self._stop.set()
+        self._wake.set()
+        if self._observer is not None:
+            self._observer.stop()
+            self._observer = None
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self._unsaved:
+            self._persist()
+
+    def _persist(self):
+        """
+        Save the updated index.
+        """
+        if self.search_engine.persist():
+            self.persisted += 1
+            self._unsaved = False
+        self._last_persist = time.monotonic()
+
+    def _run(self):
+        """
+        Watch loop run on the watcher thread.
+        """
+        while not self._stop.is_set():
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            if self._stop.is_set():
+                break
+            if self.should_pause is not None and self.should_pause():
+                continue
+
+            try:
+                # None asks for a full scan, an empty list means nothing changed
+                paths = self._take_changes()
+                if paths is None or paths:
+                    embedded, removed = self.search_engine.sync_dataset(paths, batch_size=self.batch_size)
+                    self.embedded += embedded
+                    self.removed += removed
+                    self._unsaved = self._unsaved or bool(embedded or removed)
+
+                if self._unsaved and time.monotonic() - self._last_persist >= self.persist_seconds:
+                    self._persist()
+                self.last_error = None
+            except Exception as e:
+                print(f"Error updating the index from the dataset: {e}")
+                self.last_error = str(e)
+
+    def status(self):
+        """
+        Counters describing the watcher's work.
+
+        Returns:
+            Dict suitable for a JSON response
+        """
+        return {
+            "mode": self.mode,
+            "running": self._thread is not None and self._thread.is_alive(),
+            "embedded": self.embedded,
+            "removed": self.removed,
+            "persisted": self.persisted,
+            "unsaved_changes": self._unsaved,
+            "last_error": self.last_error,
+        }
@@ -0,0 +1,227 @@
+"""
+InspireSearch - AI-Powered Visual Search Engine
+Exact and near-duplicate detection over the whole index
+
+find_duplicates() self-joins the index: the stored vectors are read back
+and searched against the index block by block, so memory stays bounded by
+the block size while Faiss spreads each block's search across all cores.
+Pairs scoring above a cosine similarity threshold are grouped into
+clusters. Images with identical content hashes in the manifest are always
+grouped too.
+
+The report is saved next to the index, where ImageSearch reads it to
+collapse duplicates out of search results.
+
+Copyright (c) 2025 Nicole LeGuern
+Licensed under MIT License with attribution requirements
+https://github.com/CodeQueenie/InspireSearch---AI_Powered_Visual_Search_Engine
+"""
+import os
+import json
+import time
+import numpy as np
+from app.index_factory import is_cosine, reconstruct_vectors
+from app.manifest import IndexManifest
+
+DUPLICATES_FILE = "duplicates.json"
+
+# Searches that collapse duplicates fetch this many times top_k candidates,
+# so there are enough distinct images left after collapsing
+DISTINCT_OVERFETCH = 4
+
+class _UnionFind:
+    """
+    Disjoint sets of image ids; each set's root is its smallest id, the
+    image indexed first.
+    """
+
+    def __init__(self):
+        self.parent = {}
+
+    def find(self, x):
+        """
+        Root of the set containing x.
+        """
+        parent = self.parent
+        parent.setdefault(x, x)
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    def union(self, a, b):
+        """
+        Merge the sets containing a and b.
+        """
+        a, b = self.find(a), self.find(b)
+        if a != b:
+            self.parent[max(a, b)] = min(a, b)
+
+def _cosine_scores(values, neighbours, block, norms, cosine):
+    """
+    Cosine similarity of each block vector to each of its neighbours.
+
+    Args:
+        values: Inner products (cosine index) or squared L2 distances
+        neighbours: Neighbour ids from the index search, -1 for no result
+        block: Ids of the block's vectors
+        norms: Vector norms by id, only used for L2 indexes
+        cosine: Whether the index is a cosine index
+
+    Returns:
+        float32 array shaped like values
+    """
+    if cosine:
+        return values
+    # |a - b|^2 = |a|^2 + |b|^2 - 2 a.b
+    a = norms[block][:, None]
+    b = norms[np.maximum(neighbours, 0)]
+    return (a * a + b * b - values) / np.maximum(2 * a * b, 1e-12)
+
+def find_duplicates(search_engine, threshold=0.95, k=10, block_size=1024, num_threads=None):
+    """
+    Group the indexed images into exact and near-duplicate clusters.
+
+    Args:
+        search_engine: ImageSearch with a loaded index
+        threshold: Smallest cosine similarity between two images counted as duplicates
+        k: Neighbours checked per image; clusters larger than k + 1 are
+            still found through chains of neighbours
+        block_size: Vectors read back and searched at a time, bounding memory
+        num_threads: Faiss threads used for the search, defaults to all cores
+
+    Returns:
+        Report dict, see save_report
+    """
+    import faiss
+
+    if num_threads:
+        faiss.omp_set_num_threads(num_threads)
+
+    start = time.perf_counter()
+    index = search_engine.index
+    if index is None:
+        raise ValueError("No index loaded")
+    cosine = is_cosine(search_engine.active_index_config)
+    image_paths = search_engine.image_paths
+    ids = search_engine._live_ids()
+    # One extra neighbour, since every image finds itself
+    k = min(k + 1, index.ntotal)
+
+    # L2 indexes turn distances into cosine similarity using the vector norms
+    norms = None
+    if not cosine:
+        norms = np.zeros(int(ids.max()) + 1 if len(ids) else 0, dtype="float32")
+        for row in range(0, len(ids), block_size):
+            block = ids[row:row + block_size]
+            norms[block] = np.linalg.norm(reconstruct_vectors(index, block), axis=1)
+
+    clusters = _UnionFind()
+    weakest = {}
+    for row in range(0, len(ids), block_size):
+        block = ids[row:row + block_size]
+        values, neighbours = index.search(reconstruct_vectors(index, block), k)
+        scores = _cosine_scores(values, neighbours, block, norms, cosine)
+        matches = (neighbours >= 0) & (neighbours != block[:, None]) & (scores >= threshold)
+        for i, j in zip(*np.nonzero(matches)):
+            a, b = int(block[i]), int(neighbours[i, j])
+            if image_paths[b] is None:
+                continue
+            clusters.union(a, b)
+            weakest[a] = min(weakest.get(a, 1.0), float(scores[i, j]))
+            weakest[b] = min(weakest.get(b, 1.0), float(scores[i, j]))
+
+    # Identical files are duplicates whatever their embeddings
+    by_hash = {}
+    manifest = IndexManifest.load(search_engine.manifest_file)
+    for path, entry in (manifest.entries if manifest else {}).items():
+        if entry.get("sha256"):
+            by_hash.setdefault(entry["sha256"], []).append(entry["id"])
+    exact = [sorted(group) for group in by_hash.values() if len(group) > 1]
+    for group in exact:
+        for image_id in group[1:]:
+            clusters.union(group[0], image_id)
+
+    members = {}
+    for image_id in list(clusters.parent):
+        members.setdefault(clusters.find(image_id), []).append(image_id)
+
+    report_clusters = []
+    for root, group in sorted(members.items()):
+        if len(group) < 2:
+            continue
+        group.sort()
+        report_clusters.append({
+            "representative": image_paths[root],
+            "size": len(group),
+            "min_score": min((weakest[i] for i in group if i in weakest), default=1.0),
+            "members": [{"id": i, "path": image_paths[i]} for i in group],
+        })
+
+    return {
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "index_version": search_engine.version,
+        "images": len(ids),
+        "threshold": threshold,
+        "k": k - 1,
+        "seconds": time.perf_counter() - start,
+        "duplicate_images": sum(cluster["size"] - 1 for cluster in report_clusters),
+        "clusters": report_clusters,
+        "exact_duplicates": [[image_paths[i] for i in group] for group in exact],
+    }
+
+def save_report(report, path):
+    """
+    Atomically write a duplicate report as JSON.
+
+    The report holds the settings used, the number of images and of
+    duplicates, and a list of clusters, each with its representative (the
+    image indexed first), size, weakest similarity linking it together and
+    member ids and paths. exact_duplicates lists groups of identical files.
+
+    Args:
+        report: Report from find_duplicates
+        path: Output file path
+    """
+    with open(f"{path}.tmp", "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    os.replace(f"{path}.tmp", path)
+
+def load_duplicate_groups(path):
+    """
+    Read a duplicate report as a mapping from image path to its cluster.
+
+    Args:
+        path: Report file path
+
+    Returns:
+        Dict mapping each duplicate's path to its cluster's representative path
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        report = json.load(f)
+    return {member["path"]: cluster["representative"]
+            for cluster in report["clusters"] for member in cluster["members"]}
+
+def collapse_duplicates(results, groups, top_k):
+    """
+    Keep only the best-ranked result of each duplicate cluster.
+
+    Args:
+        results: Search results, closest first
+        groups: Mapping from load_duplicate_groups
+        top_k: Number of results to keep
+
+    Returns:
+        List of at most top_k results of distinct images
+    """
+    seen = set()
+    distinct = []
+    for result in results:
+        group = groups.get(result["path"], result["path"])
+        if group in seen:
+            continue
+        seen.add(group)
+        distinct.append(result)
+        if len(distinct) >= top_k:
+            break
+    return distinct
@@ -0,0 +1,249 @@
+"""
+InspireSearch - AI-Powered Visual Search Engine
+Pluggable embedding backends, optionally quantized to int8 with TFLite
+
+Copyright (c) 2025 Nicole LeGuern
+Licensed under MIT License with attribution requirements
+https://github.com/CodeQueenie/InspireSearch---AI_Powered_Visual_Search_Engine
+"""
+import os
+import importlib
+import threading
+import numpy as np
+from app.feature_pipeline import IMAGE_SIZE, load_image
+
+# Keras application module and class for each backend, with its output dimension
+BACKENDS = {
+    "resnet50": ("tensorflow.keras.applications.resnet50", "ResNet50", 2048),
+    "mobilenet_v2": ("tensorflow.keras.applications.mobilenet_v2", "MobileNetV2", 1280),
+    "efficientnet_b0": ("tensorflow.keras.applications.efficientnet", "EfficientNetB0", 1280),
+}
+
+QUANTIZATION_MODES = ("int8",)
+
+# Number of dataset images used to calibrate int8 quantization
+CALIBRATION_IMAGES = 100
+
+# Threads each TFLite interpreter uses, None for the TFLite default
+_tflite_threads = None
+
+def configure_threads(intra_op=0, inter_op=0):
+    """
+    Set how many threads TensorFlow uses for inference.
+
+    Must run before the model is loaded; TensorFlow ignores changes once
+    its runtime has started.
+
+    Args:
+        intra_op: Threads used within a single operation, e.g. a convolution,
+            0 to let TensorFlow choose. Also used by TFLite interpreters
+        inter_op: Threads running independent operations in parallel,
+            0 to let TensorFlow choose
+
+    Returns:
+        bool: True if the settings were applied
+    """
+    global _tflite_threads
+    _tflite_threads = intra_op or None
+    try:
+        import tensorflow as tf
+
+        tf.config.threading.set_intra_op_parallelism_threads(intra_op)
+        tf.config.threading.set_inter_op_parallelism_threads(inter_op)
+        return True
+    except RuntimeError as e:
+        print(f"Could not set TensorFlow thread counts, the runtime has already started: {e}")
+        return False
+
+def resolve_embedding_config(backend=None, quantize=None):
+    """
+    Build a complete embedding configuration.
+
+    Args:
+        backend: One of BACKENDS, defaults to "resnet50"
+        quantize: None for float32 Keras inference, or "int8" for a TFLite export
+
+    Returns:
+        Dict with "backend" and "quantize" keys
+    """
+    backend = backend or "resnet50"
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown embedding backend '{backend}'. "
+                         f"Choose from: {', '.join(BACKENDS)}")
+    if quantize is not None and quantize not in QUANTIZATION_MODES:
+        raise ValueError(f"Unknown quantization '{quantize}'. "
+                         f"Choose from: {', '.join(QUANTIZATION_MODES)}")
+    return {"backend": backend, "quantize": quantize}
+
+def describe_embedding(config):
+    """
+    Short identifier for an embedding configuration, e.g. "mobilenet_v2+int8".
+
+    Args:
+        config: Embedding configuration from resolve_embedding_config
+
+    Returns:
+        String identifier
+    """
+    if config["quantize"]:
+        return f"{config['backend']}+{config['quantize']}"
+    return config["backend"]
+
+class EmbeddingModel:
+    """
+    Feature extractor for one embedding configuration.
+
+    Exposes the same predict(x, batch_size) call as a Keras model, so it can
+    be used wherever the model was.
+    """
+
+    def __init__(self, config, model_dir, calibration_paths=None, weights="imagenet"):
+        """
+        Load the backend, exporting an int8 TFLite model first if needed.
+
+        Args:
+            config: Embedding configuration from resolve_embedding_config
+            model_dir: Directory where quantized exports are saved
+            calibration_paths: Function returning image paths used to calibrate
+                int8 quantization, only called when exporting
+            weights: "imagenet" for the pretrained weights, or None for random
+                weights with the same cost, e.g. for benchmarks run offline
+        """
+        self.config = config
+        module_name, class_name, self.dimension = BACKENDS[config["backend"]]
+        module = importlib.import_module(module_name)
+        self.preprocess = module.preprocess_input
+        self.keras_model = None
+        self._interpreter = None
+        self._lock = threading.Lock()
+
+        if config["quantize"] == "int8":
+            self.tflite_file = os.path.join(model_dir, f"embedding_{describe_embedding(config)}.tflite")
+            if not os.path.exists(self.tflite_file):
+                keras_model = self._build_keras_model(module, class_name, weights)
+                self._export_int8(keras_model, calibration_paths() if calibration_paths else [])
+            self._load_interpreter()
+        else:
+            self.keras_model = self._build_keras_model(module, class_name, weights)
+
+    @staticmethod
+    def _build_keras_model(module, class_name, weights="imagenet"):
+        """
+        Build the backbone with global average pooling.
+
+        Args:
+            module: Keras applications module
+            class_name: Name of the model class in the module
+            weights: "imagenet" or None for random weights
+
+        Returns:
+            Keras model producing one feature vector per image
+        """
+        model_class = getattr(module, class_name)
+        return model_class(weights=weights, include_top=False, pooling="avg",
+                           input_shape=IMAGE_SIZE + (3,))
+
+    def _export_int8(self, keras_model, calibration_paths):
+        """
+        Convert a Keras model to an int8-quantized TFLite file.
+
+        Args:
+            keras_model: Float32 Keras model
+            calibration_paths: Image paths used to calibrate activation ranges
+        """
+        import tensorflow as tf
+
+        calibration_paths = list(calibration_paths)[:CALIBRATION_IMAGES]
+        if not calibration_paths:
+            raise ValueError("int8 quantization needs dataset images for calibration")
+
+        def representative_dataset():
+            for path in calibration_paths:
+                try:
+                    x = np.expand_dims(load_image(path), axis=0)
+                except Exception as e:
+                    print(f"Skipping calibration image {path}: {e}")
+                    continue
+                yield [self.preprocess(x).astype("float32")]
+
+        converter = tf.lite.TFLiteConverter.from_keras_model(keras_model)
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        converter.representative_dataset = representative_dataset
+        converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+        tflite_model = converter.convert()
+
+        os.makedirs(os.path.dirname(self.tflite_file), exist_ok=True)
+        with open(f"{self.tflite_file}.tmp", "wb") as f:
+            f.write(tflite_model)
+        os.replace(f"{self.tflite_file}.tmp", self.tflite_file)
+        print(f"Quantized model saved to {self.tflite_file}")
+
+    def _load_interpreter(self):
+        """
+        Load the quantized TFLite model.
+        """
+        import tensorflow as tf
+
+        self._interpreter = tf.lite.Interpreter(model_path=self.tflite_file,
+                                                num_threads=_tflite_threads)
+        self._interpreter.allocate_tensors()
+        self._input = self._interpreter.get_input_details()[0]
+        self._output = self._interpreter.get_output_details()[0]
+        self._batch = self._input["shape"][0]
+
+    def _predict_tflite(self, x):
+        """
+        Run the TFLite interpreter on a batch.
+
+        The interpreter isn't thread-safe, so calls are serialised.
+
+        Args:
+            x: Preprocessed float32 batch
+
+        Returns:
+            float32 feature array
+        """
+        with self._lock:
+            if self._batch != len(x):
+                self._interpreter.resize_tensor_input(self._input["index"], [len(x)] + list(x.shape[1:]))
+                self._interpreter.allocate_tensors()
+                self._batch = len(x)
+            self._interpreter.set_tensor(self._input["index"], x.astype(self._input["dtype"]))
+            self._interpreter.invoke()
+            features = self._interpreter.get_tensor(self._output["index"])
+
+        # Dequantize if the export kept integer outputs
+        scale, zero_point = self._output["quantization"]
+        if scale:
+            features = (features.astype("float32") - zero_point) * scale
+        return features
+
+    def predict(self, x, batch_size=None):
+        """
+        Extract features for a preprocessed batch.
+
+        Args:
+            x: Preprocessed float32 batch
+            batch_size: Batch size for Keras inference, defaults to Keras' own
+
+        Returns:
+            float32 array with one feature vector per image
+        """
+        if self._interpreter is not None:
+            features = self._predict_tflite(x)
+        elif batch_size is None:
+            features = self.keras_model.predict(x)
+        else:
+            features = self.keras_model.predict(x, batch_size=batch_size)
+        return np.asarray(features, dtype="float32").reshape(len(x), -1)
+
+    def memory_bytes(self):
+        """
+        Approximate size of the model weights.
+
+        Returns:
+            Number of bytes
+        """
+        if self._interpreter is not None:
+            return os.path.getsize(self.tflite_file)
+        return self.keras_model.count_params() * 4
@@ -0,0 +1,167 @@
+"""
+InspireSearch - AI-Powered Visual Search Engine
+Embedding cache keyed by image content hash
+
+Copyright (c) 2025 Nicole LeGuern
+Licensed under MIT License with attribution requirements
+https://github.com/CodeQueenie/InspireSearch---AI_Powered_Visual_Search_Engine
+"""
+import os
+import hashlib
+import threading
+from collections import OrderedDict
+import numpy as np
+
+class EmbeddingCache:
+    """
+    Two-tier cache of query embeddings.
+
+    An in-memory LRU tier is bounded by a byte budget. An optional on-disk
+    tier keeps embeddings across restarts.
+    """
+
+    def __init__(self, max_bytes=64 * 1024 * 1024, cache_dir=None):
+        """
+        Initialize the cache.
+
+        Args:
+            max_bytes: Memory budget for cached embeddings
+            cache_dir: Directory for the on-disk tier, None to disable it
+        """
+        self.max_bytes = max_bytes
+        self.cache_dir = cache_dir
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    @staticmethod
+    def key_for(data, namespace=""):
+        """
+        Compute the cache key for an image's raw bytes.
+
+        Args:
+            data: Bytes of the uploaded image
+            namespace: Embedding identifier, so vectors from different
+                backends never share an entry
+
+        Returns:
+            Hex digest string
+        """
+        digest = hashlib.sha256(namespace.encode("utf-8"))
+        digest.update(b"\0" if namespace else b"")
+        digest.update(data)
+        return digest.hexdigest()
+
+    def _disk_path(self, key):
+        """
+        Path of the on-disk entry for a key.
+
+        Args:
+            key: Cache key
+
+        Returns:
+            Path to the .npy file
+        """
+        return os.path.join(self.cache_dir, key[:2], f"{key}.npy")
+
+    def _remember(self, key, features):
+        """
+        Insert an entry into the memory tier, evicting least recently used entries.
+
+        Must be called with the lock held.
+
+        Args:
+            key: Cache key
+            features: Embedding array
+        """
+        if features.nbytes > self.max_bytes:
+            return
+        if key in self._entries:
+            self._bytes -= self._entries.pop(key).nbytes
+        self._entries[key] = features
+        self._bytes += features.nbytes
+        while self._bytes > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self._bytes -= evicted.nbytes
+
+    def get(self, key):
+        """
+        Look up an embedding.
+
+        Args:
+            key: Cache key from key_for
+
+        Returns:
+            Embedding array, or None on a miss
+        """
+        with self._lock:
+            features = self._entries.get(key)
+            if features is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return features
+
+        if self.cache_dir:
+            path = self._disk_path(key)
+            if os.path.exists(path):
+                try:
+                    features = np.load(path)
+                    with self._lock:
+                        self._remember(key, features)
+                        self.hits += 1
+                        self.disk_hits += 1
+                    return features
+                except Exception as e:
+                    print(f"Error reading cached embedding {path}: {e}")
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key, features):
+        """
+        Store an embedding in both tiers.
+
+        Args:
+            key: Cache key from key_for
+            features: Embedding array
+        """
+        features = np.asarray(features, dtype="float32")
+        with self._lock:
+            self._remember(key, features)
+
+        if self.cache_dir:
+            path = self._disk_path(key)
+            try:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                tmp_path = f"{path}.{threading.get_ident()}.tmp"
+                with open(tmp_path, "wb") as f:
+                    np.save(f, features)
+                os.replace(tmp_path, path)
+            except Exception as e:
+                print(f"Error writing cached embedding {path}: {e}")
+
+    def stats(self):
+        """
+        Hit and miss counters and memory usage.
+
+        Returns:
+            Dict of cache statistics
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+            }
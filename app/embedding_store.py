@@ -0,0 +1,229 @@
+"""
+InspireSearch - AI-Powered Visual Search Engine
+Append-only, memory-mapped matrix of raw image embeddings
+
+The embeddings of every indexed image are kept in embeddings.npy next to
+the Faiss index, row i holding the model output for image id i, so a new
+index type or metric can be built from the file alone (see
+ImageSearch.reindex) instead of running the model over the dataset again.
+Rows of removed images stay in place, as their ids stay reserved.
+
+The file is a standard .npy file that np.load can memory-map. Its header is
+padded to a fixed size, so new rows are appended at the end of the file
+and only the shape in the header is rewritten afterwards. Rows past the
+shape in the header, e.g. from a save that was interrupted, are ignored and
+overwritten by the next append.
+
+New index versions hard-link the file of the version they start from and
+append to it, so the saved rows are never copied. Appends hold an
+exclusive lock on the file. If another version has already appended to
+the shared file, the rows this store owns are copied to a file of its own
+first.
+
+Copyright (c) 2025 Nicole LeGuern
+Licensed under MIT License with attribution requirements
+https://github.com/CodeQueenie/InspireSearch---AI_Powered_Visual_Search_Engine
+"""
+import os
+import shutil
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows has no flock; appends there rely on the header check alone
+    fcntl = None
+
+EMBEDDINGS_FILE = "embeddings.npy"
+
+# Storage types for the embedding matrix; float16 halves the file size
+EMBEDDING_DTYPES = ("float32", "float16")
+
+# Bytes before the first row: the .npy magic, version, header length and the
+# header dict padded with spaces, leaving room for any row count
+HEADER_BYTES = 128
+
+def _header(dtype, rows, dimension):
+    """
+    Encode a fixed-size .npy version 1.0 header.
+
+    Args:
+        dtype: numpy dtype of the matrix
+        rows: Number of rows
+        dimension: Number of columns
+
+    Returns:
+        HEADER_BYTES bytes
+    """
+    description = repr({"descr": np.lib.format.dtype_to_descr(np.dtype(dtype)),
+                        "fortran_order": False, "shape": (rows, dimension)})
+    prefix = np.lib.format.magic(1, 0)
+    length = HEADER_BYTES - len(prefix) - 2
+    text = description.ljust(length - 1) + "\n"
+    return prefix + length.to_bytes(2, "little") + text.encode("latin1")
+
+def _header_rows(f):
+    """
+    Row count in the header of an open embedding file.
+
+    Args:
+        f: Binary file object
+
+    Returns:
+        Number of rows
+    """
+    f.seek(0)
+    np.lib.format.read_magic(f)
+    shape, _, _ = np.lib.format.read_array_header_1_0(f)
+    return shape[0]
+
+def _lock(f):
+    """
+    Take an exclusive lock on an open file, released when it is closed.
+
+    Args:
+        f: Binary file object
+    """
+    if fcntl is not None:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+
+class EmbeddingStore:
+    """
+    Embedding matrix of an index: rows already saved in a file plus rows
+    added since, which save() appends.
+    """
+
+    def __init__(self, dtype="float32", path=None, rows=0, dimension=None):
+        """
+        Initialize the store.
+
+        Args:
+            dtype: Storage type, one of EMBEDDING_DTYPES
+            path: File holding the saved rows, or None for a new matrix
+            rows: Number of saved rows in that file belonging to this index
+            dimension: Embedding dimension, known once a row exists
+        """
+        if dtype not in EMBEDDING_DTYPES:
+            raise ValueError(f"Unknown embedding dtype '{dtype}', expected one of {EMBEDDING_DTYPES}")
+        self.dtype = dtype
+        self.path = path
+        self.saved_rows = rows
+        self.dimension = dimension
+        self._new = []
+
+    @classmethod
+    def open(cls, index_path, rows=None):
+        """
+        Open the embedding matrix saved with an index.
+
+        Args:
+            index_path: Directory holding the index files
+            rows: Number of rows the index's metadata covers; any further
+                rows in the file are ignored
+
+        Returns:
+            EmbeddingStore, or None if there is no file or it has fewer rows
+        """
+        path = os.path.join(index_path, EMBEDDINGS_FILE)
+        if not os.path.exists(path):
+            return None
+        matrix = np.load(path, mmap_mode="r")
+        saved_rows, dimension = matrix.shape
+        if rows is None:
+            rows = saved_rows
+        if saved_rows < rows:
+            return None
+        return cls(dtype=matrix.dtype.name, path=path, rows=rows, dimension=dimension)
+
+    @property
+    def rows(self):
+        """
+        Number of rows, including those not saved yet.
+        """
+        return self.saved_rows + sum(len(block) for block in self._new)
+
+    def append(self, features):
+        """
+        Add embeddings for the next image ids.
+
+        Args:
+            features: float32 array with one row per image
+        """
+        if self.dimension is None:
+            self.dimension = features.shape[1]
+        self._new.append(np.asarray(features, dtype=self.dtype))
+
+    def matrix(self):
+        """
+        Memory-map the saved rows.
+
+        Returns:
+            Read-only array of shape (rows, dimension), or None if nothing is saved
+        """
+        if self.path is None:
+            return None
+        return np.load(self.path, mmap_mode="r")[:self.saved_rows]
+
+    def save(self, index_path):
+        """
+        Write the matrix into an index directory.
+
+        The new rows are appended to the file the saved rows were read from.
+        Saving into another directory, e.g. a new index version, hard-links
+        that file there first, and only copies it when it can't be linked
+        or another version has appended to it since.
+
+        Args:
+            index_path: Directory holding the index files
+        """
+        if self.dimension is None:
+            return
+        target = os.path.join(index_path, EMBEDDINGS_FILE)
+        if self.path is not None and not os.path.exists(target):
+            try:
+                os.link(self.path, target)
+            except OSError:
+                pass
+        in_place = self.path is not None and os.path.exists(target) and os.path.samefile(self.path, target)
+        if not self._new and in_place:
+            return
+
+        row_bytes = self.dimension * np.dtype(self.dtype).itemsize
+        rows = self.rows
+        write_path = target
+        f = None
+        try:
+            if in_place:
+                f = open(target, "r+b")
+                _lock(f)
+                if _header_rows(f) != self.saved_rows:
+                    # Another version sharing the file appended its own rows
+                    f.close()
+                    in_place = False
+            if not in_place:
+                write_path = f"{target}.tmp"
+                if self.path is not None:
+                    shutil.copyfile(self.path, write_path)
+                else:
+                    with open(write_path, "wb") as new_file:
+                        new_file.write(_header(self.dtype, 0, self.dimension))
+                f = open(write_path, "r+b")
+
+            # Drop rows past the saved ones, left by an interrupted save
+            f.seek(HEADER_BYTES + self.saved_rows * row_bytes)
+            for block in self._new:
+                f.write(np.ascontiguousarray(block).tobytes())
+            f.truncate()
+            f.flush()
+            os.fsync(f.fileno())
+            # Only count the new rows once they are on disk
+            f.seek(0)
+            f.write(_header(self.dtype, rows, self.dimension))
+        finally:
+            if f is not None:
+                f.close()
+
+        if not in_place:
+            os.replace(write_path, target)
+        self.path = target
+        self.saved_rows = rows
+        self._new = []
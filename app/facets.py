@@ -0,0 +1,265 @@
+"""
+InspireSearch - AI-Powered Visual Search Engine
+Per-image attributes for filtered and faceted search
+
+Each indexed image gets a category, a folder and a date. The folder is the
+image's directory relative to the dataset, the category its top-level
+folder and the date its modification time. A sidecar file next to the
+image, e.g. photo.jpg.json, can set the category and date explicitly:
+
+  {"category": "posters", "date": "2024-05-31"}
+
+Categories and folders are stored as integer codes in the metadata store,
+with the code-to-value lists saved in metadata.json, so filters are
+evaluated with vectorized comparisons over the memory-mapped fields.
+
+Copyright (c) 2025 Nicole LeGuern
+Licensed under MIT License with attribution requirements
+https://github.com/CodeQueenie/InspireSearch---AI_Powered_Visual_Search_Engine
+"""
+import os
+import json
+from datetime import datetime, timezone
+import numpy as np
+
+# Attributes stored as codes into a list of values
+FACETS = ("category", "folder")
+
+SIDECAR_SUFFIX = ".json"
+
+def parse_date(value):
+    """
+    Convert a date to seconds since the epoch.
+
+    Args:
+        value: Seconds since the epoch, or an ISO 8601 date or date and time;
+            dates without a time zone are taken as UTC
+
+    Returns:
+        Float seconds since the epoch
+    """
+    if isinstance(value, (int, float)):
+        return float(value)
+    parsed = datetime.fromisoformat(str(value).strip().replace("Z", "+00:00"))
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+def _is_date_only(value):
+    """
+    Whether a date string has no time part.
+    """
+    return isinstance(value, str) and len(value.strip()) == 10
+
+def image_attributes(path, dataset_path, mtime=None):
+    """
+    Read the category, folder and date of an image.
+
+    Args:
+        path: Image path
+        dataset_path: Dataset directory the folder is relative to
+        mtime: Modification time if already known
+
+    Returns:
+        Dict with "category" and "folder" strings and "date" in seconds since the epoch
+    """
+    folder = os.path.relpath(os.path.dirname(path), dataset_path).replace(os.sep, "/")
+    if folder == "." or folder.startswith(".."):
+        folder = ""
+    attributes = {
+        "category": folder.split("/")[0],
+        "folder": folder,
+        "date": os.path.getmtime(path) if mtime is None else mtime,
+    }
+
+    sidecar = path + SIDECAR_SUFFIX
+    if os.path.exists(sidecar):
+        try:
+            with open(sidecar, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("category") is not None:
+                attributes["category"] = str(data["category"])
+            if data.get("date") is not None:
+                attributes["date"] = parse_date(data["date"])
+        except Exception as e:
+            print(f"Error reading sidecar {sidecar}: {e}")
+    return attributes
+
+class FacetVocabulary:
+    """
+    Values of each facet, indexed by the codes stored per image.
+
+    Code 0 is always the empty value. Codes are only ever appended, so
+    searches can read a vocabulary while images are being added.
+    """
+
+    def __init__(self, values=None):
+        """
+        Initialize the vocabulary.
+
+        Args:
+            values: Dict mapping facet name to its list of values, as saved in metadata.json
+        """
+        self.values = {facet: list((values or {}).get(facet) or [""]) for facet in FACETS}
+        self._codes = {facet: {value: code for code, value in enumerate(self.values[facet])}
+                       for facet in FACETS}
+
+    def code(self, facet, value):
+        """
+        Code of a value, adding the value if it is new.
+
+        Args:
+            facet: Facet name
+            value: Facet value
+
+        Returns:
+            Integer code
+        """
+        codes = self._codes[facet]
+        if value not in codes:
+            codes[value] = len(self.values[facet])
+            self.values[facet].append(value)
+        return codes[value]
+
+    def matching_codes(self, facet, predicate):
+        """
+        Codes of the values a predicate accepts.
+
+        Args:
+            facet: Facet name
+            predicate: Function taking a value and returning a boolean
+
+        Returns:
+            int32 array of codes
+        """
+        return np.array([code for code, value in enumerate(list(self.values[facet])) if predicate(value)],
+                        dtype="int32")
+
+    def to_dict(self):
+        """
+        Values of each facet, for metadata.json.
+
+        Returns:
+            Dict mapping facet name to a list of values
+        """
+        return {facet: list(values) for facet, values in self.values.items()}
+
+class SearchFilter:
+    """
+    Restrict a search to images in some categories, under a folder and/or
+    within a date range. Conditions are combined with AND.
+    """
+
+    def __init__(self, categories=None, folder=None, date_from=None, date_before=None):
+        """
+        Initialize the filter.
+
+        Args:
+            categories: Optional list of categories, any of which matches
+            folder: Optional folder; images in it or its subfolders match
+            date_from: Optional earliest date, seconds since the epoch
+            date_before: Optional exclusive latest date, seconds since the epoch
+        """
+        self.categories = sorted(set(categories)) if categories else None
+        self.folder = folder.strip("/") if folder else None
+        self.date_from = date_from
+        self.date_before = date_before
+
+    @classmethod
+    def from_params(cls, params):
+        """
+        Build a filter from request parameters.
+
+        Accepts "category" (repeated or comma-separated), "folder",
+        "date_from" and "date_to". A date_to without a time includes that
+        whole day.
+
+        Args:
+            params: Mapping with getlist, e.g. Flask's request.values
+
+        Returns:
+            SearchFilter, or None if no filter parameters were given
+        """
+        categories = [c.strip() for value in params.getlist("category")
+                      for c in value.split(",") if c.strip()]
+        folder = params.get("folder") or None
+        date_from = params.get("date_from") or None
+        date_to = params.get("date_to") or None
+
+        date_before = None
+        if date_to is not None:
+            date_before = parse_date(date_to)
+            date_before += 86400 if _is_date_only(date_to) else 1e-6
+        search_filter = cls(categories=categories, folder=folder,
+                            date_from=parse_date(date_from) if date_from is not None else None,
+                            date_before=date_before)
+        return search_filter if search_filter.key() != (None, None, None, None) else None
+
+    def key(self):
+        """
+        Hashable description, equal for equal filters.
+
+        Returns:
+            Tuple
+        """
+        return (tuple(self.categories) if self.categories else None, self.folder,
+                self.date_from, self.date_before)
+
+    def matches(self, fields, vocabulary):
+        """
+        Evaluate the filter over every image.
+
+        Args:
+            fields: Function returning the array of a per-image field by name
+            vocabulary: FacetVocabulary the codes refer to
+
+        Returns:
+            Boolean array, one entry per image id, or None if the filter has no conditions
+        """
+        mask = None
+
+        def restrict(condition):
+            nonlocal mask
+            mask = condition if mask is None else mask & condition
+
+        if self.categories is not None:
+            wanted = set(self.categories)
+            restrict(np.isin(fields("category"), vocabulary.matching_codes("category", wanted.__contains__)))
+        if self.folder is not None:
+            prefix = self.folder + "/"
+            restrict(np.isin(fields("folder"), vocabulary.matching_codes(
+                "folder", lambda value: value == self.folder or value.startswith(prefix))))
+        if self.date_from is not None:
+            restrict(fields("date") >= self.date_from)
+        if self.date_before is not None:
+            restrict(fields("date") < self.date_before)
+        return mask
+
+    def to_dict(self):
+        """
+        Describe the filter for a JSON response.
+
+        Returns:
+            Dict of the conditions that are set
+        """
+        described = {
+            "category": self.categories,
+            "folder": self.folder,
+            "date_from": format_date(self.date_from),
+            "date_before": format_date(self.date_before),
+        }
+        return {name: value for name, value in described.items() if value is not None}
+
+def format_date(seconds):
+    """
+    Format seconds since the epoch as ISO 8601 UTC.
+
+    Args:
+        seconds: Seconds since the epoch, or None
+
+    Returns:
+        String, or None
+    """
+    if seconds is None:
+        return None
+    return datetime.fromtimestamp(seconds, tz=timezone.utc).isoformat()
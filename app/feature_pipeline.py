@@ -0,0 +1,403 @@
+"""
+InspireSearch - AI-Powered Visual Search Engine
+Batched, pipelined feature extraction
+
+Copyright (c) 2025 Nicole LeGuern
+Licensed under MIT License with attribution requirements
+https://github.com/CodeQueenie/InspireSearch---AI_Powered_Visual_Search_Engine
+"""
+import io
+import math
+import time
+import hashlib
+import itertools
+import threading
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+import numpy as np
+from PIL import Image
+
+IMAGE_SIZE = (224, 224)
+
+def _clip_box(box, width, height):
+    """
+    Clip a crop box to the image.
+
+    Args:
+        box: (left, top, right, bottom) in pixels of the full image
+        width: Image width
+        height: Image height
+
+    Returns:
+        Clipped (left, top, right, bottom)
+    """
+    left, top, right, bottom = (float(v) for v in box)
+    left, right = max(0.0, left), min(float(width), right)
+    top, bottom = max(0.0, top), min(float(height), bottom)
+    if right - left < 1 or bottom - top < 1:
+        raise ValueError(f"Crop box {tuple(box)} does not overlap the {width}x{height} image")
+    return left, top, right, bottom
+
+def _decode(source, draft_size=None, box=None):
+    """
+    Open an image and optionally crop it.
+
+    Args:
+        source: Path, encoded bytes or binary file-like object
+        draft_size: Let JPEGs decode at reduced scale when that still covers
+            this (width, height), None for a full-resolution decode
+        box: Optional (left, top, right, bottom) crop in pixels of the full image
+
+    Returns:
+        Tuple of (RGB PIL image, megapixels of the source image)
+    """
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        source = io.BytesIO(source)
+    with Image.open(source) as img:
+        width, height = img.size
+        megapixels = width * height / 1e6
+        if box is not None:
+            box = _clip_box(box, width, height)
+        if draft_size is not None:
+            # JPEG decoders can scale by 1/2, 1/4 or 1/8 while decoding the
+            # DCT blocks, which is much cheaper than decoding every pixel of
+            # a camera image only to shrink it to 224px. A crop has to cover
+            # draft_size on its own, so it asks for a larger decode
+            if box is not None:
+                draft_size = (math.ceil(draft_size[0] * width / (box[2] - box[0])),
+                              math.ceil(draft_size[1] * height / (box[3] - box[1])))
+            img.draft("RGB", draft_size)
+        img = img.convert("RGB")
+        if box is not None:
+            # The draft decode may have scaled the image down
+            scale_x, scale_y = img.width / width, img.height / height
+            img = img.crop((round(box[0] * scale_x), round(box[1] * scale_y),
+                            round(box[2] * scale_x), round(box[3] * scale_y)))
+        return img, megapixels
+
+def _open_resized(source, target_size, draft, box=None):
+    """
+    Open an image, optionally crop it, and resize it to the model input size.
+
+    Args:
+        source: Path, encoded bytes or binary file-like object
+        target_size: (width, height) to resize the image to
+        draft: Let JPEGs decode at reduced scale when that still covers target_size
+        box: Optional (left, top, right, bottom) crop in pixels of the full image
+
+    Returns:
+        Tuple of (RGB PIL image, megapixels of the source image)
+    """
+    img, megapixels = _decode(source, target_size if draft else None, box)
+    return img.resize(target_size), megapixels
+
+def load_image(source, target_size=IMAGE_SIZE, draft=True, box=None):
+    """
+    Decode an image and resize it to the model input size.
+
+    Args:
+        source: Path to the image, its encoded bytes, or a binary file-like object
+        target_size: (width, height) to resize the image to
+        draft: Use reduced-scale JPEG decoding, False for a full-resolution decode
+        box: Optional (left, top, right, bottom) region to keep, in pixels of
+            the full image; parts outside the image are ignored
+
+    Returns:
+        float32 array of shape (height, width, 3)
+    """
+    img, _ = _open_resized(source, target_size, draft, box)
+    return np.asarray(img, dtype="float32")
+
+def decode_image(source, target_size=IMAGE_SIZE, thumbnails=None):
+    """
+    Decode one image for the extraction pipeline, never raising.
+
+    Runs on the decode thread or process pool, so it is a module-level
+    function and returns compact uint8 pixels. The model input is decoded
+    exactly as load_image does at query time. The file is read once to both
+    hash and decode it; missing thumbnails reuse the decode when it covers
+    them and otherwise decode the bytes again at their own size. The
+    seconds returned only cover reading and decoding the model input.
+
+    Args:
+        source: Path to the image or its encoded bytes
+        target_size: (width, height) to resize the image to
+        thumbnails: Optional ThumbnailStore to save the image's thumbnails to
+
+    Returns:
+        Tuple of (uint8 array or None, source megapixels, seconds, error
+        message or None, SHA-256 hex digest of the file or None)
+    """
+    start = time.perf_counter()
+    try:
+        if not isinstance(source, (bytes, bytearray, memoryview)):
+            with open(source, "rb") as f:
+                source = f.read()
+        img, megapixels = _decode(source, target_size)
+        pixels = np.asarray(img.resize(target_size), dtype="uint8")
+    except Exception as e:
+        return None, 0.0, time.perf_counter() - start, str(e), None
+    seconds = time.perf_counter() - start
+
+    digest = hashlib.sha256(source).hexdigest()
+    if thumbnails is not None:
+        thumbnails.create(source, digest, img)
+    return pixels, megapixels, seconds, None, digest
+
+class PipelineStats:
+    """
+    Throughput counters for the decode, preprocess and inference stages.
+    """
+    STAGES = ("decode", "preprocess", "inference")
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.images = {stage: 0 for stage in self.STAGES}
+        self.seconds = {stage: 0.0 for stage in self.STAGES}
+        self.decoded_megapixels = 0.0
+        self.failed = 0
+        self.failures = []
+        self.wall_seconds = 0.0
+
+    def record(self, stage, images, seconds, megapixels=0.0):
+        """
+        Add timing for a stage.
+
+        Args:
+            stage: One of STAGES
+            images: Number of images processed
+            seconds: Time spent processing them
+            megapixels: Source image size, for the decode stage
+        """
+        with self._lock:
+            self.images[stage] += images
+            self.seconds[stage] += seconds
+            self.decoded_megapixels += megapixels
+
+    def record_failure(self, img_path, error):
+        """
+        Count an image that could not be decoded.
+
+        Args:
+            img_path: Path to the image
+            error: Why it could not be decoded
+        """
+        with self._lock:
+            self.failed += 1
+            self.failures.append((img_path, error))
+
+    def ms_per_megapixel(self):
+        """
+        Decode time per megapixel of source image.
+
+        Returns:
+            Milliseconds per megapixel, or 0.0 if nothing was decoded
+        """
+        if self.decoded_megapixels <= 0:
+            return 0.0
+        return self.seconds["decode"] * 1000 / self.decoded_megapixels
+
+    def rate(self, stage):
+        """
+        Images per second for a stage, measured over the time spent in it.
+
+        Args:
+            stage: One of STAGES
+
+        Returns:
+            Images per second, or 0.0 if the stage never ran
+        """
+        if self.seconds[stage] <= 0:
+            return 0.0
+        return self.images[stage] / self.seconds[stage]
+
+    def report(self):
+        """
+        Format a human readable throughput report.
+
+        Returns:
+            Multi-line report string
+        """
+        lines = ["Feature extraction throughput:"]
+        for stage in self.STAGES:
+            lines.append(f"  {stage:<11} {self.images[stage]:>8} images  "
+                         f"{self.seconds[stage]:>8.2f}s  {self.rate(stage):>9.1f} img/s")
+        total = self.images["inference"]
+        overall = total / self.wall_seconds if self.wall_seconds > 0 else 0.0
+        lines.append(f"  {'overall':<11} {total:>8} images  "
+                     f"{self.wall_seconds:>8.2f}s  {overall:>9.1f} img/s")
+        if self.images["decode"]:
+            lines.append(f"  decode cost {self.ms_per_megapixel():.1f} ms per megapixel "
+                         f"({self.decoded_megapixels / self.images['decode']:.1f} MP average)")
+        if self.failed:
+            lines.append(f"  {self.failed} images could not be decoded")
+            for img_path, error in self.failures[:10]:
+                lines.append(f"    {img_path}: {error}")
+            if self.failed > 10:
+                lines.append(f"    ... and {self.failed - 10} more")
+        return "\n".join(lines)
+
+class BatchFeatureExtractor:
+    """
+    Extract features for many images with one model call per batch.
+
+    Images for the next batch are decoded on a thread or process pool while
+    the model runs on the current batch. Decoded pixels are copied into one
+    reused batch buffer, and images that can't be decoded are reported and
+    skipped without failing their batch. The content hash of each decoded
+    image is kept in digests, by path, until the caller takes it.
+    """
+
+    def __init__(self, model, preprocess_fn, batch_size=32, num_workers=4, use_processes=False,
+                 thumbnails=None):
+        """
+        Initialize the extractor.
+
+        Args:
+            model: Keras model used for inference
+            preprocess_fn: Function applied to the stacked image batch
+            batch_size: Number of images per model call
+            num_workers: Number of threads or processes used to decode images
+            use_processes: Decode in worker processes, sidestepping the GIL
+                for large images at the cost of process startup
+            thumbnails: Optional ThumbnailStore to save thumbnails to while decoding
+        """
+        self.model = model
+        self.preprocess_fn = preprocess_fn
+        self.batch_size = max(1, int(batch_size))
+        self.num_workers = max(1, int(num_workers))
+        self.use_processes = use_processes
+        self.thumbnails = thumbnails
+        self.stats = PipelineStats()
+        self.digests = {}
+        self.failed = {}
+        self._buffer = None
+
+    def _make_pool(self):
+        """
+        Create the decode worker pool.
+
+        Returns:
+            ThreadPoolExecutor or ProcessPoolExecutor
+        """
+        if self.use_processes:
+            # Spawn rather than fork: forking a process that has loaded
+            # TensorFlow is unsafe
+            return ProcessPoolExecutor(max_workers=self.num_workers,
+                                       mp_context=multiprocessing.get_context("spawn"))
+        return ThreadPoolExecutor(max_workers=self.num_workers)
+
+    def _fill_buffer(self, batch_paths, decoded):
+        """
+        Copy a batch's decoded images into the reused batch buffer.
+
+        Args:
+            batch_paths: Paths of the images in the batch
+            decoded: Results of decode_image for each path
+
+        Returns:
+            List of paths whose images were decoded, in buffer order
+        """
+        if self._buffer is None:
+            self._buffer = np.empty((self.batch_size, IMAGE_SIZE[1], IMAGE_SIZE[0], 3), dtype="float32")
+
+        valid_paths = []
+        for img_path, (pixels, megapixels, seconds, error, digest) in zip(batch_paths, decoded):
+            if pixels is None:
+                print(f"Skipping unreadable image {img_path}: {error}")
+                self.stats.record_failure(img_path, error)
+                self.failed[img_path] = error
+                continue
+            self.stats.record("decode", 1, seconds, megapixels)
+            self.digests[img_path] = digest
+            self._buffer[len(valid_paths)] = pixels
+            valid_paths.append(img_path)
+        return valid_paths
+
+    def _infer(self, batch_paths, decoded):
+        """
+        Preprocess a decoded batch and run the model on it.
+
+        Args:
+            batch_paths: Paths of the images in the batch
+            decoded: Results of decode_image for each path
+
+        Returns:
+            Tuple of (valid_paths, features) where features is a float32 array
+        """
+        valid_paths = self._fill_buffer(batch_paths, decoded)
+        if not valid_paths:
+            return [], None
+
+        start = time.perf_counter()
+        x = self.preprocess_fn(self._buffer[:len(valid_paths)])
+        self.stats.record("preprocess", len(valid_paths), time.perf_counter() - start)
+
+        start = time.perf_counter()
+        features = self.model.predict(x, batch_size=len(valid_paths))
+        self.stats.record("inference", len(valid_paths), time.perf_counter() - start)
+
+        features = features.reshape(len(valid_paths), -1).astype("float32")
+        return valid_paths, features
+
+    def iter_batches(self, img_paths):
+        """
+        Extract features batch by batch.
+
+        Images are taken from img_paths one batch ahead of the model, so a
+        generator reading an archive only ever holds two batches in memory.
+
+        Args:
+            img_paths: Iterable of image paths, or of (path, encoded bytes)
+                pairs for images read from an archive
+
+        Yields:
+            Tuples of (valid_paths, features) for each batch
+        """
+        items = iter(img_paths)
+
+        def next_batch():
+            batch = list(itertools.islice(items, self.batch_size))
+            paths = [item[0] if isinstance(item, tuple) else item for item in batch]
+            sources = [item[1] if isinstance(item, tuple) else item for item in batch]
+            return paths, sources
+
+        batch_paths, sources = next_batch()
+        if not batch_paths:
+            return
+
+        start = time.perf_counter()
+        with self._make_pool() as pool:
+            pending = [pool.submit(decode_image, s, IMAGE_SIZE, self.thumbnails) for s in sources]
+            while batch_paths:
+                decoded = [f.result() for f in pending]
+
+                # Start decoding the next batch before running the model
+                next_paths, sources = next_batch()
+                pending = [pool.submit(decode_image, s, IMAGE_SIZE, self.thumbnails) for s in sources]
+
+                valid_paths, features = self._infer(batch_paths, decoded)
+                self.stats.wall_seconds = time.perf_counter() - start
+                if valid_paths:
+                    yield valid_paths, features
+                batch_paths = next_paths
+
+    def extract(self, img_paths):
+        """
+        Extract features for all images.
+
+        Args:
+            img_paths: Iterable of image paths or (path, encoded bytes) pairs
+
+        Returns:
+            Tuple of (valid_paths, features) where features has one row per valid path
+        """
+        valid_paths = []
+        features_list = []
+        for batch_paths, features in self.iter_batches(img_paths):
+            valid_paths.extend(batch_paths)
+            features_list.append(features)
+
+        if not features_list:
+            return [], None
+        return valid_paths, np.concatenate(features_list, axis=0)
@@ -7,117 +7,1104 @@ Licensed under MIT License with attribution requirements
 https://github.com/CodeQueenie/InspireSearch---AI_Powered_Visual_Search_Engine
 """
 import os
+import shutil
+import threading
 import numpy as np
-import tensorflow as tf
-from tensorflow.keras.applications.resnet50 import ResNet50, preprocess_input
-from tensorflow.keras.preprocessing import image
-import faiss
-from PIL import Image
 import pickle
+from app.embedding_backends import (EmbeddingModel, resolve_embedding_config,
+                                    describe_embedding, CALIBRATION_IMAGES)
+from app.feature_pipeline import BatchFeatureExtractor, load_image
+from app.index_factory import (resolve_index_config, create_index, apply_search_params,
+                               build_signature, training_size, min_training_size,
+                               supports_remove, reconstruct_vectors, search_filtered, is_cosine,
+                               describe_config, LEGACY_METRIC)
+from app.facets import FACETS, FacetVocabulary, format_date
+from app.dataset_sources import open_dataset
+from app.manifest import IndexManifest
+from app.metadata_store import MetadataStore, FIELD_DTYPES
+from app.embedding_store import EmbeddingStore
+from app.thumbnails import THUMBNAIL_SIZES, ThumbnailStore
+from app.sharding import shard_for_path
+from app.index_versions import (current_version, version_dir, create_version, publish_version, prune_versions,
+                                link_index_files)
+from app.metrics import stage, count_error
+from app.dedupe import DUPLICATES_FILE, DISTINCT_OVERFETCH, load_duplicate_groups, collapse_duplicates
+from app.query_fusion import COMBINE_MODES, FUSION_DEPTH, combine_embeddings, reciprocal_rank_fusion
+
+def _describe_source(image):
+    """
+    Name an image source for log messages without dumping its contents.
+    
+    Args:
+        image: Path, bytes or file-like object
+        
+    Returns:
+        Printable description
+    """
+    if isinstance(image, str):
+        return image
+    if isinstance(image, (bytes, bytearray, memoryview)):
+        return f"<{len(image)} bytes>"
+    return getattr(image, "filename", None) or getattr(image, "name", None) or "<in-memory image>"
+
+class _ReadWriteLock:
+    """
+    Lock allowing many concurrent readers or one writer.
+    
+    Waiting writers block new readers, so a steady stream of searches
+    can't starve index updates.
+    """
+    
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._readers = 0
+        self._writer = False
+        self._writers_waiting = 0
+    
+    def acquire_read(self):
+        with self._cond:
+            while self._writer or self._writers_waiting:
+                self._cond.wait()
+            self._readers += 1
+    
+    def release_read(self):
+        with self._cond:
+            self._readers -= 1
+            if not self._readers:
+                self._cond.notify_all()
+    
+    def acquire_write(self):
+        with self._cond:
+            self._writers_waiting += 1
+            while self._writer or self._readers:
+                self._cond.wait()
+            self._writers_waiting -= 1
+            self._writer = True
+    
+    def release_write(self):
+        with self._cond:
+            self._writer = False
+            self._cond.notify_all()
+    
+    def read(self):
+        return _LockContext(self.acquire_read, self.release_read)
+    
+    def write(self):
+        return _LockContext(self.acquire_write, self.release_write)
+
+class _LockContext:
+    """
+    Context manager calling an acquire and a release function.
+    """
+    
+    def __init__(self, acquire, release):
+        self._acquire = acquire
+        self._release = release
+    
+    def __enter__(self):
+        self._acquire()
+    
+    def __exit__(self, *exc):
+        self._release()
 
 class ImageSearch:
-    def __init__(self, index_path="static/index", dataset_path="static/dataset"):
+    """
+    Visual search engine backed by CNN image embeddings and a Faiss index.
+    
+    TensorFlow, the model and the index are loaded lazily on first use,
+    or up front by calling warm_up().
+    """
+    
+    def __init__(self, index_path="static/index", dataset_path="static/dataset",
+                 batch_size=32, num_workers=4, index_type=None, index_params=None,
+                 shard=None, embedding_backend=None, quantize=None, model_dir=None,
+                 decode_in_processes=True, embedding_dtype="float32", thumbnail_dir=None,
+                 thumbnail_sizes=THUMBNAIL_SIZES):
         """
         Initialize the image search engine.
         
         Args:
-            index_path: Path to save/load the Faiss index and metadata
-            dataset_path: Path to the dataset images
+            index_path: Path to save/load the Faiss index and metadata. If the
+                directory is versioned, its CURRENT version is used
+            dataset_path: Dataset directory, tar or zip archive, glob of
+                archives, or CSV/JSONL manifest of image paths
+            batch_size: Number of images per model call when building the index
+            num_workers: Number of workers decoding images when building the index
+            index_type: Index type to build ("flat", "ivf_flat", "ivf_pq", "hnsw"),
+                defaults to the type of the saved index or "flat"
+            index_params: Dict of training and tuning parameters for index_type
+            shard: Optional (shard_index, num_shards) tuple; only images in
+                that shard of the dataset are indexed
+            embedding_backend: Model used to embed images ("resnet50",
+                "mobilenet_v2", "efficientnet_b0"), defaults to the backend
+                of the saved index or "resnet50"
+            quantize: None for float32 inference, or "int8" for a TFLite export
+            model_dir: Where quantized model exports are kept, defaults to index_path
+            decode_in_processes: Decode images in a process pool when building
+                the index, False to use threads
+            embedding_dtype: Type the embedding matrix saved with new indexes
+                is stored as, "float32" or "float16"
+            thumbnail_dir: Directory to save result thumbnails to while
+                building the index, None to skip them
+            thumbnail_sizes: Longest side of each thumbnail size, in pixels
         """
-        self.index_path = index_path
+        # A versioned index directory names its live version in a CURRENT file
+        self.index_root = index_path
+        self.version = current_version(index_path)
+        self._set_index_path(version_dir(index_path, self.version) if self.version else index_path)
         self.dataset_path = dataset_path
-        self.index_file = os.path.join(index_path, "faiss_index.bin")
-        self.metadata_file = os.path.join(index_path, "metadata.pkl")
+        self.source = open_dataset(dataset_path)
+        self.batch_size = batch_size
+        self.num_workers = num_workers
+        self.decode_in_processes = decode_in_processes
+        self.embedding_dtype = embedding_dtype
+        self.thumbnails = ThumbnailStore(thumbnail_dir, thumbnail_sizes) if thumbnail_dir else None
+        self.shard = shard
+        self.last_build_stats = None
+        self.build_progress = None
+        self.index_config = resolve_index_config(index_type, index_params)
+        self.active_index_config = None
+        self._requested_index_type = index_type
+        self._requested_index_params = index_params or {}
+        self.embedding_config = resolve_embedding_config(embedding_backend, quantize)
+        self.active_embedding_config = None
+        self._requested_embedding = embedding_backend is not None or quantize is not None
+        self.model_dir = model_dir or self.index_root
+        self._pending = []
         
         try:
-            # Load the pre-trained ResNet50 model without the classification layer
-            self.model = ResNet50(weights="imagenet", include_top=False, pooling="avg")
-            
             # Create the index directory if it doesn't exist
-            os.makedirs(index_path, exist_ok=True)
-            
-            # Initialize the index and metadata
-            self.index = None
-            self.image_paths = []
+            os.makedirs(self.index_path, exist_ok=True)
             
-            # Load the index if it exists
-            if os.path.exists(self.index_file) and os.path.exists(self.metadata_file):
-                self.load_index()
+            # The model and index are loaded on first use
+            self._model = None
+            self._model_lock = threading.Lock()
+            self._index = None
+            self._image_paths = []
+            self._image_fields = {name: [] for name in FIELD_DTYPES}
+            self._facets = FacetVocabulary()
+            self._embeddings = EmbeddingStore(embedding_dtype)
+            # Removed images whose vectors are still in the index (HNSW)
+            self._tombstones = 0
+            self._index_checked = False
+            self._index_lock = threading.RLock()
+            # Searches read the index concurrently; live updates and swaps write it
+            self._rw_lock = _ReadWriteLock()
+            self._manifest = None
         except Exception as e:
             print(f"Error initializing ImageSearch: {e}")
             raise
+    
+    def _set_index_path(self, index_path):
+        """
+        Point the engine's index files at a directory.
+        
+        Args:
+            index_path: Directory holding the index files
+        """
+        self.index_path = index_path
+        self.index_file = os.path.join(index_path, "faiss_index.bin")
+        self.metadata_file = os.path.join(index_path, "metadata.json")
+        self.legacy_metadata_file = os.path.join(index_path, "metadata.pkl")
+        self.manifest_file = os.path.join(index_path, "manifest.json")
+        self.duplicates_file = os.path.join(index_path, DUPLICATES_FILE)
+        self._duplicates = None
+    
+    def clone(self, index_path):
+        """
+        Create an engine with this engine's settings and model for another
+        index directory, e.g. to build a new index version.
+        
+        Args:
+            index_path: Directory for the new engine's index files
+            
+        Returns:
+            ImageSearch sharing this engine's model once it has been loaded
+        """
+        config = self.active_index_config or self.index_config
+        embedding_config = self.active_embedding_config or self.embedding_config
+        engine = ImageSearch(index_path=index_path, dataset_path=self.dataset_path,
+                             batch_size=self.batch_size, num_workers=self.num_workers,
+                             index_type=config["type"], index_params=config["params"],
+                             shard=self.shard, embedding_backend=embedding_config["backend"],
+                             quantize=embedding_config["quantize"], model_dir=self.model_dir,
+                             decode_in_processes=self.decode_in_processes,
+                             embedding_dtype=self.embedding_dtype,
+                             thumbnail_dir=self.thumbnails.cache_dir if self.thumbnails else None,
+                             thumbnail_sizes=self.thumbnails.sizes if self.thumbnails else THUMBNAIL_SIZES)
+        engine._model = self._model
+        return engine
+    
+    def swap_index(self, other, version=None):
+        """
+        Atomically start serving another engine's index.
+        
+        Searches already running finish on the old index, later ones use
+        the new one; queries are never paused.
+        
+        Args:
+            other: ImageSearch with a built or loaded index
+            version: Version name of the new index, if versioned
+        """
+        other._ensure_index()
+        with self._index_lock, self._rw_lock.write():
+            self._index = other._index
+            self._image_paths = other._image_paths
+            self._image_fields = other._image_fields
+            self._facets = other._facets
+            self._embeddings = other._embeddings
+            self._tombstones = other._tombstones
+            self._pending = []
+            self._index_checked = True
+            self.active_index_config = other.active_index_config
+            self.active_embedding_config = other.active_embedding_config
+            self.index_config = other.index_config
+            self.embedding_config = other.embedding_config
+            self._set_index_path(other.index_path)
+            self.version = version
+            self._manifest = None
+            if self._model is None:
+                self._model = other._model
+        print(f"Now serving index {version or other.index_path} with {other._index.ntotal} images")
+    
+    def _load_model(self):
+        """
+        Import TensorFlow and build the embedding model the first time it is
+        needed, or again if the embedding configuration in use has changed.
+        
+        A loaded index always dictates the backend, so queries are embedded
+        the same way as the images they are compared against.
+        """
+        self._ensure_index()
+        config = self.active_embedding_config or self.embedding_config
+        if self._model is None or self._model.config != config:
+            with self._model_lock:
+                if self._model is None or self._model.config != config:
+                    self._model = EmbeddingModel(config, self.model_dir, self._calibration_paths)
+    
+    def _calibration_paths(self):
+        """
+        Dataset images spread across the catalog, used to calibrate int8 quantization.
+        
+        Returns:
+            List of image paths
+        """
+        image_files = self._list_image_files()
+        step = max(1, len(image_files) // CALIBRATION_IMAGES)
+        return [self.source.image_source(path) for path in image_files[::step]]
+    
+    @property
+    def model(self):
+        """
+        The EmbeddingModel feature extractor, loaded on first access.
+        """
+        self._load_model()
+        return self._model
+    
+    @property
+    def preprocess_fn(self):
+        """
+        The model's input preprocessing function.
+        """
+        return self.model.preprocess
+    
+    @property
+    def embedding_id(self):
+        """
+        Identifier of the embedding configuration in use, e.g. "resnet50".
+        """
+        self._ensure_index()
+        return describe_embedding(self.active_embedding_config or self.embedding_config)
+    
+    def _ensure_index(self):
+        """
+        Load the saved index the first time it is needed.
+        """
+        if not self._index_checked:
+            with self._index_lock:
+                if not self._index_checked:
+                    self._index_checked = True
+                    if os.path.exists(self.index_file) and (
+                            os.path.exists(self.metadata_file) or
+                            os.path.exists(self.legacy_metadata_file)):
+                        self.load_index()
+    
+    @property
+    def index(self):
+        """
+        The Faiss index, loaded from disk on first access if it exists.
+        """
+        self._ensure_index()
+        return self._index
+    
+    @index.setter
+    def index(self, value):
+        self._index_checked = True
+        self._index = value
+    
+    @property
+    def image_paths(self):
+        """
+        Image path for each index id, None for removed images.
+        
+        A memory-mapped MetadataStore after load_index, a list while the
+        index is being built or updated.
+        """
+        self._ensure_index()
+        return self._image_paths
+    
+    @image_paths.setter
+    def image_paths(self, value):
+        self._index_checked = True
+        self._image_paths = value
+    
+    def _make_metadata_mutable(self):
+        """
+        Copy memory-mapped metadata into lists so images can be added or removed.
+        """
+        if isinstance(self.image_paths, MetadataStore):
+            self._image_paths, self._image_fields = self._image_paths.to_lists()
+    
+    def _live_ids(self):
+        """
+        Ids of all images that have not been removed.
+        
+        Returns:
+            int64 array of ids
+        """
+        if isinstance(self.image_paths, MetadataStore):
+            return self.image_paths.live_ids()
+        return np.array([i for i, path in enumerate(self.image_paths) if path is not None],
+                        dtype="int64")
+    
+    def get_image_info(self, image_id):
+        """
+        Look up the path and stored fields of an indexed image.
         
-    def extract_features(self, img_path):
+        Args:
+            image_id: Id of the image in the index
+            
+        Returns:
+            Dict with the path and per-image fields such as size, mtime,
+            category, folder and date, or None if the image was removed
+        """
+        path = self.image_paths[image_id]
+        if path is None:
+            return None
+        if isinstance(self.image_paths, MetadataStore):
+            info = self.image_paths.get_fields(image_id)
+        else:
+            info = {name: values[image_id] for name, values in self._image_fields.items()}
+        for facet in FACETS:
+            info[facet] = self._facets.values[facet][info[facet]]
+        info["path"] = path
+        return info
+    
+    def read_image(self, image_id):
         """
-        Extract features from an image using ResNet50.
+        Read an indexed image's encoded bytes, e.g. to serve an image stored
+        in an archive, using the offset saved with the index.
         
         Args:
-            img_path: Path to the image
+            image_id: Id of the image in the index
+            
+        Returns:
+            Tuple of (path, bytes), or None if the image was removed
+        """
+        info = self.get_image_info(image_id)
+        if info is None:
+            return None
+        path = info["path"]
+        offset, length = int(info["offset"]), int(info["length"])
+        # Stores written before offsets were saved hold zeros; let the source look them up
+        if length <= 0:
+            offset = length = -1
+        return path, self.source.read(path, offset, length)
+    
+    def content_digest(self, image_id):
+        """
+        Hash of an indexed image's file, saved when the index was built.
+        
+        Args:
+            image_id: Id of the image in the index
+            
+        Returns:
+            SHA-256 hex digest, or None if the image was removed or the index
+            predates saved digests
+        """
+        if not 0 <= image_id < len(self.image_paths) or self.image_paths[image_id] is None:
+            return None
+        if isinstance(self.image_paths, MetadataStore):
+            digest = self.image_paths.get_fields(image_id).get("sha256", b"")
+        else:
+            digest = self._image_fields["sha256"][image_id]
+        return digest.decode("ascii") if digest else None
+    
+    def _field_array(self, name):
+        """
+        One per-image field as an array indexed by image id.
+        
+        Args:
+            name: Field name from FIELD_DTYPES
+            
+        Returns:
+            Array, memory-mapped once the index has been saved and loaded
+        """
+        if isinstance(self._image_paths, MetadataStore):
+            return self._image_paths.field(name)
+        return np.asarray(self._image_fields[name], dtype=FIELD_DTYPES[name])
+    
+    def filter_ids(self, search_filter):
+        """
+        Ids of the live images a filter matches.
+        
+        Args:
+            search_filter: SearchFilter
+            
+        Returns:
+            Sorted int64 array of ids
+        """
+        live = self._live_ids()
+        mask = search_filter.matches(self._field_array, self._facets)
+        return live if mask is None else live[mask[live]]
+    
+    def facet_counts(self, search_filter=None):
+        """
+        Count images per category and folder, e.g. to offer filters in a UI.
+        
+        Args:
+            search_filter: Optional SearchFilter restricting the images counted
+            
+        Returns:
+            Dict with the number of images, counts per category and per
+            folder, and the earliest and latest date
+        """
+        try:
+            self._ensure_index()
+            with self._rw_lock.read():
+                ids = self.filter_ids(search_filter) if search_filter is not None else self._live_ids()
+                counts = {"images": len(ids)}
+                for facet in FACETS:
+                    values = self._facets.values[facet]
+                    codes, totals = np.unique(self._field_array(facet)[ids], return_counts=True)
+                    counts[facet] = {values[code]: int(total) for code, total in zip(codes, totals)}
+                dates = self._field_array("date")[ids]
+                counts["date"] = {"min": format_date(float(dates.min())) if len(dates) else None,
+                                  "max": format_date(float(dates.max())) if len(dates) else None}
+            return counts
+        except Exception as e:
+            print(f"Error counting facets: {e}")
+            count_error("facet_counts")
+            return None
+    
+    def warm_up(self):
+        """
+        Load the model and index now instead of on the first request.
+        
+        Runs one dummy prediction so the first real query doesn't pay for
+        TensorFlow's graph setup.
+        
+        Returns:
+            Boolean indicating if the engine is ready to serve
+        """
+        try:
+            dummy = np.zeros((1, 224, 224, 3), dtype="float32")
+            self.model.predict(self.preprocess_fn(dummy))
+            self._ensure_index()
+            return True
+        except Exception as e:
+            print(f"Error warming up ImageSearch: {e}")
+            count_error("warm_up")
+            return False
+    
+    def extract_features(self, image):
+        """
+        Extract features from an image using the embedding backend.
+        
+        Args:
+            image: Path to the image, its encoded bytes, or a binary file-like object
             
         Returns:
             Feature vector (embedding) for the image
         """
         try:
-            img = Image.open(img_path).convert("RGB")
-            img = img.resize((224, 224))
-            x = image.img_to_array(img)
-            x = np.expand_dims(x, axis=0)
-            x = preprocess_input(x)
-            features = self.model.predict(x)
-            return features.flatten()
+            with stage("decode"):
+                x = load_image(image)
+            return self.extract_features_from_arrays([x])[0]
         except Exception as e:
-            print(f"Error extracting features from {img_path}: {e}")
+            print(f"Error extracting features from {_describe_source(image)}: {e}")
+            count_error("extract_features")
             return None
     
-    def build_index(self):
+    def load_query_image(self, image, box=None):
+        """
+        Decode and resize a query image without running the model.
+        
+        Args:
+            image: Path to the image, its encoded bytes, or a binary file-like object
+            box: Optional (left, top, right, bottom) region of the image to
+                search with, in pixels
+            
+        Returns:
+            float32 image array, or None if the image could not be read
+        """
+        try:
+            with stage("decode"):
+                return load_image(image, box=box)
+        except Exception as e:
+            print(f"Error loading image {_describe_source(image)}: {e}")
+            count_error("load_query_image")
+            return None
+    
+    def extract_features_from_arrays(self, arrays):
+        """
+        Extract features from decoded images with a single model call.
+        
+        Args:
+            arrays: List of float32 image arrays from load_query_image
+            
+        Returns:
+            float32 array with one feature vector per image
+        """
+        model = self.model
+        with stage("preprocess"):
+            x = self.preprocess_fn(np.stack(arrays))
+        with stage("predict"):
+            features = model.predict(x, batch_size=len(arrays))
+        return features.reshape(len(arrays), -1).astype("float32")
+    
+    def _make_extractor(self):
+        """
+        Create a batched feature extractor using this engine's settings.
+        
+        Returns:
+            BatchFeatureExtractor whose stats become last_build_stats
+        """
+        extractor = BatchFeatureExtractor(self.model, self.preprocess_fn,
+                                          batch_size=self.batch_size,
+                                          num_workers=self.num_workers,
+                                          use_processes=self.decode_in_processes,
+                                          thumbnails=self.thumbnails)
+        self.last_build_stats = extractor.stats
+        return extractor
+    
+    def extract_features_batch(self, img_paths):
+        """
+        Extract features from many images, one model call per batch.
+        
+        Args:
+            img_paths: List of image paths
+            
+        Returns:
+            Tuple of (valid_paths, features) where features is a float32 array
+            with one row per valid path, or None if nothing could be extracted
+        """
+        return self._make_extractor().extract(img_paths)
+    
+    def _list_image_files(self):
+        """
+        Find all images in the dataset, limited to this engine's shard if
+        it has one.
+        
+        Returns:
+            Sorted list of image paths, or locators for images in archives
+        """
+        return [path for path in self.source.list() if self._is_dataset_image(path)]
+    
+    def _add_embeddings(self, paths, features, digests=None):
+        """
+        Add embeddings to the index, assigning each the next free id.
+        
+        Indexes that need training buffer their embeddings until enough
+        have been collected to train on.
+        
+        Args:
+            paths: Image paths, one per feature row
+            features: float32 array of embeddings
+            digests: SHA-256 hex digests of the image files, one per path
+            
+        Returns:
+            Array of the ids assigned to the images
+        """
+        if self.index is None:
+            self.index = create_index(self.index_config, features.shape[1])
+            self.active_index_config = self.index_config
+            self.active_embedding_config = self.embedding_config
+        
+        self._make_metadata_mutable()
+        start = len(self.image_paths)
+        ids = np.arange(start, start + len(paths), dtype="int64")
+        # Rows of the embedding matrix must line up with image ids
+        if self._embeddings is not None:
+            if self._embeddings.rows == start:
+                self._embeddings.append(features)
+            else:
+                # Can't be repaired from the index, which only holds
+                # normalised or projected vectors
+                print(f"Embedding matrix has {self._embeddings.rows} rows but the index has {start} "
+                      f"images; no longer saving embeddings until the index is built again")
+                count_error("embedding_rows")
+                self._embeddings = None
+        self.image_paths.extend(paths)
+        for path, digest in zip(paths, digests or [None] * len(paths)):
+            size, mtime = self.source.stat(path)
+            self._image_fields["size"].append(size)
+            self._image_fields["mtime"].append(mtime)
+            attributes = self.source.attributes(path, mtime)
+            for facet in FACETS:
+                self._image_fields[facet].append(self._facets.code(facet, attributes[facet]))
+            self._image_fields["date"].append(attributes["date"])
+            offset, length = self.source.locate(path)
+            self._image_fields["offset"].append(offset)
+            self._image_fields["length"].append(length)
+            self._image_fields["sha256"].append(digest.encode("ascii") if digest else b"")
+        
+        if self.index.is_trained:
+            self.index.add_with_ids(features, ids)
+        else:
+            self._pending.append((features, ids))
+            if sum(len(p_ids) for _, p_ids in self._pending) >= training_size(self.active_index_config):
+                self._train_pending()
+        return ids
+    
+    def _train_pending(self):
+        """
+        Train the index on the buffered embeddings and add them.
+        
+        Returns:
+            Boolean indicating if the index could be trained
+        """
+        if not self._pending:
+            return True
+        
+        features = np.concatenate([f for f, _ in self._pending])
+        ids = np.concatenate([i for _, i in self._pending])
+        if len(features) < min_training_size(self.active_index_config):
+            print(f"Not enough images to train a {self.active_index_config['type']} index: "
+                  f"got {len(features)}, need at least {min_training_size(self.active_index_config)}")
+            return False
+        
+        self.index.train(features)
+        self.index.add_with_ids(features, ids)
+        self._pending = []
+        return True
+    
+    def _remove_ids(self, ids):
+        """
+        Remove images from the index by id.
+        
+        Ids stay reserved; their image_paths slot is set to None. Indexes
+        that can't remove vectors (HNSW) keep them as tombstones; searches
+        fetch that many extra hits and skip them because their path is None.
+        
+        Args:
+            ids: Iterable of image ids
+        """
+        ids = [i for i in ids if i is not None]
+        if not ids or self.index is None:
+            return
+        
+        self._make_metadata_mutable()
+        removable = supports_remove(self.active_index_config)
+        if removable:
+            self.index.remove_ids(np.array(ids, dtype="int64"))
+        for i in ids:
+            if i < len(self.image_paths) and self.image_paths[i] is not None:
+                self.image_paths[i] = None
+                if not removable:
+                    self._tombstones += 1
+    
+    def _save_checkpoint(self, manifest):
+        """
+        Save the index, metadata and manifest together.
+        
+        Args:
+            manifest: IndexManifest describing the saved index
+            
+        Returns:
+            Boolean indicating if the checkpoint was successfully saved
+        """
+        # An index still waiting for training data can't be saved yet
+        if self._pending:
+            return False
+        if not self.save_index():
+            return False
+        manifest.save(self.manifest_file)
+        return True
+    
+    def _reset_index(self):
+        """
+        Drop the in-memory index so the next build starts from scratch.
+        """
+        self.index = None
+        self.active_index_config = None
+        self.active_embedding_config = None
+        self.image_paths = []
+        self._image_fields = {name: [] for name in FIELD_DTYPES}
+        self._facets = FacetVocabulary()
+        self._embeddings = EmbeddingStore(self.embedding_dtype)
+        self._tombstones = 0
+        self._pending = []
+    
+    def build_index(self, incremental=False, checkpoint_every=50):
         """
         Build a Faiss index from all images in the dataset directory.
         
+        A full build starts from scratch. An incremental build only embeds
+        new or changed images and removes deleted ones. Progress is
+        checkpointed as the build runs, and a build that was interrupted
+        resumes from its last checkpoint.
+        
+        Args:
+            incremental: Update the existing index instead of rebuilding it
+            checkpoint_every: Number of batches between checkpoints, 0 to disable
+        
         Returns:
             Boolean indicating if the index was successfully built
         """
         try:
             # Get all image files from the dataset directory
-            image_files = []
-            for root, _, files in os.walk(self.dataset_path):
-                for file in files:
-                    if file.lower().endswith((".png", ".jpg", ".jpeg")):
-                        image_files.append(os.path.join(root, file))
+            image_files = self._list_image_files()
             
             if not image_files:
                 print(f"No images found in {self.dataset_path}")
                 return False
             
-            # Extract features for all images
-            features_list = []
-            valid_paths = []
-            
-            for img_path in image_files:
-                features = self.extract_features(img_path)
-                if features is not None:
-                    features_list.append(features)
-                    valid_paths.append(img_path)
-                    
-            if not features_list:
-                print("No valid features extracted")
-                return False
+            self._ensure_index()
+            manifest = IndexManifest.load(self.manifest_file)
+            resume = manifest is not None and not manifest.complete
+            same_config = (self.active_index_config is not None and
+                           build_signature(self.active_index_config) == build_signature(self.index_config) and
+                           self.active_embedding_config == self.embedding_config)
+            if manifest is None or self.index is None or not same_config or not (incremental or resume):
+                manifest = IndexManifest()
+                self._reset_index()
+            elif resume:
+                print("Resuming interrupted build from the last checkpoint")
+            
+            # Search parameters can change without rebuilding
+            params_changed = False
+            if self.index is not None:
+                params_changed = self.active_index_config != self.index_config
+                apply_search_params(self.index, self.index_config)
+                self.active_index_config = self.index_config
+            
+            # Drop index entries the manifest doesn't know about, e.g. from a
+            # checkpoint that stopped before its manifest was written
+            known_ids = manifest.ids()
+            stale_ids = [i for i, path in enumerate(self.image_paths)
+                         if path is not None and i not in known_ids]
+            
+            to_embed, to_remove = manifest.diff(image_files, self.source)
+            
+            # HNSW graphs can't drop vectors, so removals need a full rebuild
+            if (to_remove or stale_ids) and not supports_remove(self.index_config):
+                print(f"{self.index_config['type']} indexes don't support removal, rebuilding")
+                manifest = IndexManifest()
+                self._reset_index()
+                stale_ids = []
+                to_embed, to_remove = manifest.diff(image_files, self.source)
+            
+            stale_ids.extend(manifest.remove(path) for path in to_remove)
+            
+            if self.index is not None and not to_embed and not stale_ids and not resume:
+                if params_changed:
+                    self.save_index()
+                manifest.save(self.manifest_file)
+                print("Index is up to date")
+                return True
+            
+            self._remove_ids(stale_ids)
+            
+            # Extract features in batches, checkpointing as we go
+            extractor = self._make_extractor()
+            self.build_progress = {"embedded": 0, "total": len(to_embed)}
+            batches = extractor.iter_batches(self.source.iter_data(to_embed))
+            for batch_num, (paths, features) in enumerate(batches, 1):
+                # The decode pass hashed each image, so the manifest needn't read it again
+                digests = [extractor.digests.pop(path, None) for path in paths]
+                ids = self._add_embeddings(paths, features, digests)
+                for path, image_id, digest in zip(paths, ids, digests):
+                    manifest.record(path, image_id, self.source, digest)
+                self._record_failures(extractor, manifest)
+                self.build_progress["embedded"] += len(paths)
+                
+                if checkpoint_every and batch_num % checkpoint_every == 0:
+                    manifest.complete = False
+                    self._save_checkpoint(manifest)
             
-            # Convert to numpy array
-            features_array = np.array(features_list).astype("float32")
+            # Batches where every image failed aren't yielded
+            self._record_failures(extractor, manifest)
             
-            # Create and train the index
-            dimension = features_array.shape[1]  # Dimension of the feature vector
-            self.index = faiss.IndexFlatL2(dimension)
-            self.index.add(features_array)
-            self.image_paths = valid_paths
+            if not self._train_pending():
+                self._reset_index()
+                return False
+            
+            if self.index is None or self.index.ntotal == 0:
+                print("No valid features extracted")
+                return False
             
             # Save the index and metadata
-            self.save_index()
+            manifest.complete = True
+            if not self._save_checkpoint(manifest):
+                return False
             
-            print(f"Index built with {len(valid_paths)} images")
+            print(f"Index built with {self.index.ntotal} images "
+                  f"({extractor.stats.images['inference']} embedded, {len(stale_ids)} removed)")
             return True
         except Exception as e:
             print(f"Error building index: {e}")
+            count_error("build_index")
+            return False
+    
+    def _record_failures(self, extractor, manifest):
+        """
+        Move the images an extractor couldn't decode into the manifest.
+        
+        Args:
+            extractor: BatchFeatureExtractor used for the update
+            manifest: IndexManifest being updated
+        """
+        for path, error in extractor.failed.items():
+            manifest.record_failure(path, error, self.source)
+        extractor.failed.clear()
+    
+    def _is_dataset_image(self, path):
+        """
+        Whether a path is an image this engine indexes.
+        
+        Args:
+            path: File path inside the dataset directory, or archive locator
+            
+        Returns:
+            Boolean
+        """
+        if not path.lower().endswith((".png", ".jpg", ".jpeg")):
+            return False
+        if self.shard is not None:
+            shard_index, num_shards = self.shard
+            return shard_for_path(path, self.dataset_path, num_shards) == shard_index
+        return True
+    
+    def _live_manifest(self):
+        """
+        Manifest of the loaded index, kept in memory for live updates.
+        
+        Indexes saved without a manifest get one built from their paths;
+        images that no longer exist are recorded so they will be removed.
+        
+        Returns:
+            IndexManifest
+        """
+        if self._manifest is None:
+            manifest = IndexManifest.load(self.manifest_file)
+            if manifest is None:
+                manifest = IndexManifest()
+                for image_id, path in enumerate(self.image_paths):
+                    if path is None:
+                        continue
+                    if self.source.exists(path):
+                        manifest.record(path, image_id, self.source)
+                    else:
+                        manifest.entries[path] = {"id": image_id, "size": -1, "mtime": -1, "sha256": ""}
+            self._manifest = manifest
+        return self._manifest
+    
+    def sync_dataset(self, paths=None, batch_size=16):
+        """
+        Apply dataset changes to the live index while it keeps serving searches.
+        
+        New and changed images are embedded in small batches without holding
+        any lock; each batch is then added under a brief write lock, so
+        searches only ever wait for the Faiss add itself.
+        
+        Args:
+            paths: Paths that may have been added, changed or deleted, e.g.
+                from filesystem events, or None to compare the whole dataset
+            batch_size: Number of images embedded per model call
+            
+        Returns:
+            Tuple of (number of images embedded, number removed)
+        """
+        manifest = self._live_manifest()
+        if paths is None:
+            to_embed, to_remove = manifest.diff(self._list_image_files(), self.source)
+        else:
+            to_embed, to_remove = manifest.diff_paths([p for p in paths if self._is_dataset_image(p)],
+                                                      self.source)
+        
+        if to_remove:
+            with self._rw_lock.write():
+                self._remove_ids([manifest.remove(path) for path in to_remove])
+        
+        # Decode on threads: a process pool isn't worth starting for a few images
+        extractor = BatchFeatureExtractor(self.model, self.preprocess_fn, batch_size=batch_size,
+                                          num_workers=self.num_workers, use_processes=False,
+                                          thumbnails=self.thumbnails)
+        embedded = 0
+        for batch_paths, features in extractor.iter_batches(self.source.iter_data(to_embed)):
+            digests = [extractor.digests.pop(path, None) for path in batch_paths]
+            with self._rw_lock.write():
+                ids = self._add_embeddings(batch_paths, features, digests)
+            for path, image_id, digest in zip(batch_paths, ids, digests):
+                manifest.record(path, image_id, self.source, digest)
+            embedded += len(batch_paths)
+        self._record_failures(extractor, manifest)
+        
+        if self._pending:
+            with self._rw_lock.write():
+                self._train_pending()
+        
+        if embedded or to_remove:
+            print(f"Live index update: {embedded} embedded, {len(to_remove)} removed")
+        return embedded, len(to_remove)
+    
+    def persist(self, keep_versions=2):
+        """
+        Save the live index after updates made with sync_dataset.
+        
+        A versioned index is saved as a new version and published, other
+        indexes are saved in place. The new version starts with hard links
+        to the live version's files, so files the updates didn't change,
+        such as the duplicate report, carry over without being copied, and
+        new embeddings are appended to the shared embedding matrix. Searches
+        continue while saving.
+        
+        Args:
+            keep_versions: Number of versions kept on disk
+            
+        Returns:
+            Boolean indicating if the index was saved
+        """
+        # An index still waiting for training data can't be saved yet
+        if self._pending or self._index is None:
+            return False
+        
+        version = previous = None
+        if self.version is not None:
+            version, path = create_version(self.index_root)
+            link_index_files(self.index_path, path)
+            # Searches may be reading the index files, e.g. the duplicate report
+            with self._rw_lock.write():
+                previous = (self.index_path, self.version)
+                self._set_index_path(path)
+                self.version = version
+        
+        with self._rw_lock.read():
+            saved = self.save_index()
+            if saved:
+                self._live_manifest().save(self.manifest_file)
+        
+        if not saved:
+            if previous is not None:
+                with self._rw_lock.write():
+                    self._set_index_path(previous[0])
+                    self.version = previous[1]
+                shutil.rmtree(path, ignore_errors=True)
+            return False
+        
+        if version is not None:
+            publish_version(self.index_root, version)
+            prune_versions(self.index_root, keep=keep_versions)
+        return True
+    
+    def saved_embeddings(self):
+        """
+        Raw embeddings of all indexed images from the saved embedding matrix.
+        
+        Unlike reconstruct_embeddings these are the model's own outputs,
+        before any normalisation, projection or quantization in the index.
+        
+        Returns:
+            Tuple of (ids, features), or (None, None) if the index has no
+            saved embedding matrix
+        """
+        if self.index is None or self._embeddings is None:
+            return None, None
+        ids = self._live_ids()
+        matrix = self._embeddings.matrix()
+        if matrix is None or (len(ids) and ids[-1] >= len(matrix)):
+            return None, None
+        return ids, np.asarray(matrix[ids], dtype="float32")
+    
+    def reconstruct_embeddings(self):
+        """
+        Read the embeddings of all indexed images back out of the index.
+        
+        Returns:
+            Tuple of (ids, features), or (None, None) if no index is loaded
+        """
+        if self.index is None:
+            return None, None
+        ids = self._live_ids()
+        return ids, reconstruct_vectors(self.index, ids)
+    
+    def reindex(self, chunk_size=65536):
+        """
+        Build an index of the configured type and metric from the saved
+        embedding matrix, without loading the model or decoding any images.
+        
+        The matrix is streamed from its memory-mapped file in chunks. Image
+        ids, metadata, the manifest and any duplicate report stay valid.
+        
+        Args:
+            chunk_size: Number of embeddings read and added at a time
+            
+        Returns:
+            Boolean indicating if the index was rebuilt and saved
+        """
+        try:
+            if not MetadataStore.exists(self.index_path):
+                print(f"No index found in {self.index_path}")
+                return False
+            store = MetadataStore.open(self.index_path)
+            embeddings = EmbeddingStore.open(self.index_path, rows=len(store))
+            if embeddings is None:
+                print("This index has no saved embeddings; build it again once to enable reindexing")
+                return False
+            
+            # Without an explicit type, rebuild the saved type with any new parameters
+            config = self.index_config
+            saved_config = store.info.get("index_config")
+            if self._requested_index_type is None and saved_config:
+                params = dict(saved_config["params"])
+                params.setdefault("metric", LEGACY_METRIC)
+                params.update(self._requested_index_params)
+                config = resolve_index_config(saved_config["type"], params)
+            
+            matrix = embeddings.matrix()
+            ids = store.live_ids()
+            index = create_index(config, embeddings.dimension)
+            if not index.is_trained:
+                if len(ids) < min_training_size(config):
+                    print(f"Not enough images to train a {config['type']} index: "
+                          f"got {len(ids)}, need at least {min_training_size(config)}")
+                    return False
+                # Train on a sample spread evenly over the whole matrix
+                sample_size = min(len(ids), max(training_size(config), min_training_size(config)))
+                sample = ids[np.linspace(0, len(ids) - 1, sample_size).astype("int64")]
+                index.train(np.ascontiguousarray(matrix[sample], dtype="float32"))
+            for start in range(0, len(ids), chunk_size):
+                chunk = ids[start:start + chunk_size]
+                index.add_with_ids(np.ascontiguousarray(matrix[chunk], dtype="float32"), chunk)
+            apply_search_params(index, config)
+            
+            with self._index_lock, self._rw_lock.write():
+                self._index = index
+                self._index_checked = True
+                self._image_paths = store
+                self._facets = FacetVocabulary(store.info.get("facets"))
+                self._embeddings = embeddings
+                self._tombstones = 0
+                self._pending = []
+                self.active_index_config = config
+                self.index_config = config
+                self.active_embedding_config = store.info.get("embedding_config") or resolve_embedding_config()
+            print(f"Reindexed {index.ntotal} embeddings into {describe_config(config)}")
+            return self.save_index()
+        except Exception as e:
+            print(f"Error reindexing: {e}")
+            count_error("reindex")
             return False
     
     def save_index(self):
@@ -131,47 +1118,142 @@ class ImageSearch:
             # Create the directory if it doesn't exist
             os.makedirs(os.path.dirname(self.index_file), exist_ok=True)
             
-            # Save the Faiss index
-            faiss.write_index(self.index, self.index_file)
+            import faiss
+            
+            # Saved before the metadata, whose image count says how many rows are valid
+            if self._embeddings is not None:
+                self._embeddings.save(self.index_path)
+            
+            # Write to temporary files first so readers never see a partial index
+            faiss.write_index(self.index, f"{self.index_file}.tmp")
+            os.replace(f"{self.index_file}.tmp", self.index_file)
             
-            # Save the image paths
-            with open(self.metadata_file, "wb") as f:
-                pickle.dump(self.image_paths, f)
+            if isinstance(self.image_paths, MetadataStore):
+                paths, fields = self.image_paths.to_lists()
+            else:
+                paths, fields = self.image_paths, self._image_fields
+            MetadataStore.write(self.index_path, paths, fields,
+                                info={"index_config": self.active_index_config,
+                                      "embedding_config": self.active_embedding_config,
+                                      "facets": self._facets.to_dict()})
                 
             print(f"Index saved to {self.index_file}")
             return True
         except Exception as e:
             print(f"Error saving index: {e}")
+            count_error("save_index")
             return False
     
     def load_index(self):
         """
-        Load the Faiss index and image paths from disk.
+        Load the Faiss index, its configuration and image paths from disk.
         
         Returns:
             Boolean indicating if the index was successfully loaded
         """
         try:
+            import faiss
+            
             # Load the Faiss index
             self.index = faiss.read_index(self.index_file)
             
-            # Load the image paths
-            with open(self.metadata_file, "rb") as f:
-                self.image_paths = pickle.load(f)
+            # Memory-map the image metadata instead of reading it into Python objects
+            if MetadataStore.exists(self.index_path):
+                store = MetadataStore.open(self.index_path)
+                self.image_paths = store
+                index_config = store.info.get("index_config")
+                embedding_config = store.info.get("embedding_config")
+                self._facets = FacetVocabulary(store.info.get("facets"))
+            else:
+                index_config = self._load_legacy_metadata()
+                embedding_config = None
+                self._facets = FacetVocabulary()
+            # Indexes saved before the embedding matrix existed can't be reindexed
+            self._embeddings = EmbeddingStore.open(self.index_path, rows=len(self._image_paths))
+            # Vectors of images removed from an index that can't remove them
+            self._tombstones = max(0, self.index.ntotal - len(self._live_ids()))
+            # Resolving again fills in parameters added since the index was saved.
+            # Indexes from before the metric setting used L2 distance
+            if index_config:
+                params = dict(index_config["params"])
+                params.setdefault("metric", LEGACY_METRIC)
+                self.active_index_config = resolve_index_config(index_config["type"], params)
+            else:
+                self.active_index_config = resolve_index_config("flat", {"metric": LEGACY_METRIC})
+            
+            # Indexes from before pluggable backends were built with ResNet50
+            self.active_embedding_config = embedding_config or resolve_embedding_config()
+            if not self._requested_embedding:
+                self.embedding_config = self.active_embedding_config
+            self._pending = []
+            
+            apply_search_params(self.index, self.active_index_config)
+            # Without an explicit type, keep building the saved configuration
+            if self._requested_index_type is None:
+                params = dict(self.active_index_config["params"])
+                params.update(self._requested_index_params)
+                self.index_config = resolve_index_config(self.active_index_config["type"], params)
                 
-            print(f"Index loaded with {len(self.image_paths)} images")
+            print(f"Index loaded with {self.index.ntotal} images")
             return True
         except Exception as e:
             print(f"Error loading index: {e}")
+            count_error("load_index")
             return False
     
-    def search(self, query_image_path, top_k=5):
+    def _load_legacy_metadata(self):
+        """
+        Read image paths from a metadata.pkl written by older versions.
+        
+        Returns:
+            Saved index configuration, or None if the file predates it
+        """
+        with open(self.legacy_metadata_file, "rb") as f:
+            metadata = pickle.load(f)
+        
+        # The oldest indexes stored only the list of image paths
+        if isinstance(metadata, list):
+            metadata = {"image_paths": metadata, "index_config": None}
+        self.image_paths = list(metadata["image_paths"])
+        self._image_fields = {name: [np.zeros((), dtype=dtype).item()] * len(self.image_paths)
+                              for name, dtype in FIELD_DTYPES.items()}
+        return metadata["index_config"]
+    
+    def duplicate_groups(self):
+        """
+        Duplicate clusters from the report saved with the index by
+        index_images.py --find-duplicates, reloaded when the report changes.
+        
+        Returns:
+            Dict mapping each duplicate's path to its cluster's representative
+            path, empty if there is no report
+        """
+        try:
+            mtime = os.path.getmtime(self.duplicates_file)
+        except OSError:
+            return {}
+        cached = self._duplicates
+        if cached is None or cached[0] != mtime:
+            try:
+                cached = self._duplicates = (mtime, load_duplicate_groups(self.duplicates_file))
+            except Exception as e:
+                print(f"Error loading duplicate report: {e}")
+                count_error("load_duplicates")
+                return {}
+        return cached[1]
+    
+    def search(self, query_image, top_k=5, min_score=None, distinct=False, search_filter=None):
         """
         Search for similar images.
         
         Args:
-            query_image_path: Path to the query image
+            query_image: Path to the query image, its encoded bytes, or a
+                binary file-like object; uploads can be searched without
+                being written to disk
             top_k: Number of similar images to return
+            min_score: Optional smallest cosine similarity returned, see search_batch
+            distinct: Return one image per duplicate cluster, see search_batch
+            search_filter: Optional SearchFilter the results must match
             
         Returns:
             List of paths to similar images and their distances
@@ -182,27 +1264,288 @@ class ImageSearch:
                 return []
             
             # Extract features from the query image
-            query_features = self.extract_features(query_image_path)
+            query_features = self.extract_features(query_image)
             if query_features is None:
-                print(f"Could not extract features from {query_image_path}")
+                print(f"Could not extract features from {_describe_source(query_image)}")
                 return []
             
-            # Reshape for Faiss
-            query_features = np.array([query_features]).astype("float32")
+            return self.search_by_features(query_features, top_k=top_k, min_score=min_score,
+                                           distinct=distinct, search_filter=search_filter)
+        except Exception as e:
+            print(f"Error searching for similar images: {e}")
+            count_error("search")
+            return []
+    
+    def search_multi(self, query_images, boxes=None, top_k=5, combine="mean", min_score=None,
+                     distinct=False, search_filter=None):
+        """
+        Search with several query images, or regions of them, as one query.
+        
+        The images are embedded with one model call and searched with one
+        index search, see search_combined.
+        
+        Args:
+            query_images: List of paths, encoded bytes or binary file-like objects
+            boxes: Optional list with a (left, top, right, bottom) crop in
+                pixels or None for each image
+            top_k: Number of similar images to return
+            combine: How the queries are combined, one of COMBINE_MODES
+            min_score: Optional smallest cosine similarity returned, see search_batch
+            distinct: Return one image per duplicate cluster, see search_batch
+            search_filter: Optional SearchFilter the results must match
             
-            # Search the index
-            distances, indices = self.index.search(query_features, min(top_k, len(self.image_paths)))
+        Returns:
+            List of paths to similar images and their distances
+        """
+        try:
+            if self.index is None:
+                print("Index not loaded")
+                return []
             
-            # Get the image paths for the results
-            results = []
-            for i, idx in enumerate(indices[0]):
-                if idx < len(self.image_paths):
-                    results.append({
-                        "path": self.image_paths[idx],
-                        "distance": float(distances[0][i])
-                    })
+            boxes = boxes or [None] * len(query_images)
+            arrays = []
+            for image, box in zip(query_images, boxes):
+                array = self.load_query_image(image, box)
+                if array is None:
+                    print(f"Could not read query image {_describe_source(image)}")
+                    return []
+                arrays.append(array)
             
-            return results
+            query_features = self.extract_features_from_arrays(arrays)
+            return self.search_combined(query_features, top_k=top_k, combine=combine, min_score=min_score,
+                                        distinct=distinct, search_filter=search_filter)
         except Exception as e:
-            print(f"Error searching for similar images: {e}")
+            print(f"Error searching with multiple images: {e}")
+            count_error("search")
             return []
+    
+    def search_combined(self, query_features, top_k=5, combine="mean", min_score=None, distinct=False,
+                        search_filter=None):
+        """
+        Search with several query embeddings as one query.
+        
+        "mean" searches once with the average embedding. "rrf" searches all
+        embeddings in one batched index search and merges the ranked lists
+        by reciprocal rank fusion; merged results carry a "fused_score".
+        
+        Args:
+            query_features: Array with one feature vector per query image
+            top_k: Number of similar images to return
+            combine: One of COMBINE_MODES
+            min_score: Optional smallest cosine similarity returned, see search_batch
+            distinct: Return one image per duplicate cluster, see search_batch
+            search_filter: Optional SearchFilter the results must match
+            
+        Returns:
+            List of paths to similar images and their distances
+        """
+        if combine not in COMBINE_MODES:
+            raise ValueError(f"Unknown combine mode '{combine}', expected one of {COMBINE_MODES}")
+        
+        if combine == "mean":
+            return self.search_batch(combine_embeddings(query_features), top_k=top_k, min_score=min_score,
+                                     distinct=distinct, search_filter=search_filter)[0]
+        
+        result_lists = self.search_batch(query_features, top_k=top_k * FUSION_DEPTH, min_score=min_score,
+                                         distinct=distinct, search_filter=search_filter)
+        fused = reciprocal_rank_fusion(result_lists)
+        # Different queries can match different copies of the same image
+        groups = self.duplicate_groups() if distinct else {}
+        if groups:
+            return collapse_duplicates(fused, groups, top_k)
+        return fused[:top_k]
+    
+    def search_by_features(self, query_features, top_k=5, min_score=None, distinct=False,
+                           search_filter=None):
+        """
+        Search for images similar to an already extracted feature vector.
+        
+        Args:
+            query_features: Feature vector of the query image
+            top_k: Number of similar images to return
+            min_score: Optional smallest cosine similarity returned, see search_batch
+            distinct: Return one image per duplicate cluster, see search_batch
+            search_filter: Optional SearchFilter the results must match
+            
+        Returns:
+            List of paths to similar images and their distances
+        """
+        return self.search_batch(np.array([query_features]), top_k=top_k, min_score=min_score,
+                                 distinct=distinct, search_filter=search_filter)[0]
+    
+    @staticmethod
+    def _make_result(image_id, path, value, cosine):
+        """
+        Build one search result from an index hit.
+        
+        Args:
+            image_id: Index id of the image
+            path: Path of the image
+            value: Inner product for cosine indexes, squared L2 distance otherwise
+            cosine: Whether the index is a cosine index
+            
+        Returns:
+            Dict with the id, path, distance (lower is closer) and score, the
+            cosine similarity, or None for L2 indexes
+        """
+        if cosine:
+            return {"id": int(image_id), "path": path, "distance": 1.0 - float(value), "score": float(value)}
+        return {"id": int(image_id), "path": path, "distance": float(value), "score": None}
+    
+    def search_batch(self, query_features, top_k=5, min_score=None, distinct=False, search_filter=None):
+        """
+        Search for several queries with a single index search.
+        
+        Args:
+            query_features: Array with one feature vector per query
+            top_k: Number of similar images to return per query
+            min_score: Optional smallest cosine similarity returned, between
+                -1 and 1; results below it are cut off. Ignored by L2 indexes,
+                whose distances have no absolute scale
+            distinct: Keep only the best-ranked image of each duplicate cluster
+                in the index's duplicate report. More candidates are fetched
+                to make up for the collapsed ones, as they are for removed
+                images still in the index
+            search_filter: Optional SearchFilter; only matching images are
+                searched, see search_filtered
+            
+        Returns:
+            List with one result list per query, each holding ids, paths,
+            distances and scores, closest first
+        """
+        try:
+            # Faiss expects a contiguous float32 matrix
+            query_features = np.ascontiguousarray(query_features, dtype="float32")
+            groups = self.duplicate_groups() if distinct else {}
+            fetch = top_k * DISTINCT_OVERFETCH if groups else top_k
+            
+            # Hold the read lock so live updates and swap_index never change
+            # the index or its paths while this search uses them
+            self._ensure_index()
+            with self._rw_lock.read():
+                index, image_paths = self._index, self._image_paths
+                if index is None:
+                    print("Index not loaded")
+                    return [[] for _ in range(len(query_features))]
+                cosine = is_cosine(self.active_index_config)
+                
+                # Search the index, only among the filter's matches if there is one
+                if search_filter is None:
+                    # Removed images still in the index take up hits; the filter excludes them
+                    with stage("index_search"):
+                        distances, indices = index.search(query_features,
+                                                          min(fetch + self._tombstones, index.ntotal))
+                else:
+                    with stage("filter"):
+                        allowed = self.filter_ids(search_filter)
+                    with stage("index_search"):
+                        distances, indices = search_filtered(index, self.active_index_config, query_features,
+                                                             fetch, allowed, len(image_paths))
+                
+                # Get the image paths for the results, skipping removed images
+                all_results = []
+                for row in range(len(query_features)):
+                    results = []
+                    for i, idx in enumerate(indices[row]):
+                        # Hits come best first, so stop at the first one below the cutoff
+                        if cosine and min_score is not None and distances[row][i] < min_score:
+                            break
+                        if 0 <= idx < len(image_paths) and image_paths[idx] is not None:
+                            results.append(self._make_result(idx, image_paths[idx], distances[row][i], cosine))
+                    if groups:
+                        results = collapse_duplicates(results, groups, top_k)
+                    all_results.append(results[:top_k])
+            
+            return all_results
+        except Exception as e:
+            print(f"Error searching for similar images: {e}")
+            count_error("search")
+            return [[] for _ in range(len(query_features))]
+    
+    @staticmethod
+    def _cut_off(scores, indices, min_score):
+        """
+        Turn top-k search results into range search results.
+        
+        Args:
+            scores: Cosine similarities from a top-k search
+            indices: Ids from the same search, -1 for missing results
+            min_score: Smallest cosine similarity kept
+            
+        Returns:
+            Tuple of (lims, scores, ids) laid out like index.range_search's
+        """
+        keep = (scores >= min_score) & (indices >= 0)
+        lims = np.concatenate([[0], np.cumsum(keep.sum(axis=1))])
+        return lims, scores[keep], indices[keep]
+    
+    def range_search_batch(self, query_features, min_score, max_results=1000, distinct=False,
+                           search_filter=None):
+        """
+        Find every image scoring at least min_score against each query.
+        
+        Uses the index's range search, so how many results come back depends
+        on the threshold rather than on a top_k fetched and filtered afterwards.
+        
+        Args:
+            query_features: Array with one feature vector per query
+            min_score: Smallest cosine similarity returned, between -1 and 1
+            max_results: Most results returned per query
+            distinct: Keep only the best-ranked image of each duplicate cluster
+            search_filter: Optional SearchFilter the results must match; filtered
+                searches fetch the max_results best matches and cut them off
+            
+        Returns:
+            List with one result list per query, each holding ids, paths,
+            distances and scores, closest first
+        """
+        try:
+            query_features = np.ascontiguousarray(query_features, dtype="float32")
+            groups = self.duplicate_groups() if distinct else {}
+            
+            self._ensure_index()
+            with self._rw_lock.read():
+                index, image_paths = self._index, self._image_paths
+                if index is None:
+                    print("Index not loaded")
+                    return [[] for _ in range(len(query_features))]
+                if not is_cosine(self.active_index_config):
+                    raise ValueError("range search needs a cosine index, rebuild it with --metric cosine")
+                
+                if search_filter is not None:
+                    with stage("filter"):
+                        allowed = self.filter_ids(search_filter)
+                    with stage("index_search"):
+                        scores, indices = search_filtered(index, self.active_index_config, query_features,
+                                                          max_results, allowed, len(image_paths))
+                        lims, scores, indices = self._cut_off(scores, indices, min_score)
+                else:
+                    with stage("index_search"):
+                        try:
+                            lims, scores, indices = index.range_search(query_features, float(min_score))
+                        except RuntimeError:
+                            # Index types without range search in this Faiss build
+                            # fall back to a top-k search cut off at the threshold
+                            scores, indices = index.search(query_features,
+                                                           min(max_results + self._tombstones, index.ntotal))
+                            lims, scores, indices = self._cut_off(scores, indices, min_score)
+                
+                all_results = []
+                for row in range(len(query_features)):
+                    start, end = int(lims[row]), int(lims[row + 1])
+                    results = []
+                    for i in start + np.argsort(-scores[start:end], kind="stable"):
+                        idx = indices[i]
+                        if 0 <= idx < len(image_paths) and image_paths[idx] is not None:
+                            results.append(self._make_result(idx, image_paths[idx], scores[i], True))
+                            if not groups and len(results) >= max_results:
+                                break
+                    if groups:
+                        results = collapse_duplicates(results, groups, max_results)
+                    all_results.append(results)
+            
+            return all_results
+        except Exception as e:
+            print(f"Error in range search: {e}")
+            count_error("range_search")
+            return [[] for _ in range(len(query_features))]
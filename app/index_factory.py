@@ -0,0 +1,543 @@
+"""
+InspireSearch - AI-Powered Visual Search Engine
+Faiss index types, tuning parameters and recall benchmarking
+
+Copyright (c) 2025 Nicole LeGuern
+Licensed under MIT License with attribution requirements
+https://github.com/CodeQueenie/InspireSearch---AI_Powered_Visual_Search_Engine
+"""
+import time
+import numpy as np
+
+# faiss is imported inside the functions that need it so that importing
+# this module (and the web app) doesn't pay for loading it
+
+# Default training and tuning parameters for each supported index type
+INDEX_TYPES = {
+    "flat": {},
+    "ivf_flat": {"nlist": 100, "nprobe": 8},
+    "ivf_pq": {"nlist": 100, "nprobe": 8, "m": 64, "nbits": 8},
+    "hnsw": {"M": 32, "efConstruction": 40, "efSearch": 64},
+}
+
+# Optional projection applied inside the index before vectors are stored,
+# shrinking them to projection_dim dimensions ("none", "pca" or "opq")
+PROJECTION_PARAMS = {"projection": "none", "projection_dim": 256}
+PROJECTIONS = ("none", "pca", "opq")
+
+# Similarity used by the index. "cosine" stores L2-normalised vectors in an
+# inner-product index, so results carry an absolute cosine score; "l2" is the
+# Euclidean distance on raw features that indexes were built with before
+METRIC_PARAMS = {"metric": "cosine"}
+METRICS = ("cosine", "l2")
+LEGACY_METRIC = "l2"
+
+# Parameters that only affect search and can be changed on a trained index
+SEARCH_PARAMS = ("nprobe", "efSearch")
+
+# Filtered searches on HNSW graphs: filters matching at most this many images
+# are searched exhaustively, broader ones widen efSearch up to the cap
+EXACT_FILTER_LIMIT = 4096
+MAX_FILTER_EF_SEARCH = 1024
+
+# Index types whose filtered searches the installed Faiss can't run with
+# SearchParameters (older releases lack them or reject them on some
+# wrappers); these fall back to over-fetching and filtering the results
+_UNSUPPORTED_SEARCH_PARAMS = set()
+
+# Results fetched per requested one when filtering after the search
+FILTER_OVERFETCH = 2
+
+def resolve_index_config(index_type=None, params=None):
+    """
+    Build a complete index configuration from a type and partial parameters.
+
+    Args:
+        index_type: One of INDEX_TYPES, defaults to "flat"
+        params: Dict of parameters overriding the type's defaults
+
+    Returns:
+        Dict with "type" and "params" keys
+    """
+    index_type = index_type or "flat"
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"Unknown index type '{index_type}'. "
+                         f"Choose from: {', '.join(INDEX_TYPES)}")
+
+    resolved = dict(INDEX_TYPES[index_type])
+    resolved.update(PROJECTION_PARAMS)
+    resolved.update(METRIC_PARAMS)
+    for key, value in (params or {}).items():
+        if key in resolved and value is not None:
+            resolved[key] = type(resolved[key])(value)
+
+    if resolved["projection"] not in PROJECTIONS:
+        raise ValueError(f"Unknown projection '{resolved['projection']}'. "
+                         f"Choose from: {', '.join(PROJECTIONS)}")
+    if resolved["metric"] not in METRICS:
+        raise ValueError(f"Unknown metric '{resolved['metric']}'. "
+                         f"Choose from: {', '.join(METRICS)}")
+    return {"type": index_type, "params": resolved}
+
+def build_signature(config):
+    """
+    Part of a configuration that determines how an index is trained and filled.
+
+    Two configurations with the same signature differ only in search parameters.
+
+    Args:
+        config: Index configuration from resolve_index_config
+
+    Returns:
+        Hashable tuple of the index type and its build parameters
+    """
+    build_params = {k: v for k, v in config["params"].items() if k not in SEARCH_PARAMS}
+    return (config["type"], tuple(sorted(build_params.items())))
+
+def create_index(config, dimension):
+    """
+    Create an empty index for a configuration that accepts explicit ids.
+
+    IVF indexes store ids in their inverted lists and can remove them
+    directly. Flat and HNSW indexes are wrapped in an IndexIDMap2. With a
+    PCA or OPQ projection the whole index is wrapped in an IndexPreTransform,
+    so it takes full-size query vectors but stores reduced ones. Cosine
+    indexes normalise vectors in an IndexPreTransform too, again after any
+    projection, so callers add and search raw features either way.
+
+    Args:
+        config: Index configuration from resolve_index_config
+        dimension: Dimension of the feature vectors
+
+    Returns:
+        Faiss index supporting add_with_ids
+    """
+    import faiss
+
+    index_type = config["type"]
+    params = config["params"]
+
+    cosine = params["metric"] == "cosine"
+    metric = faiss.METRIC_INNER_PRODUCT if cosine else faiss.METRIC_L2
+
+    transform = None
+    input_dimension = dimension
+    if params["projection"] != "none":
+        input_dimension, dimension = dimension, params["projection_dim"]
+        if dimension >= input_dimension:
+            raise ValueError(f"projection_dim={dimension} must be smaller than the "
+                             f"embedding dimension {input_dimension}")
+        if params["projection"] == "pca":
+            transform = faiss.PCAMatrix(input_dimension, dimension)
+        else:
+            opq_m = params["m"] if index_type == "ivf_pq" else 32
+            if dimension % opq_m != 0:
+                raise ValueError(f"OPQ sub-quantizers m={opq_m} must divide "
+                                 f"projection_dim={dimension}")
+            transform = faiss.OPQMatrix(input_dimension, opq_m, dimension)
+
+    if index_type == "ivf_flat":
+        quantizer = faiss.IndexFlat(dimension, metric)
+        index = faiss.IndexIVFFlat(quantizer, dimension, params["nlist"], metric)
+    elif index_type == "ivf_pq":
+        if dimension % params["m"] != 0:
+            raise ValueError(f"PQ sub-quantizers m={params['m']} must divide dimension {dimension}")
+        quantizer = faiss.IndexFlat(dimension, metric)
+        index = faiss.IndexIVFPQ(quantizer, dimension, params["nlist"], params["m"], params["nbits"], metric)
+    elif index_type == "hnsw":
+        base = faiss.IndexHNSWFlat(dimension, params["M"], metric)
+        base.hnsw.efConstruction = params["efConstruction"]
+        index = faiss.IndexIDMap2(base)
+    else:
+        index = faiss.IndexIDMap2(faiss.IndexFlat(dimension, metric))
+
+    if transform is not None:
+        if cosine:
+            index = faiss.IndexPreTransform(faiss.NormalizationTransform(dimension, 2.0), index)
+        index = faiss.IndexPreTransform(transform, index)
+    if cosine:
+        index = faiss.IndexPreTransform(faiss.NormalizationTransform(input_dimension, 2.0), index)
+
+    apply_search_params(index, config)
+    return index
+
+def reconstruct_vectors(index, ids):
+    """
+    Read stored vectors back out of an index.
+
+    Vectors from IVF-PQ or projected indexes are approximate reconstructions.
+
+    Args:
+        index: Index created by create_index
+        ids: Sequence of ids to reconstruct
+
+    Returns:
+        float32 array with one row per id
+    """
+    import faiss
+
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        ivf.set_direct_map_type(faiss.DirectMap.Hashtable)
+    return _reconstruct_batch(index, ids)
+
+def _reconstruct_batch(index, ids):
+    """
+    Reconstruct several ids with one call into Faiss where it supports that.
+
+    Args:
+        index: Faiss index
+        ids: Sequence of ids to reconstruct
+
+    Returns:
+        float32 array with one row per id
+    """
+    ids = np.ascontiguousarray(ids, dtype="int64")
+    if hasattr(index, "reconstruct_batch"):
+        return index.reconstruct_batch(ids)
+    vectors = np.empty((len(ids), index.d), dtype="float32")
+    for row, image_id in enumerate(ids):
+        vectors[row] = index.reconstruct(int(image_id))
+    return vectors
+
+def apply_search_params(index, config):
+    """
+    Set the search-time parameters (nprobe, efSearch) of a configuration on an index.
+
+    Args:
+        index: Faiss index, possibly wrapped in an IndexIDMap
+        config: Index configuration from resolve_index_config
+    """
+    import faiss
+
+    space = faiss.ParameterSpace()
+    for key in SEARCH_PARAMS:
+        if key in config["params"]:
+            space.set_index_parameter(index, key, config["params"][key])
+
+def _search_subset(index, queries, ids, k):
+    """
+    Exhaustively search a few stored vectors, with the index's own
+    transforms and metric.
+
+    Args:
+        index: Flat or HNSW index created by create_index
+        queries: float32 array of query vectors
+        ids: int64 array of the ids to search
+        k: Number of results per query
+
+    Returns:
+        Tuple of (distances, ids) arrays shaped like index.search's
+    """
+    import faiss
+
+    while isinstance(index, faiss.IndexPreTransform):
+        for i in range(index.chain.size()):
+            queries = index.chain.at(i).apply(queries)
+        index = faiss.downcast_index(index.index)
+    subset = faiss.IndexFlat(index.d, index.metric_type)
+    subset.add(_reconstruct_batch(index, ids))
+    distances, rows = subset.search(queries, k)
+    return distances, np.where(rows >= 0, ids[np.maximum(rows, 0)], -1)
+
+def _search_overfetch(index, queries, k, mask):
+    """
+    Search the whole index and drop results the filter doesn't allow.
+
+    Used where SearchParameters aren't available. Fetches FILTER_OVERFETCH
+    times as many results as the filter's selectivity calls for, so a
+    narrow filter may return fewer than k results.
+
+    Args:
+        index: Index created by create_index
+        queries: float32 array of query vectors
+        k: Number of results per query
+        mask: Boolean array, True for ids that may be returned
+
+    Returns:
+        Tuple of (distances, ids) arrays shaped like index.search's
+    """
+    allowed = int(mask.sum())
+    fetch = min(index.ntotal, int(np.ceil(k * FILTER_OVERFETCH * index.ntotal / allowed)))
+    distances, indices = index.search(queries, fetch)
+    keep = (indices >= 0) & mask[np.clip(indices, 0, len(mask) - 1)]
+    out_distances = np.full((len(queries), k), -1.0, dtype="float32")
+    out_ids = np.full((len(queries), k), -1, dtype="int64")
+    for row in range(len(queries)):
+        hits = np.flatnonzero(keep[row])[:k]
+        out_distances[row, :len(hits)] = distances[row, hits]
+        out_ids[row, :len(hits)] = indices[row, hits]
+    return out_distances, out_ids
+
+def search_filtered(index, config, queries, k, ids, id_space):
+    """
+    Search only some ids, applying the filter inside the index.
+
+    The ids are passed to Faiss as a bitmap selector, so vectors that don't
+    match are skipped rather than fetched and thrown away. The fewer ids
+    match, the fewer candidates each IVF list or HNSW neighbourhood holds,
+    so nprobe and efSearch are scaled up by the filter's selectivity to
+    score about as many vectors as an unfiltered search. HNSW graphs are
+    searched exhaustively when at most EXACT_FILTER_LIMIT ids match.
+    Faiss releases without SearchParameters support for an index (e.g.
+    the 1.7.4 build in environment.yml on some wrappers) filter the results
+    of a wider search instead.
+
+    Args:
+        index: Index created by create_index
+        config: Index configuration from resolve_index_config
+        queries: float32 array of query vectors
+        k: Number of results per query
+        ids: Sorted int64 array of the ids that may be returned
+        id_space: Number of ids assigned so far
+
+    Returns:
+        Tuple of (distances, ids) arrays shaped like index.search's
+    """
+    import faiss
+
+    k = min(k, len(ids))
+    if k == 0:
+        return (np.empty((len(queries), 0), dtype="float32"),
+                np.empty((len(queries), 0), dtype="int64"))
+    if config["type"] == "hnsw" and len(ids) <= EXACT_FILTER_LIMIT:
+        return _search_subset(index, queries, ids, k)
+
+    mask = np.zeros(id_space, dtype=bool)
+    mask[ids] = True
+    has_params = all(hasattr(faiss, name) for name in ("SearchParametersIVF", "SearchParametersHNSW",
+                                                       "IDSelectorBitmap"))
+    if not has_params or config["type"] in _UNSUPPORTED_SEARCH_PARAMS:
+        return _search_overfetch(index, queries, k, mask)
+    bitmap = np.packbits(mask, bitorder="little")
+    selector = faiss.IDSelectorBitmap(len(bitmap), faiss.swig_ptr(bitmap))
+
+    widen = index.ntotal / len(ids)
+    params = config["params"]
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        search_params = faiss.SearchParametersIVF()
+        search_params.nprobe = min(ivf.nlist, int(np.ceil(params["nprobe"] * widen)))
+    elif config["type"] == "hnsw":
+        search_params = faiss.SearchParametersHNSW()
+        search_params.efSearch = min(MAX_FILTER_EF_SEARCH, max(k, int(np.ceil(params["efSearch"] * widen))))
+    else:
+        search_params = faiss.SearchParameters()
+    search_params.sel = selector
+    try:
+        # Wrapper indexes pass the parameters on to the index they wrap
+        return index.search(queries, k, params=search_params)
+    except RuntimeError as e:
+        print(f"Faiss can't filter {config['type']} searches in the index ({e}), "
+              f"filtering their results instead")
+        _UNSUPPORTED_SEARCH_PARAMS.add(config["type"])
+        return _search_overfetch(index, queries, k, mask)
+
+def training_size(config):
+    """
+    Number of vectors to collect before training an index.
+
+    Args:
+        config: Index configuration from resolve_index_config
+
+    Returns:
+        Number of training vectors, 0 if the index needs no training
+    """
+    params = config["params"]
+    size = 0
+    if config["type"] == "ivf_flat":
+        size = 39 * params["nlist"]
+    elif config["type"] == "ivf_pq":
+        size = max(39 * params["nlist"], 39 * (1 << params["nbits"]))
+    if params["projection"] != "none":
+        size = max(size, 4 * params["projection_dim"])
+    return size
+
+def min_training_size(config):
+    """
+    Smallest number of vectors Faiss can train the index on.
+
+    Args:
+        config: Index configuration from resolve_index_config
+
+    Returns:
+        Minimum number of training vectors
+    """
+    params = config["params"]
+    size = 0
+    if config["type"] == "ivf_flat":
+        size = params["nlist"]
+    elif config["type"] == "ivf_pq":
+        size = max(params["nlist"], 1 << params["nbits"])
+    if params["projection"] == "pca":
+        size = max(size, params["projection_dim"])
+    elif params["projection"] == "opq":
+        size = max(size, params["projection_dim"], 256)
+    return size
+
+def is_cosine(config):
+    """
+    Check whether an index scores results by cosine similarity.
+
+    Args:
+        config: Index configuration from resolve_index_config
+
+    Returns:
+        Boolean, False for L2 distance
+    """
+    return config["params"]["metric"] == "cosine"
+
+def supports_remove(config):
+    """
+    Check whether vectors can be removed from an index of this type.
+
+    Args:
+        config: Index configuration from resolve_index_config
+
+    Returns:
+        Boolean, False for HNSW graphs
+    """
+    return config["type"] != "hnsw"
+
+def default_benchmark_configs():
+    """
+    Index configurations compared by the recall benchmark.
+
+    Returns:
+        List of index configurations, sweeping each type's search parameter
+    """
+    configs = []
+    for nprobe in (1, 4, 16, 64):
+        configs.append(resolve_index_config("ivf_flat", {"nprobe": nprobe}))
+    for nprobe in (1, 4, 16, 64):
+        configs.append(resolve_index_config("ivf_pq", {"nprobe": nprobe}))
+    for ef_search in (16, 32, 64, 128):
+        configs.append(resolve_index_config("hnsw", {"efSearch": ef_search}))
+    return configs
+
+def describe_config(config):
+    """
+    Short label for an index configuration.
+
+    Args:
+        config: Index configuration from resolve_index_config
+
+    Returns:
+        String such as "ivf_flat(nlist=100, nprobe=8)"
+    """
+    shown = {k: v for k, v in config["params"].items()
+             if (k not in PROJECTION_PARAMS or config["params"]["projection"] != "none") and
+             (k not in METRIC_PARAMS or v != METRIC_PARAMS[k])}
+    params = ", ".join(f"{k}={v}" for k, v in shown.items())
+    return f"{config['type']}({params})"
+
+def _timed_search(index, queries, k):
+    """
+    Search one query at a time, recording the latency of each.
+
+    Args:
+        index: Faiss index to search
+        queries: float32 array of query vectors
+        k: Number of neighbours to return
+
+    Returns:
+        Tuple of (labels array, latencies in milliseconds)
+    """
+    labels = np.empty((len(queries), k), dtype="int64")
+    latencies = np.empty(len(queries))
+    for i in range(len(queries)):
+        start = time.perf_counter()
+        _, labels[i:i + 1] = index.search(queries[i:i + 1], k)
+        latencies[i] = (time.perf_counter() - start) * 1000
+    return labels, latencies
+
+def benchmark_index_configs(features, configs=None, k=5, num_queries=100, seed=0):
+    """
+    Measure recall@k and query latency of index configurations against exact search.
+
+    Indexes that differ only in search parameters are trained and filled once.
+    Each configuration is compared with exact search under its own metric.
+
+    Args:
+        features: float32 array of embeddings to index
+        configs: List of index configurations, defaults to default_benchmark_configs()
+        k: Number of neighbours used for recall
+        num_queries: Number of embeddings used as queries
+        seed: Random seed for choosing queries
+
+    Returns:
+        List of result dicts with label, recall, latency percentiles and build time
+    """
+    features = np.ascontiguousarray(features, dtype="float32")
+    configs = configs or default_benchmark_configs()
+    k = min(k, len(features))
+    rng = np.random.default_rng(seed)
+    query_ids = rng.choice(len(features), size=min(num_queries, len(features)), replace=False)
+    queries = features[query_ids]
+
+    results = []
+    truths = {}
+    built = {}
+    for config in configs:
+        metric = config["params"]["metric"]
+        if metric not in truths:
+            exact_config = resolve_index_config("flat", {"metric": metric})
+            exact = create_index(exact_config, features.shape[1])
+            exact.add_with_ids(features, np.arange(len(features), dtype="int64"))
+            truths[metric], exact_latencies = _timed_search(exact, queries, k)
+            results.append({
+                "label": describe_config(exact_config),
+                "recall": 1.0,
+                "p50_ms": float(np.percentile(exact_latencies, 50)),
+                "p99_ms": float(np.percentile(exact_latencies, 99)),
+                "build_s": 0.0,
+            })
+        truth = truths[metric]
+
+        build_key = build_signature(config)
+
+        if build_key not in built:
+            if len(features) < min_training_size(config):
+                print(f"Skipping {describe_config(config)}: needs at least "
+                      f"{min_training_size(config)} vectors to train")
+                built[build_key] = None
+                continue
+            start = time.perf_counter()
+            index = create_index(config, features.shape[1])
+            if not index.is_trained:
+                index.train(features)
+            index.add_with_ids(features, np.arange(len(features), dtype="int64"))
+            built[build_key] = (index, time.perf_counter() - start)
+
+        if built[build_key] is None:
+            continue
+        index, build_seconds = built[build_key]
+        apply_search_params(index, config)
+
+        labels, latencies = _timed_search(index, queries, k)
+        hits = sum(len(set(labels[i]) & set(truth[i])) for i in range(len(queries)))
+        results.append({
+            "label": describe_config(config),
+            "recall": hits / float(len(queries) * k),
+            "p50_ms": float(np.percentile(latencies, 50)),
+            "p99_ms": float(np.percentile(latencies, 99)),
+            "build_s": build_seconds,
+        })
+    return results
+
+def format_benchmark(results, k=5):
+    """
+    Format benchmark results as a table.
+
+    Args:
+        results: Output of benchmark_index_configs
+        k: Number of neighbours used for recall
+
+    Returns:
+        Multi-line table string
+    """
+    lines = [f"{'index':<48} {'recall@' + str(k):>9} {'p50 ms':>8} {'p99 ms':>8} {'build s':>8}"]
+    for r in results:
+        lines.append(f"{r['label']:<48} {r['recall']:>9.3f} {r['p50_ms']:>8.3f} "
+                     f"{r['p99_ms']:>8.3f} {r['build_s']:>8.2f}")
+    return "\n".join(lines)
@@ -7,9 +7,18 @@ Licensed under MIT License with attribution requirements
 https://github.com/CodeQueenie/InspireSearch---AI_Powered_Visual_Search_Engine
 """
 import os
+import sys
 import argparse
-from tqdm import tqdm
-from image_search import ImageSearch
+
+# Allow running as "python index_images.py" from inside the app directory
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from app.image_search import ImageSearch
+from app.index_factory import INDEX_TYPES, PROJECTIONS, METRICS, benchmark_index_configs, format_benchmark
+from app.embedding_backends import BACKENDS, QUANTIZATION_MODES
+from app.sharding import parse_shard, shard_dir, write_layout
+from app.index_versions import current_version, build_new_version
+from app.dedupe import DUPLICATES_FILE, find_duplicates, save_report
+from app.embedding_store import EMBEDDINGS_FILE, EMBEDDING_DTYPES
 
 def main():
     """
@@ -20,26 +29,162 @@ def main():
     try:
         parser = argparse.ArgumentParser(description="Index images for InspireSearch")
         parser.add_argument("--dataset", type=str, default="../static/dataset",
-                            help="Path to the dataset directory")
+                            help="Dataset directory, tar/zip archive, quoted glob of archives "
+                                 "(e.g. 'shards/*.tar') or CSV/JSONL manifest of image paths")
         parser.add_argument("--index", type=str, default="../static/index",
                             help="Path to save the index")
+        parser.add_argument("--batch-size", type=int, default=32,
+                            help="Number of images per model call")
+        parser.add_argument("--workers", type=int, default=4,
+                            help="Number of processes decoding images")
+        parser.add_argument("--decode-threads", action="store_true",
+                            help="Decode images with threads instead of processes")
+        parser.add_argument("--incremental", action="store_true",
+                            help="Only embed new or changed images and drop deleted ones")
+        parser.add_argument("--checkpoint-every", type=int, default=50,
+                            help="Number of batches between checkpoints (0 to disable)")
+        parser.add_argument("--index-type", type=str, choices=list(INDEX_TYPES), default=None,
+                            help="Type of Faiss index to build (default: flat)")
+        parser.add_argument("--nlist", type=int, help="Number of IVF clusters")
+        parser.add_argument("--nprobe", type=int, help="Number of IVF clusters visited per query")
+        parser.add_argument("--pq-m", type=int, help="Number of PQ sub-quantizers")
+        parser.add_argument("--pq-nbits", type=int, help="Bits per PQ code")
+        parser.add_argument("--hnsw-m", type=int, help="Number of HNSW neighbours per node")
+        parser.add_argument("--ef-construction", type=int, help="HNSW build-time search depth")
+        parser.add_argument("--ef-search", type=int, help="HNSW query-time search depth")
+        parser.add_argument("--backend", type=str, choices=list(BACKENDS), default=None,
+                            help="Embedding model (default: resnet50)")
+        parser.add_argument("--quantize", type=str, choices=list(QUANTIZATION_MODES), default=None,
+                            help="Run the embedding model quantized with TFLite")
+        parser.add_argument("--projection", type=str, choices=list(PROJECTIONS), default=None,
+                            help="Reduce embeddings with PCA or OPQ before indexing")
+        parser.add_argument("--projection-dim", type=int,
+                            help="Number of dimensions kept by the projection")
+        parser.add_argument("--metric", type=str, choices=list(METRICS), default=None,
+                            help="Similarity metric (default: cosine for new indexes, "
+                                 "the saved metric for existing ones)")
+        parser.add_argument("--new-version", action="store_true",
+                            help="Build into a new index version and publish it atomically "
+                                 "(always done once the index directory is versioned)")
+        parser.add_argument("--reindex", action="store_true",
+                            help=f"Build the index type and metric given from the saved embeddings "
+                                 f"({EMBEDDINGS_FILE}) without loading the model or reading images")
+        parser.add_argument("--embedding-dtype", type=str, choices=list(EMBEDDING_DTYPES), default="float32",
+                            help="Type the saved embedding matrix is stored as in new indexes")
+        parser.add_argument("--thumbnails", type=str, default="../static/thumbnails",
+                            help="Directory to save result thumbnails to while indexing")
+        parser.add_argument("--no-thumbnails", action="store_true",
+                            help="Don't create thumbnails; the app creates them on first request")
+        parser.add_argument("--shard", type=str, default=None,
+                            help="Only build shard i of N, given as i/N")
+        parser.add_argument("--benchmark", action="store_true",
+                            help="Report recall@k and latency of each index type on the existing index")
+        parser.add_argument("--k", type=int, default=5, help="Number of neighbours for the benchmark")
+        parser.add_argument("--queries", type=int, default=100,
+                            help="Number of benchmark queries")
+        parser.add_argument("--find-duplicates", action="store_true",
+                            help="Group the indexed images into duplicate clusters and save a report "
+                                 f"({DUPLICATES_FILE}) that searches use to return distinct images")
+        parser.add_argument("--duplicate-threshold", type=float, default=0.95,
+                            help="Smallest cosine similarity counted as a near-duplicate")
+        parser.add_argument("--duplicate-neighbours", type=int, default=10,
+                            help="Neighbours checked per image when finding duplicates")
+        parser.add_argument("--block-size", type=int, default=1024,
+                            help="Images searched at a time when finding duplicates")
+        parser.add_argument("--threads", type=int, default=None,
+                            help="Threads used to find duplicates (default: all cores)")
+        parser.add_argument("--report", type=str, default=None,
+                            help="Also write the duplicate report to this path")
         args = parser.parse_args()
+        
+        index_params = {
+            "nlist": args.nlist,
+            "nprobe": args.nprobe,
+            "m": args.pq_m,
+            "nbits": args.pq_nbits,
+            "M": args.hnsw_m,
+            "efConstruction": args.ef_construction,
+            "efSearch": args.ef_search,
+            "projection": args.projection,
+            "projection_dim": args.projection_dim,
+            "metric": args.metric,
+        }
+        index_params = {k: v for k, v in index_params.items() if v is not None}
 
+        # Each shard is a complete index in its own subdirectory
+        shard = parse_shard(args.shard) if args.shard else None
+        index_path = shard_dir(args.index, *shard) if shard else args.index
+        
         # Create the index directory if it doesn't exist
-        os.makedirs(args.index, exist_ok=True)
+        os.makedirs(index_path, exist_ok=True)
         
-        print(f"Indexing images from {args.dataset}")
+        source = f"saved embeddings in {index_path}" if args.reindex else f"images from {args.dataset}"
+        print(f"Indexing {source}" + (f" (shard {shard[0]} of {shard[1]})" if shard else ""))
         
         # Initialize the image search engine
-        search_engine = ImageSearch(index_path=args.index, dataset_path=args.dataset)
+        search_engine = ImageSearch(index_path=index_path, dataset_path=args.dataset,
+                                    batch_size=args.batch_size, num_workers=args.workers,
+                                    index_type=args.index_type, index_params=index_params,
+                                    shard=shard, embedding_backend=args.backend,
+                                    quantize=args.quantize,
+                                    decode_in_processes=not args.decode_threads,
+                                    embedding_dtype=args.embedding_dtype,
+                                    thumbnail_dir=None if args.no_thumbnails else args.thumbnails)
+        
+        if args.benchmark:
+            _, features = search_engine.saved_embeddings()
+            if features is None:
+                _, features = search_engine.reconstruct_embeddings()
+                if features is None:
+                    print("No index found. Build the index before benchmarking.")
+                    return
+                print("This index has no saved embeddings, so the benchmark uses vectors read back "
+                      "from the index; build it again once to benchmark the model's own embeddings")
+            print(f"Benchmarking index types on {len(features)} embeddings")
+            results = benchmark_index_configs(features, k=args.k, num_queries=args.queries)
+            print(format_benchmark(results, k=args.k))
+            return
         
-        # Build the index
-        success = search_engine.build_index()
+        if args.find_duplicates:
+            if search_engine.index is None:
+                print("No index found. Build the index before finding duplicates.")
+                return
+            report = find_duplicates(search_engine, threshold=args.duplicate_threshold,
+                                     k=args.duplicate_neighbours, block_size=args.block_size,
+                                     num_threads=args.threads)
+            save_report(report, search_engine.duplicates_file)
+            if args.report:
+                save_report(report, args.report)
+            print(f"Found {len(report['clusters'])} duplicate clusters covering "
+                  f"{report['duplicate_images']} redundant images out of {report['images']} "
+                  f"({len(report['exact_duplicates'])} groups of identical files) "
+                  f"in {report['seconds']:.1f}s")
+            print(f"Report saved to {search_engine.duplicates_file}")
+            return
+        
+        # Build the index. Versioned builds never touch the files a running
+        # server is reading; it picks up the new version by itself
+        if not shard and (args.new_version or current_version(index_path)):
+            version, engine = build_new_version(search_engine, incremental=args.incremental,
+                                                checkpoint_every=args.checkpoint_every,
+                                                reindex=args.reindex)
+            success = version is not None
+            search_engine = engine or search_engine
+        elif args.reindex:
+            success = search_engine.reindex()
+        else:
+            success = search_engine.build_index(incremental=args.incremental,
+                                                checkpoint_every=args.checkpoint_every)
         
         if success:
+            if shard:
+                write_layout(args.index, shard[1])
             print("Indexing completed successfully!")
         else:
             print("Indexing failed. Check the logs for details.")
+        
+        if search_engine.last_build_stats is not None:
+            print(search_engine.last_build_stats.report())
     except Exception as e:
         print(f"Error during indexing: {e}")
 
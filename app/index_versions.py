@@ -0,0 +1,411 @@
+"""
+InspireSearch - AI-Powered Visual Search Engine
+Versioned index directories and background rebuilds with atomic hot-swap
+
+A versioned index directory looks like:
+
+  CURRENT                  name of the live version, replaced atomically
+  versions/v000001/        complete index directory for one build
+  versions/v000002/        ...
+
+Builds write a new version directory and only point CURRENT at it once it
+is complete, so readers never see a partially written index.
+
+A version built from the previous one starts with hard links to its files
+rather than copies. Index files are only ever replaced, never modified in
+place, so the versions can't affect each other; the one exception is the
+embedding matrix, which EmbeddingStore appends to under a file lock.
+
+Copyright (c) 2025 Nicole LeGuern
+Licensed under MIT License with attribution requirements
+https://github.com/CodeQueenie/InspireSearch---AI_Powered_Visual_Search_Engine
+"""
+import os
+import time
+import shutil
+import threading
+
+CURRENT_FILE = "CURRENT"
+VERSIONS_DIR = "versions"
+
+def version_dir(index_root, version):
+    """
+    Directory holding one version's index files.
+
+    Args:
+        index_root: Top-level index directory
+        version: Version name such as "v000003"
+
+    Returns:
+        Path to the version directory
+    """
+    return os.path.join(index_root, VERSIONS_DIR, version)
+
+def list_versions(index_root):
+    """
+    All version directories, oldest first.
+
+    Args:
+        index_root: Top-level index directory
+
+    Returns:
+        List of version names
+    """
+    versions_path = os.path.join(index_root, VERSIONS_DIR)
+    if not os.path.isdir(versions_path):
+        return []
+    return sorted(name for name in os.listdir(versions_path) if name.startswith("v"))
+
+def current_version(index_root):
+    """
+    Name of the live version.
+
+    Args:
+        index_root: Top-level index directory
+
+    Returns:
+        Version name, or None if the directory isn't versioned
+    """
+    current_file = os.path.join(index_root, CURRENT_FILE)
+    try:
+        with open(current_file, "r", encoding="utf-8") as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+def publish_version(index_root, version):
+    """
+    Atomically make a version the live one.
+
+    Args:
+        index_root: Top-level index directory
+        version: Version name
+    """
+    current_file = os.path.join(index_root, CURRENT_FILE)
+    with open(f"{current_file}.tmp", "w", encoding="utf-8") as f:
+        f.write(version)
+    os.replace(f"{current_file}.tmp", current_file)
+
+def create_version(index_root):
+    """
+    Create the directory for the next version.
+
+    Args:
+        index_root: Top-level index directory
+
+    Returns:
+        Tuple of (version name, directory path)
+    """
+    versions = list_versions(index_root)
+    number = int(versions[-1][1:]) + 1 if versions else 1
+    while True:
+        version = f"v{number:06d}"
+        path = version_dir(index_root, version)
+        try:
+            # Fails if another builder claimed this version first
+            os.makedirs(path)
+            return version, path
+        except FileExistsError:
+            number += 1
+
+def prune_versions(index_root, keep=2):
+    """
+    Delete old versions, keeping the live one and the newest few.
+
+    Args:
+        index_root: Top-level index directory
+        keep: Number of most recent versions to keep
+    """
+    live = current_version(index_root)
+    versions = list_versions(index_root)
+    for version in versions[:max(0, len(versions) - keep)]:
+        if version != live:
+            shutil.rmtree(version_dir(index_root, version), ignore_errors=True)
+
+def link_index_files(source, target):
+    """
+    Give a new version the files of a saved index so it can be updated
+    incrementally, hard-linking them where the filesystem allows.
+
+    Args:
+        source: Directory of the live index
+        target: New version directory
+    """
+    for name in os.listdir(source):
+        path = os.path.join(source, name)
+        if os.path.isfile(path) and name != CURRENT_FILE and not name.endswith((".tmp", ".tflite")):
+            try:
+                os.link(path, os.path.join(target, name))
+            except OSError:
+                # No hard links across filesystems or on some network shares
+                shutil.copy2(path, os.path.join(target, name))
+
+def build_new_version(search_engine, incremental=True, checkpoint_every=50, keep=2, on_start=None,
+                      reindex=False):
+    """
+    Build the index into a new version directory and publish it.
+
+    The engine passed in is not modified; call swap_index with the
+    returned engine to start serving the new version.
+
+    Args:
+        search_engine: ImageSearch whose settings and model are used
+        incremental: Start from the live index's files and only embed changes
+        checkpoint_every: Number of batches between checkpoints, 0 to disable
+        keep: Number of versions kept on disk
+        on_start: Optional function called with (version, engine) before building,
+            e.g. to follow the engine's build_progress
+        reindex: Build from the live index's saved embeddings with
+            ImageSearch.reindex instead of embedding the dataset
+
+    Returns:
+        Tuple of (version, engine serving it), or (None, None) if the build failed
+    """
+    index_root = search_engine.index_root
+    version, path = create_version(index_root)
+
+    # The live index is either the current version or, before the first
+    # versioned build, files directly in the index directory
+    if (incremental or reindex) and os.path.exists(search_engine.index_file):
+        link_index_files(search_engine.index_path, path)
+
+    engine = search_engine.clone(path)
+    if on_start is not None:
+        on_start(version, engine)
+    if reindex:
+        built = engine.reindex()
+    else:
+        built = engine.build_index(incremental=incremental, checkpoint_every=checkpoint_every)
+    if not built:
+        shutil.rmtree(path, ignore_errors=True)
+        return None, None
+
+    publish_version(index_root, version)
+    prune_versions(index_root, keep=keep)
+    print(f"Published index version {version}")
+    return version, engine
+
+def _timestamp(seconds):
+    """
+    Format a time.time() value for status reports.
+
+    Args:
+        seconds: Seconds since the epoch, or None
+
+    Returns:
+        ISO 8601 UTC string, or None
+    """
+    if seconds is None:
+        return None
+    return time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(seconds))
+
+class BackgroundIndexBuilder:
+    """
+    Rebuild the index on a background thread and hot-swap it into a
+    running ImageSearch.
+
+    Queries keep being served from the old index while the new version is
+    built; the swap only replaces a few references. Versions published by
+    other processes are picked up by poll().
+    """
+
+    def __init__(self, search_engine, keep_versions=2, poll_seconds=5.0, retry_seconds=300.0):
+        """
+        Initialize the builder.
+
+        Args:
+            search_engine: ImageSearch to keep up to date
+            keep_versions: Number of versions kept on disk
+            poll_seconds: Least time between checks for versions published elsewhere
+            retry_seconds: Least time after a failed build before start_if_needed
+                starts another
+        """
+        self.search_engine = search_engine
+        self.keep_versions = keep_versions
+        self.poll_seconds = poll_seconds
+        self.retry_seconds = retry_seconds
+        self._lock = threading.Lock()
+        self._thread = None
+        self._build_engine = None
+        self._last_poll = 0.0
+        self.state = "idle"
+        self.building_version = None
+        self.started_at = None
+        self.finished_at = None
+        self.last_error = None
+
+    def is_running(self):
+        """
+        Whether a build or reload is in progress.
+
+        Returns:
+            Boolean
+        """
+        return self._thread is not None and self._thread.is_alive()
+
+    def _start(self, target, state, *args):
+        """
+        Run a task on the background thread unless one is already running.
+
+        Args:
+            target: Function to run
+            state: State reported while it runs
+            *args: Arguments for target
+
+        Returns:
+            Boolean indicating if the task was started
+        """
+        with self._lock:
+            if self.is_running():
+                return False
+            self.state = state
+            self.started_at = time.time()
+            self.finished_at = None
+            self.last_error = None
+            self._thread = threading.Thread(target=self._run, args=(target,) + args,
+                                            name="index-builder", daemon=True)
+            self._thread.start()
+            return True
+
+    def _run(self, target, *args):
+        """
+        Background thread body recording how the task ended.
+
+        Args:
+            target: Function to run
+            *args: Arguments for target
+        """
+        try:
+            if target(*args):
+                self.state = "idle"
+            else:
+                self.state = "failed"
+                self.last_error = self.last_error or "Build failed, see the server log"
+        except Exception as e:
+            print(f"Error in background index task: {e}")
+            self.state = "failed"
+            self.last_error = str(e)
+        finally:
+            self.finished_at = time.time()
+            self.building_version = None
+            self._build_engine = None
+
+    def start(self, incremental=True, checkpoint_every=50):
+        """
+        Start building a new index version in the background.
+
+        Args:
+            incremental: Only embed images that changed since the live version
+            checkpoint_every: Number of batches between checkpoints, 0 to disable
+
+        Returns:
+            Boolean indicating if a build was started, False if one is running
+        """
+        return self._start(self._build, "building", incremental, checkpoint_every)
+
+    def _retry_at(self):
+        """
+        When a failed build may be retried by start_if_needed.
+
+        Returns:
+            Seconds since the epoch, or None if the last task didn't fail
+        """
+        finished_at = self.finished_at
+        if self.state != "failed" or finished_at is None:
+            return None
+        return finished_at + self.retry_seconds
+
+    def start_if_needed(self):
+        """
+        Start a build for requests that found no index to search.
+
+        Builds only start from the idle state. After a failed build, e.g.
+        of an empty or unreadable dataset, requests don't start another
+        until retry_seconds have passed, so traffic can't turn a broken
+        dataset into back-to-back rebuilds. start() and versions published
+        elsewhere, picked up by poll(), aren't held back.
+
+        Returns:
+            Boolean indicating if a build was started
+        """
+        if self.state == "failed":
+            retry_at = self._retry_at()
+            if retry_at is None or time.time() < retry_at:
+                return False
+        elif self.state != "idle":
+            return False
+        return self.start()
+
+    def _build(self, incremental, checkpoint_every):
+        """
+        Build, publish and swap in a new version.
+
+        Returns:
+            Boolean indicating success
+        """
+        def on_start(version, engine):
+            self.building_version = version
+            self._build_engine = engine
+
+        version, engine = build_new_version(self.search_engine, incremental=incremental,
+                                            checkpoint_every=checkpoint_every,
+                                            keep=self.keep_versions, on_start=on_start)
+        if engine is None:
+            return False
+        self.search_engine.swap_index(engine, version)
+        return True
+
+    def poll(self):
+        """
+        Load a version published by another process, at most every poll_seconds.
+
+        Returns:
+            Boolean indicating if a reload was started
+        """
+        now = time.monotonic()
+        if now - self._last_poll < self.poll_seconds or self.is_running():
+            return False
+        self._last_poll = now
+
+        version = current_version(self.search_engine.index_root)
+        if version is None or version == self.search_engine.version:
+            return False
+        return self._start(self._reload, "loading", version)
+
+    def _reload(self, version):
+        """
+        Load a published version and swap it in.
+
+        Args:
+            version: Version name
+
+        Returns:
+            Boolean indicating success
+        """
+        self.building_version = version
+        engine = self.search_engine.clone(version_dir(self.search_engine.index_root, version))
+        if engine.index is None:
+            return False
+        self.search_engine.swap_index(engine, version)
+        return True
+
+    def status(self):
+        """
+        Describe the live index and any build in progress.
+
+        Returns:
+            Dict suitable for a JSON response
+        """
+        engine = self._build_engine
+        index = self.search_engine.index
+        return {
+            "state": self.state,
+            "active_version": self.search_engine.version,
+            "active_images": index.ntotal if index is not None else 0,
+            "building_version": self.building_version,
+            "progress": dict(engine.build_progress) if engine is not None and engine.build_progress else None,
+            "started_at": _timestamp(self.started_at),
+            "finished_at": _timestamp(self.finished_at),
+            "last_error": self.last_error,
+            "retry_at": _timestamp(self._retry_at()),
+        }
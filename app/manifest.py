@@ -0,0 +1,245 @@
+"""
+InspireSearch - AI-Powered Visual Search Engine
+Content-hash manifest for incremental indexing
+
+Copyright (c) 2025 Nicole LeGuern
+Licensed under MIT License with attribution requirements
+https://github.com/CodeQueenie/InspireSearch---AI_Powered_Visual_Search_Engine
+"""
+import os
+import json
+import hashlib
+
+def file_hash(path, chunk_size=1024 * 1024):
+    """
+    Compute the SHA-256 hash of a file's contents.
+
+    Args:
+        path: Path to the file
+        chunk_size: Number of bytes read at a time
+
+    Returns:
+        Hex digest string
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def _stat(path, source=None):
+    """
+    Size and modification time of an image.
+
+    Args:
+        path: Path to the image
+        source: Optional dataset source that knows the image
+
+    Returns:
+        Tuple of (size in bytes, mtime)
+    """
+    if source is not None:
+        return source.stat(path)
+    stat = os.stat(path)
+    return stat.st_size, stat.st_mtime
+
+class IndexManifest:
+    """
+    Record of every indexed image: its index id, size, mtime and content hash.
+
+    The manifest is saved next to the index. An incomplete manifest marks a
+    checkpoint from a build that has not finished yet. Images that could not
+    be decoded are recorded separately with their size and mtime, and are
+    only tried again once those change.
+    """
+
+    def __init__(self, entries=None, complete=True, failed=None):
+        """
+        Initialize the manifest.
+
+        Args:
+            entries: Dict mapping image path to its entry dict
+            complete: False while a build is still in progress
+            failed: Dict mapping the path of an image that could not be
+                decoded to a dict with its size, mtime and error
+        """
+        self.entries = entries or {}
+        self.complete = complete
+        self.failed = failed or {}
+
+    @classmethod
+    def load(cls, manifest_file):
+        """
+        Load a manifest from disk.
+
+        Args:
+            manifest_file: Path to the manifest JSON file
+
+        Returns:
+            IndexManifest, or None if the file is missing or unreadable
+        """
+        try:
+            if not os.path.exists(manifest_file):
+                return None
+            with open(manifest_file, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            return cls(entries=data.get("entries", {}), complete=data.get("complete", True),
+                       failed=data.get("failed", {}))
+        except Exception as e:
+            print(f"Error loading manifest: {e}")
+            return None
+
+    def save(self, manifest_file):
+        """
+        Atomically write the manifest to disk.
+
+        Args:
+            manifest_file: Path to the manifest JSON file
+        """
+        tmp_file = f"{manifest_file}.tmp"
+        with open(tmp_file, "w", encoding="utf-8") as f:
+            json.dump({"complete": self.complete, "entries": self.entries, "failed": self.failed}, f)
+        os.replace(tmp_file, manifest_file)
+
+    def ids(self):
+        """
+        Index ids of all recorded images.
+
+        Returns:
+            Set of integer ids
+        """
+        return {entry["id"] for entry in self.entries.values()}
+
+    def diff(self, image_files, source=None):
+        """
+        Compare the manifest against the images currently on disk.
+
+        Files whose size and mtime are unchanged are assumed unchanged. Files
+        whose stat changed are re-hashed and only count as changed if their
+        content differs. Files that failed to decode are skipped until their
+        size or mtime changes.
+
+        Args:
+            image_files: List of image paths found in the dataset
+            source: Dataset source to stat and hash images with, for images
+                inside archives; files on disk are read directly
+
+        Returns:
+            Tuple of (to_embed, to_remove) where to_embed lists paths that need
+            new embeddings and to_remove lists paths whose entries are stale
+        """
+        to_embed = []
+        to_remove = []
+        seen = set()
+
+        for path in image_files:
+            seen.add(path)
+            self._check(path, to_embed, to_remove, source)
+
+        to_remove.extend(path for path in self.entries if path not in seen)
+        for path in [path for path in self.failed if path not in seen]:
+            del self.failed[path]
+        return to_embed, to_remove
+
+    def diff_paths(self, paths, source=None):
+        """
+        Like diff, but only for the given paths, e.g. from filesystem events.
+
+        A path that no longer exists counts as removed.
+
+        Args:
+            paths: Image paths that may have been added, changed or deleted
+            source: Dataset source, as for diff
+
+        Returns:
+            Tuple of (to_embed, to_remove) as for diff
+        """
+        to_embed = []
+        to_remove = []
+        for path in dict.fromkeys(paths):
+            if (source.exists(path) if source is not None else os.path.exists(path)):
+                self._check(path, to_embed, to_remove, source)
+            else:
+                self.failed.pop(path, None)
+                if path in self.entries:
+                    to_remove.append(path)
+        return to_embed, to_remove
+
+    def _check(self, path, to_embed, to_remove, source=None):
+        """
+        Compare one existing image against its entry.
+
+        Args:
+            path: Path to the image
+            to_embed: List that paths needing new embeddings are appended to
+            to_remove: List that paths with stale entries are appended to
+            source: Dataset source, as for diff
+        """
+        entry = self.entries.get(path)
+        if entry is None:
+            failure = self.failed.get(path)
+            if failure is None or (failure["size"], failure["mtime"]) != _stat(path, source):
+                to_embed.append(path)
+            return
+
+        size, mtime = _stat(path, source)
+        if size == entry["size"] and mtime == entry["mtime"]:
+            return
+
+        if (source.hash(path) if source is not None else file_hash(path)) == entry["sha256"]:
+            entry["size"] = size
+            entry["mtime"] = mtime
+        else:
+            to_remove.append(path)
+            to_embed.append(path)
+
+    def record(self, path, image_id, source=None, digest=None):
+        """
+        Add or replace the entry for an indexed image.
+
+        Args:
+            path: Path to the image
+            image_id: Id of the image in the index
+            source: Dataset source, as for diff
+            digest: SHA-256 hex digest of the image if already known, e.g.
+                from the pass that decoded it; otherwise the image is read again
+        """
+        if digest is None:
+            digest = source.hash(path) if source is not None else file_hash(path)
+        size, mtime = _stat(path, source)
+        self.entries[path] = {
+            "id": int(image_id),
+            "size": size,
+            "mtime": mtime,
+            "sha256": digest,
+        }
+        self.failed.pop(path, None)
+
+    def record_failure(self, path, error, source=None):
+        """
+        Note an image that could not be decoded, so it isn't retried until it changes.
+
+        Args:
+            path: Path to the image
+            error: Why it could not be decoded
+            source: Dataset source, as for diff
+        """
+        try:
+            size, mtime = _stat(path, source)
+        except (OSError, KeyError):
+            # Gone already; the next diff drops it
+            return
+        self.failed[path] = {"size": size, "mtime": mtime, "error": str(error)}
+
+    def remove(self, path):
+        """
+        Drop the entry for an image.
+
+        Args:
+            path: Path to the image
+
+        Returns:
+            Id the image had in the index, or None if it was not recorded
+        """
+        entry = self.entries.pop(path, None)
+        return None if entry is None else entry["id"]
@@ -0,0 +1,225 @@
+"""
+InspireSearch - AI-Powered Visual Search Engine
+Compact, memory-mapped metadata store for indexed images
+
+The store is a directory of files written next to the Faiss index:
+
+  metadata.json          index configuration, image count and field names
+  metadata_offsets.npy   int64 offsets into the path blob, one more than the image count
+  metadata_paths.bin     UTF-8 encoded image paths, concatenated
+  metadata_fields.npy    structured array of per-image fields (size, mtime, ...)
+
+Facet fields (category, folder) hold codes into the value lists saved in
+metadata.json, see app/facets.py. Offset and length locate images stored
+inside tar or zip archives, see app/dataset_sources.py. sha256 is the hex
+digest of the image file, which names its thumbnails, see app/thumbnails.py.
+
+Image ids index all arrays directly. A removed image has an empty path.
+
+Copyright (c) 2025 Nicole LeGuern
+Licensed under MIT License with attribution requirements
+https://github.com/CodeQueenie/InspireSearch---AI_Powered_Visual_Search_Engine
+"""
+import os
+import json
+import numpy as np
+
+FORMAT_VERSION = 1
+
+# Per-image fields and their dtypes
+FIELD_DTYPES = {
+    "size": "int64",
+    "mtime": "float64",
+    "category": "int32",
+    "folder": "int32",
+    "date": "float64",
+    "offset": "int64",
+    "length": "int64",
+    "sha256": "S64",
+}
+
+INFO_FILE = "metadata.json"
+OFFSETS_FILE = "metadata_offsets.npy"
+PATHS_FILE = "metadata_paths.bin"
+FIELDS_FILE = "metadata_fields.npy"
+
+def _replace_all(directory, names):
+    """
+    Move freshly written temporary files into place.
+
+    Args:
+        directory: Directory holding the files
+        names: File names, each written as "<name>.tmp"
+    """
+    for name in names:
+        path = os.path.join(directory, name)
+        os.replace(f"{path}.tmp", path)
+
+class MetadataStore:
+    """
+    Read-only, memory-mapped view of the image metadata.
+
+    Behaves like a sequence of paths: store[i] is the path of image id i,
+    or None if that image was removed.
+    """
+
+    def __init__(self, info, offsets, blob, fields):
+        """
+        Initialize the store from already opened arrays. Use MetadataStore.open.
+
+        Args:
+            info: Dict read from metadata.json
+            offsets: int64 array of path offsets
+            blob: uint8 array of UTF-8 path bytes
+            fields: Structured array of per-image fields
+        """
+        self.info = info
+        self.offsets = offsets
+        self.blob = blob
+        self.fields = fields
+
+    @staticmethod
+    def exists(directory):
+        """
+        Check whether a store has been written to a directory.
+
+        Args:
+            directory: Index directory
+
+        Returns:
+            Boolean
+        """
+        return os.path.exists(os.path.join(directory, INFO_FILE))
+
+    @classmethod
+    def open(cls, directory):
+        """
+        Memory-map a store from disk.
+
+        Args:
+            directory: Index directory
+
+        Returns:
+            MetadataStore
+        """
+        with open(os.path.join(directory, INFO_FILE), "r", encoding="utf-8") as f:
+            info = json.load(f)
+
+        offsets = np.load(os.path.join(directory, OFFSETS_FILE), mmap_mode="r")
+        if len(offsets) != info["count"] + 1:
+            raise ValueError("Metadata offsets don't match the image count")
+
+        paths_file = os.path.join(directory, PATHS_FILE)
+        if os.path.getsize(paths_file) > 0:
+            blob = np.memmap(paths_file, dtype="uint8", mode="r")
+        else:
+            blob = np.empty(0, dtype="uint8")
+
+        fields = np.load(os.path.join(directory, FIELDS_FILE), mmap_mode="r")
+        return cls(info, offsets, blob, fields)
+
+    @staticmethod
+    def write(directory, paths, fields=None, info=None):
+        """
+        Write a store to disk, replacing any existing one.
+
+        Args:
+            directory: Index directory
+            paths: Sequence of image paths, None for removed images
+            fields: Dict mapping field name to a sequence with one value per path
+            info: Extra JSON-serialisable entries for metadata.json
+        """
+        encoded = [(p or "").encode("utf-8") for p in paths]
+        offsets = np.zeros(len(encoded) + 1, dtype="int64")
+        if encoded:
+            np.cumsum([len(e) for e in encoded], out=offsets[1:])
+
+        fields = fields or {}
+        dtype = [(name, dtype) for name, dtype in FIELD_DTYPES.items()]
+        records = np.zeros(len(encoded), dtype=dtype)
+        for name, _ in dtype:
+            if name in fields:
+                records[name] = fields[name]
+
+        with open(os.path.join(directory, f"{OFFSETS_FILE}.tmp"), "wb") as f:
+            np.save(f, offsets)
+        with open(os.path.join(directory, f"{PATHS_FILE}.tmp"), "wb") as f:
+            for e in encoded:
+                f.write(e)
+        with open(os.path.join(directory, f"{FIELDS_FILE}.tmp"), "wb") as f:
+            np.save(f, records)
+
+        info = dict(info or {})
+        info.update({
+            "version": FORMAT_VERSION,
+            "count": len(encoded),
+            "fields": list(FIELD_DTYPES),
+        })
+        with open(os.path.join(directory, f"{INFO_FILE}.tmp"), "w", encoding="utf-8") as f:
+            json.dump(info, f)
+
+        # metadata.json goes last so its count always describes complete files
+        _replace_all(directory, [OFFSETS_FILE, PATHS_FILE, FIELDS_FILE, INFO_FILE])
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, image_id):
+        start, end = int(self.offsets[image_id]), int(self.offsets[image_id + 1])
+        if start == end:
+            return None
+        return bytes(self.blob[start:end]).decode("utf-8")
+
+    def __iter__(self):
+        for image_id in range(len(self)):
+            yield self[image_id]
+
+    def live_ids(self):
+        """
+        Ids of all images that have not been removed.
+
+        Returns:
+            int64 array of ids
+        """
+        return np.flatnonzero(np.diff(self.offsets) > 0).astype("int64")
+
+    def field(self, name):
+        """
+        One per-image field for every image.
+
+        Args:
+            name: Field name
+
+        Returns:
+            Array with one value per image id; zeros (empty for sha256) for
+            fields added after the store was written
+        """
+        if name in self.fields.dtype.names:
+            return self.fields[name]
+        return np.zeros(len(self), dtype=FIELD_DTYPES[name])
+
+    def get_fields(self, image_id):
+        """
+        Per-image fields for one image.
+
+        Args:
+            image_id: Image id
+
+        Returns:
+            Dict mapping every field in FIELD_DTYPES to its value; zero
+            (empty for sha256) for fields added after the store was written
+        """
+        record = self.fields[image_id]
+        names = self.fields.dtype.names
+        return {name: record[name].item() if name in names else np.zeros((), dtype=dtype).item()
+                for name, dtype in FIELD_DTYPES.items()}
+
+    def to_lists(self):
+        """
+        Copy the store into mutable Python lists, e.g. to update an index.
+
+        Returns:
+            Tuple of (paths list, dict mapping field name to a list of values)
+        """
+        fields = {name: self.field(name).tolist() for name in FIELD_DTYPES}
+        return list(self), fields
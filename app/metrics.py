@@ -0,0 +1,412 @@
+"""
+InspireSearch - AI-Powered Visual Search Engine
+Latency histograms, counters and request traces in Prometheus text format
+
+Serving code wraps each stage of a search in stage(), which records the
+time in a histogram and in the trace of the request being served, if any.
+Errors that are caught and logged are counted with count_error().
+
+Copyright (c) 2025 Nicole LeGuern
+Licensed under MIT License with attribution requirements
+https://github.com/CodeQueenie/InspireSearch---AI_Powered_Visual_Search_Engine
+"""
+import time
+import threading
+from contextlib import contextmanager
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Upper bounds in seconds, from a cache hit to a cold model call on a large batch
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+def _escape(value):
+    """
+    Escape a label value for the text format.
+
+    Args:
+        value: Label value
+
+    Returns:
+        Escaped string
+    """
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+def _format_labels(labelnames, values, extra=None):
+    """
+    Format a label set such as {stage="decode",le="0.1"}.
+
+    Args:
+        labelnames: Label names
+        values: Label values in the same order
+        extra: Optional (name, value) pair appended to the labels
+
+    Returns:
+        Label string, empty if there are no labels
+    """
+    pairs = list(zip(labelnames, values))
+    if extra is not None:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f"{name}=\"{_escape(value)}\"" for name, value in pairs) + "}"
+
+def _format_value(value):
+    """
+    Format a sample value.
+
+    Args:
+        value: Number
+
+    Returns:
+        String in the text format
+    """
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class _Metric:
+    """
+    Base class holding a metric's name, help text and label names.
+    """
+    kind = "untyped"
+
+    def __init__(self, name, documentation, labelnames=()):
+        """
+        Initialize the metric.
+
+        Args:
+            name: Metric name
+            documentation: Help text
+            labelnames: Names of the labels each sample carries
+        """
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        """
+        Check label values against the label names.
+
+        Args:
+            labels: Label values
+
+        Returns:
+            Tuple of label values as strings
+        """
+        if len(labels) != len(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {labels}")
+        return tuple(str(value) for value in labels)
+
+    def samples(self):
+        """
+        Lines of the metric's samples.
+
+        Returns:
+            List of strings
+        """
+        raise NotImplementedError
+
+    def render(self):
+        """
+        Format the metric with its HELP and TYPE lines.
+
+        Returns:
+            List of strings
+        """
+        return [f"# HELP {self.name} {self.documentation}",
+                f"# TYPE {self.name} {self.kind}"] + self.samples()
+
+class Counter(_Metric):
+    """
+    Monotonically increasing count per label set.
+    """
+    kind = "counter"
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self._values = {}
+
+    def inc(self, *labels, amount=1):
+        """
+        Increase the count.
+
+        Args:
+            *labels: Label values
+            amount: Amount to add
+        """
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, *labels):
+        """
+        Current count for a label set.
+
+        Args:
+            *labels: Label values
+
+        Returns:
+            Count, 0 if never increased
+        """
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+    def samples(self):
+        with self._lock:
+            values = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+                for key, value in values]
+
+class Histogram(_Metric):
+    """
+    Distribution of observed values, in cumulative buckets per label set.
+    """
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+        self._values = {}
+
+    def observe(self, value, *labels):
+        """
+        Record one observation.
+
+        Args:
+            value: Observed value, seconds for latencies
+            *labels: Label values
+        """
+        key = self._key(labels)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry[0][i] += 1
+                    break
+            entry[1] += value
+            entry[2] += 1
+
+    def samples(self):
+        with self._lock:
+            values = sorted((key, (list(counts), total, count))
+                            for key, (counts, total, count) in self._values.items())
+        lines = []
+        for key, (counts, total, count) in values:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                labels = _format_labels(self.labelnames, key, ("le", _format_value(float(bound))))
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+class CallbackMetric(_Metric):
+    """
+    Metric whose value is read from a function when it is rendered, for
+    values other objects already track such as index size or cache hits.
+    """
+
+    def __init__(self, name, documentation, fn, kind="gauge"):
+        """
+        Initialize the metric.
+
+        Args:
+            name: Metric name
+            documentation: Help text
+            fn: Function returning the current value
+            kind: "gauge" or "counter"
+        """
+        super().__init__(name, documentation)
+        self.fn = fn
+        self.kind = kind
+
+    def samples(self):
+        try:
+            value = self.fn()
+        except Exception as e:
+            print(f"Error reading metric {self.name}: {e}")
+            return []
+        return [f"{self.name} {_format_value(value)}"]
+
+class MetricsRegistry:
+    """
+    Collection of metrics rendered together for a scrape.
+    """
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        """
+        Add a metric, replacing any earlier one with the same name.
+
+        Args:
+            metric: Metric to add
+
+        Returns:
+            The metric
+        """
+        with self._lock:
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        """
+        Create and register a Counter.
+        """
+        return self.register(Counter(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        """
+        Create and register a Histogram.
+        """
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def callback(self, name, documentation, fn, kind="gauge"):
+        """
+        Create and register a CallbackMetric.
+        """
+        return self.register(CallbackMetric(name, documentation, fn, kind))
+
+    def render(self):
+        """
+        Format every metric in the Prometheus text exposition format.
+
+        Returns:
+            String ending in a newline
+        """
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+REGISTRY = MetricsRegistry()
+
+STAGE_SECONDS = REGISTRY.histogram(
+    "inspiresearch_stage_seconds",
+    "Time spent in each stage of serving a search",
+    ("stage",))
+
+ERRORS = REGISTRY.counter(
+    "inspiresearch_errors_total",
+    "Errors caught and logged, by operation",
+    ("operation",))
+
+class RequestTrace:
+    """
+    Stage timings of one request, for the Server-Timing response header.
+    """
+
+    def __init__(self):
+        self.stages = {}
+        self._lock = threading.Lock()
+
+    def add(self, stage_name, seconds):
+        """
+        Add time to a stage; repeated stages are summed.
+
+        Args:
+            stage_name: Stage name
+            seconds: Time spent
+        """
+        with self._lock:
+            self.stages[stage_name] = self.stages.get(stage_name, 0.0) + seconds
+
+    def server_timing(self):
+        """
+        Format the stages as a Server-Timing header value.
+
+        Returns:
+            String such as "decode;dur=3.1, predict;dur=41.7"
+        """
+        with self._lock:
+            stages = list(self.stages.items())
+        return ", ".join(f"{name};dur={seconds * 1000:.1f}" for name, seconds in stages)
+
+_local = threading.local()
+
+def current_traces():
+    """
+    Traces that stages on this thread are recorded into.
+
+    Returns:
+        List of RequestTrace
+    """
+    return list(getattr(_local, "traces", ()))
+
+def start_trace():
+    """
+    Start tracing the request served by this thread.
+
+    Returns:
+        The new RequestTrace
+    """
+    trace = RequestTrace()
+    _local.traces = [trace]
+    return trace
+
+def end_trace():
+    """
+    Stop tracing on this thread.
+    """
+    _local.traces = []
+
+@contextmanager
+def attach_traces(traces):
+    """
+    Record stages on this thread into other threads' traces, e.g. while
+    a worker serves a batch of queued requests.
+
+    Args:
+        traces: List of RequestTrace
+    """
+    previous = current_traces()
+    _local.traces = list(traces)
+    try:
+        yield
+    finally:
+        _local.traces = previous
+
+def record_stage(stage_name, seconds, traces=None):
+    """
+    Record time spent in a stage.
+
+    Args:
+        stage_name: Stage name
+        seconds: Time spent
+        traces: Traces to add the time to, defaults to this thread's
+    """
+    STAGE_SECONDS.observe(seconds, stage_name)
+    for trace in (current_traces() if traces is None else traces):
+        trace.add(stage_name, seconds)
+
+@contextmanager
+def stage(stage_name):
+    """
+    Time the enclosed block as one stage.
+
+    Args:
+        stage_name: Stage name
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(stage_name, time.perf_counter() - start)
+
+def count_error(operation):
+    """
+    Count an error that was caught and logged.
+
+    Args:
+        operation: Name of the operation that failed
+    """
+    ERRORS.inc(operation)
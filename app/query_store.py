@@ -0,0 +1,93 @@
+"""
+InspireSearch - AI-Powered Visual Search Engine
+Short-lived in-memory store for query images shown on the results page
+
+Copyright (c) 2025 Nicole LeGuern
+Licensed under MIT License with attribution requirements
+https://github.com/CodeQueenie/InspireSearch---AI_Powered_Visual_Search_Engine
+"""
+import time
+import uuid
+import threading
+from collections import OrderedDict
+
+class QueryImageStore:
+    """
+    Bounded store of uploaded query images that expire after a time limit.
+
+    Uploads are kept just long enough for the results page to load them,
+    so nothing is written to disk and memory use stays capped. The oldest
+    images are dropped first when either limit is reached.
+    """
+
+    def __init__(self, max_items=256, max_bytes=64 * 1024 * 1024, ttl_seconds=600):
+        """
+        Initialize the store.
+
+        Args:
+            max_items: Largest number of images kept, 0 to keep none
+            max_bytes: Memory budget for the stored images
+            ttl_seconds: How long an image can be fetched after it was stored
+        """
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+        self.ttl = ttl_seconds
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def _evict(self, now):
+        """
+        Drop expired images, then the oldest ones until within the limits.
+
+        Args:
+            now: Current time from time.monotonic
+        """
+        while self._entries:
+            token, (data, _, expires) = next(iter(self._entries.items()))
+            if expires > now and len(self._entries) <= self.max_items and self._bytes <= self.max_bytes:
+                break
+            del self._entries[token]
+            self._bytes -= len(data)
+
+    def put(self, data, mimetype):
+        """
+        Store an image.
+
+        Args:
+            data: Bytes of the image
+            mimetype: Content type to serve the image with
+
+        Returns:
+            Token to fetch the image with, or None if it wasn't stored
+        """
+        if self.max_items <= 0 or len(data) > self.max_bytes:
+            return None
+        token = uuid.uuid4().hex
+        now = time.monotonic()
+        with self._lock:
+            self._entries[token] = (data, mimetype, now + self.ttl)
+            self._bytes += len(data)
+            self._evict(now)
+        return token
+
+    def get(self, token):
+        """
+        Fetch a stored image.
+
+        Args:
+            token: Token returned by put
+
+        Returns:
+            Tuple of (bytes, mimetype), or None if unknown or expired
+        """
+        with self._lock:
+            self._evict(time.monotonic())
+            entry = self._entries.get(token)
+        if entry is None:
+            return None
+        return entry[0], entry[1]
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
@@ -0,0 +1,387 @@
+"""
+InspireSearch - AI-Powered Visual Search Engine
+Micro-batching of concurrent search requests
+
+The coalescer doubles as the server's inference pool: a fixed number of
+worker threads run every model call, fed by a bounded queue. When the queue
+is full new queries are rejected at once with QueueFullError instead of
+piling up, so bursts can't exhaust memory or time out everything queued
+behind them.
+
+Queries submitted together, e.g. the images of one API request, are queued
+as a unit and always served by the same batch, even one larger than
+max_batch_size, so they share a single model call.
+
+Copyright (c) 2025 Nicole LeGuern
+Licensed under MIT License with attribution requirements
+https://github.com/CodeQueenie/InspireSearch---AI_Powered_Visual_Search_Engine
+"""
+import time
+import queue
+import threading
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+import numpy as np
+from app.metrics import current_traces, attach_traces, record_stage, count_error
+from app.dedupe import DISTINCT_OVERFETCH, collapse_duplicates
+
+class QueueFullError(RuntimeError):
+    """
+    Raised when the inference queue has no room for a query, or a query
+    waited too long; the caller should retry later.
+    """
+
+class _Query:
+    """
+    A single caller's query waiting to be batched.
+    """
+    __slots__ = ("image", "features", "top_k", "min_score", "distinct", "search_filter",
+                 "future", "queued_at", "traces")
+
+    def __init__(self, image, features, top_k, min_score=None, distinct=False, search_filter=None):
+        self.image = image
+        self.features = features
+        self.top_k = top_k
+        self.min_score = min_score
+        self.distinct = distinct
+        self.search_filter = search_filter
+        self.future = Future()
+        # The batch is served on another thread; keep the caller's traces
+        # so the batch's stages show up in them
+        self.queued_at = time.perf_counter()
+        self.traces = current_traces()
+
+class QueryCoalescer:
+    """
+    Collect concurrent queries and serve them with one batched model call
+    and one batched index search.
+
+    A batch is flushed when it reaches max_batch_size queries or when
+    max_wait_ms has passed since its first query arrived. A unit of queries
+    that doesn't fit in the batch starts the next one. Each of the
+    num_workers threads serves one batch at a time.
+    """
+
+    def __init__(self, search_engine, max_batch_size=16, max_wait_ms=5.0, num_workers=1, max_queue=0):
+        """
+        Initialize the coalescer.
+
+        Args:
+            search_engine: ImageSearch used to embed and search
+            max_batch_size: Largest number of queries served together
+            max_wait_ms: Longest time a query waits for others to join its batch
+            num_workers: Number of threads serving batches, i.e. the most
+                model calls running at once
+            max_queue: Most queries waiting to be served before new ones are
+                rejected with QueueFullError, 0 for no limit
+        """
+        self.search_engine = search_engine
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+        self.num_workers = max(1, int(num_workers))
+        self.max_queue = max(0, int(max_queue))
+        # Holds lists of queries queued together; _queued counts the queries
+        self._queue = queue.Queue()
+        self._queued = 0
+        self._threads = []
+        self._lock = threading.Lock()
+        # Separate from _lock, which close() holds while the workers finish
+        self._counter_lock = threading.Lock()
+        self.batches = 0
+        self.queries = 0
+        self.rejected = 0
+        self.timed_out = 0
+
+    def _start(self):
+        """
+        Start the worker threads on first use.
+        """
+        with self._lock:
+            self._threads = [thread for thread in self._threads if thread.is_alive()]
+            while len(self._threads) < self.num_workers:
+                thread = threading.Thread(target=self._run, daemon=True,
+                                          name=f"query-coalescer-{len(self._threads)}")
+                thread.start()
+                self._threads.append(thread)
+
+    def _enqueue(self, queries):
+        """
+        Queue queries as one unit without blocking.
+
+        Args:
+            queries: List of _Query objects, accepted or rejected together
+                and served by the same batch
+
+        Raises:
+            QueueFullError: If the queue has no room for all of them
+        """
+        self._start()
+        with self._counter_lock:
+            if self.max_queue and self._queued + len(queries) > self.max_queue:
+                self.rejected += len(queries)
+                raise QueueFullError(f"Inference queue is full ({self.max_queue} queries waiting)")
+            self._queued += len(queries)
+        self._queue.put(queries)
+
+    def _wait(self, future, timeout):
+        """
+        Wait for a queued query, withdrawing it if it takes too long.
+
+        Args:
+            future: Future of the query
+            timeout: Seconds to wait, None to wait indefinitely
+
+        Returns:
+            The future's result
+        """
+        try:
+            return future.result(timeout=timeout)
+        except FutureTimeoutError:
+            # A query still in the queue is skipped once cancelled
+            future.cancel()
+            with self._counter_lock:
+                self.timed_out += 1
+            raise QueueFullError(f"Query not served within {timeout} seconds")
+
+    def submit(self, image=None, features=None, top_k=5, min_score=None, distinct=False,
+               search_filter=None):
+        """
+        Queue a query.
+
+        Args:
+            image: Decoded image array from ImageSearch.load_query_image
+            features: Precomputed feature vector; the model is skipped if given
+            top_k: Number of similar images to return
+            min_score: Optional smallest cosine similarity returned
+            distinct: Return one image per duplicate cluster
+            search_filter: Optional SearchFilter the results must match
+
+        Returns:
+            Future resolving to a (features, results) tuple
+
+        Raises:
+            QueueFullError: If the queue is full
+        """
+        if image is None and features is None:
+            raise ValueError("Either an image or its features are required")
+        query = _Query(image, features, top_k, min_score, distinct, search_filter)
+        self._enqueue([query])
+        return query.future
+
+    def search(self, image=None, features=None, top_k=5, min_score=None, distinct=False,
+               search_filter=None, timeout=None):
+        """
+        Queue a query and wait for its results.
+
+        Args:
+            image: Decoded image array from ImageSearch.load_query_image
+            features: Precomputed feature vector; the model is skipped if given
+            top_k: Number of similar images to return
+            min_score: Optional smallest cosine similarity returned
+            distinct: Return one image per duplicate cluster
+            search_filter: Optional SearchFilter the results must match
+            timeout: Seconds to wait for the results, None to wait indefinitely
+
+        Returns:
+            Tuple of (features, results)
+
+        Raises:
+            QueueFullError: If the queue is full or the timeout passes
+        """
+        return self._wait(self.submit(image=image, features=features, top_k=top_k, min_score=min_score,
+                                      distinct=distinct, search_filter=search_filter), timeout)
+
+    def embed(self, images, timeout=None):
+        """
+        Run the model on images through the queue, without searching.
+
+        Args:
+            images: List of decoded image arrays from ImageSearch.load_query_image
+            timeout: Seconds to wait for all embeddings, None to wait indefinitely
+
+        Returns:
+            float32 array with one feature vector per image, from one model call
+
+        Raises:
+            QueueFullError: If the queue has no room for every image or the timeout passes
+        """
+        queries = [_Query(image, None, None) for image in images]
+        self._enqueue(queries)
+        deadline = None if timeout is None else time.perf_counter() + timeout
+        features = []
+        for query in queries:
+            remaining = None if deadline is None else max(0.0, deadline - time.perf_counter())
+            try:
+                features.append(self._wait(query.future, remaining)[0])
+            except QueueFullError:
+                for pending in queries:
+                    pending.future.cancel()
+                raise
+        return np.stack(features)
+
+    def queue_depth(self):
+        """
+        Number of queries waiting to be served.
+        """
+        return self._queued
+
+    def close(self):
+        """
+        Stop the worker threads once queued queries have been served.
+        """
+        with self._lock:
+            for _ in self._threads:
+                self._queue.put(None)
+            for thread in self._threads:
+                thread.join()
+            self._threads = []
+
+    def stats(self):
+        """
+        Counters describing how well queries are being batched.
+
+        Returns:
+            Dict with the number of batches, queries and the mean batch size,
+            and of queries rejected because the queue was full or too slow
+        """
+        with self._counter_lock:
+            return {
+                "batches": self.batches,
+                "queries": self.queries,
+                "mean_batch_size": self.queries / self.batches if self.batches else 0.0,
+                "queue_depth": self.queue_depth(),
+                "rejected": self.rejected,
+                "timed_out": self.timed_out,
+            }
+
+    def _take(self, timeout=None):
+        """
+        Take the next unit of queries off the queue.
+
+        Args:
+            timeout: Seconds to wait, None to wait indefinitely
+
+        Returns:
+            List of queries, or None when the coalescer is closing
+
+        Raises:
+            queue.Empty: If nothing arrived within the timeout
+        """
+        unit = self._queue.get(timeout=timeout)
+        if unit is not None:
+            with self._counter_lock:
+                self._queued -= len(unit)
+        return unit
+
+    def _collect(self, first=None):
+        """
+        Wait for queries, then gather more until the batch is full or the window closes.
+
+        Args:
+            first: Unit of queries left over from the previous batch, if any
+
+        Returns:
+            Tuple of (list of queries or None when the coalescer is closing,
+            unit that didn't fit and starts the next batch or None)
+        """
+        if first is None:
+            first = self._take()
+            if first is None:
+                return None, None
+
+        batch = list(first)
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                unit = self._take(timeout=remaining)
+            except queue.Empty:
+                break
+            if unit is None:
+                # Serve what we have, then stop
+                self._queue.put(None)
+                break
+            if len(batch) + len(unit) > self.max_batch_size:
+                return batch, unit
+            batch.extend(unit)
+        return batch, None
+
+    def _process(self, batch):
+        """
+        Embed and search a batch, resolving each caller's future.
+
+        Args:
+            batch: List of queries
+        """
+        # Skip queries whose callers gave up waiting
+        batch = [query for query in batch if query.future.set_running_or_notify_cancel()]
+        if not batch:
+            return
+        now = time.perf_counter()
+        for query in batch:
+            record_stage("queue_wait", now - query.queued_at, traces=query.traces)
+
+        with attach_traces([trace for query in batch for trace in query.traces]):
+            to_embed = [q for q in batch if q.features is None]
+            if to_embed:
+                features = self.search_engine.extract_features_from_arrays([q.image for q in to_embed])
+                for query, row in zip(to_embed, features):
+                    query.features = row
+
+            # Queries with the same filter share one index search; embed-only
+            # queries have no top_k and skip it
+            by_filter = {}
+            for query in batch:
+                if query.top_k is None:
+                    continue
+                key = query.search_filter.key() if query.search_filter is not None else None
+                by_filter.setdefault(key, []).append(query)
+
+            groups = self.search_engine.duplicate_groups() if any(q.distinct for q in batch) else {}
+            results = {}
+            for queries in by_filter.values():
+                # The loosest cutoff in the group still lets the index search stop early;
+                # duplicates are collapsed per query, so distinct queries fetch extra
+                top_k = max(q.top_k * (DISTINCT_OVERFETCH if q.distinct and groups else 1) for q in queries)
+                min_scores = [q.min_score for q in queries]
+                min_score = None if None in min_scores else min(min_scores)
+                group_results = self.search_engine.search_batch(np.stack([q.features for q in queries]),
+                                                                top_k=top_k, min_score=min_score,
+                                                                search_filter=queries[0].search_filter)
+                for query, query_results in zip(queries, group_results):
+                    results[id(query)] = query_results
+
+        with self._counter_lock:
+            self.batches += 1
+            self.queries += len(batch)
+        for query in batch:
+            if query.top_k is None:
+                query.future.set_result((query.features, None))
+                continue
+            query_results = results[id(query)]
+            if query.min_score is not None:
+                query_results = [r for r in query_results
+                                 if r["score"] is None or r["score"] >= query.min_score]
+            if query.distinct and groups:
+                query_results = collapse_duplicates(query_results, groups, query.top_k)
+            query_results = query_results[:query.top_k]
+            query.future.set_result((query.features, query_results))
+
+    def _run(self):
+        """
+        Batching loop run on the coalescer thread.
+        """
+        left_over = None
+        while True:
+            batch, left_over = self._collect(left_over)
+            if batch is None:
+                return
+            try:
+                self._process(batch)
+            except Exception as e:
+                print(f"Error processing batch of {len(batch)} queries: {e}")
+                count_error("coalesced_batch")
+                for query in batch:
+                    if not query.future.done():
+                        query.future.set_exception(e)
@@ -0,0 +1,563 @@
+"""
+InspireSearch - AI-Powered Visual Search Engine
+Sharded index served by local worker processes
+
+Copyright (c) 2025 Nicole LeGuern
+Licensed under MIT License with attribution requirements
+https://github.com/CodeQueenie/InspireSearch---AI_Powered_Visual_Search_Engine
+"""
+import os
+import time
+import atexit
+import threading
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from app.image_search import ImageSearch
+from app.sharding import LAYOUT_FILE, shard_dir, read_layout, write_layout
+from app.metrics import stage, count_error
+from app.facets import FACETS
+from app.dedupe import DUPLICATES_FILE, load_duplicate_groups, collapse_duplicates
+
+# ImageSearch methods a shard worker answers
+SHARD_METHODS = ("search_batch", "range_search_batch", "facet_counts", "read_image", "content_digest")
+
+# Least time between attempts to load the shards or restart a dead worker
+SHARD_RETRY_SECONDS = 5
+
+def _serve_shard(conn, index_path, dataset_path, num_threads):
+    """
+    Worker process loop: load one shard and answer search requests over a pipe.
+
+    Args:
+        conn: Child end of a multiprocessing pipe
+        index_path: Directory of the shard's index
+        dataset_path: Dataset directory
+        num_threads: Number of Faiss threads this worker may use
+    """
+    import faiss
+    faiss.omp_set_num_threads(num_threads)
+
+    engine = ImageSearch(index_path=index_path, dataset_path=dataset_path)
+    ntotal = engine.index.ntotal if engine.index is not None else 0
+    conn.send(("ready", (ntotal, engine.active_embedding_config)))
+
+    while True:
+        try:
+            message = conn.recv()
+        except EOFError:
+            break
+        if message is None:
+            break
+        method, args = message
+        try:
+            if method not in SHARD_METHODS:
+                raise ValueError(f"Unknown shard method '{method}'")
+            conn.send(("ok", getattr(engine, method)(*args)))
+        except Exception as e:
+            conn.send(("error", str(e)))
+    conn.close()
+
+class ShardClient:
+    """
+    Handle to the worker process serving one shard.
+    """
+
+    def __init__(self, context, index_path, dataset_path, num_threads=1):
+        """
+        Start the worker process.
+
+        Args:
+            context: multiprocessing context used to start the worker
+            index_path: Directory of the shard's index
+            dataset_path: Dataset directory
+            num_threads: Number of Faiss threads the worker may use
+        """
+        self.index_path = index_path
+        self.ntotal = 0
+        self.embedding_config = None
+        self._conn, child_conn = context.Pipe()
+        self._lock = threading.Lock()
+        self.process = context.Process(target=_serve_shard, daemon=True,
+                                       args=(child_conn, index_path, dataset_path, num_threads))
+        self.process.start()
+        child_conn.close()
+
+    def wait_ready(self):
+        """
+        Block until the worker has loaded its shard.
+        """
+        _, (self.ntotal, self.embedding_config) = self._conn.recv()
+
+    def _call(self, method, *args):
+        """
+        Run an ImageSearch method in the worker.
+
+        Args:
+            method: One of SHARD_METHODS
+            *args: Arguments for the method
+
+        Returns:
+            The method's result
+        """
+        with self._lock:
+            try:
+                self._conn.send((method, args))
+                status, payload = self._conn.recv()
+            except (EOFError, BrokenPipeError, OSError) as e:
+                # The next search restarts the worker, see ShardedImageSearch._ensure_index
+                raise RuntimeError(f"Shard worker for {self.index_path} is not running: {e}")
+        if status != "ok":
+            raise RuntimeError(f"Shard {self.index_path} failed: {payload}")
+        return payload
+
+    def search(self, query_features, top_k, min_score=None, distinct=False, search_filter=None):
+        """
+        Search this shard.
+
+        Args:
+            query_features: float32 array with one feature vector per query
+            top_k: Number of results per query
+            min_score: Optional smallest cosine similarity returned
+            distinct: Collapse duplicates using the shard's duplicate report
+            search_filter: Optional SearchFilter the results must match
+
+        Returns:
+            List with one result list per query
+        """
+        return self._call("search_batch", query_features, top_k, min_score, distinct, search_filter)
+
+    def range_search(self, query_features, min_score, max_results, distinct=False, search_filter=None):
+        """
+        Range search this shard.
+
+        Args:
+            query_features: float32 array with one feature vector per query
+            min_score: Smallest cosine similarity returned
+            max_results: Most results per query
+            distinct: Collapse duplicates using the shard's duplicate report
+            search_filter: Optional SearchFilter the results must match
+
+        Returns:
+            List with one result list per query
+        """
+        return self._call("range_search_batch", query_features, min_score, max_results, distinct,
+                          search_filter)
+
+    def facet_counts(self, search_filter=None):
+        """
+        Count this shard's images per facet.
+
+        Args:
+            search_filter: Optional SearchFilter restricting the images counted
+
+        Returns:
+            Dict from ImageSearch.facet_counts
+        """
+        return self._call("facet_counts", search_filter)
+
+    def read_image(self, image_id):
+        """
+        Read one of this shard's images.
+
+        Args:
+            image_id: Id of the image within the shard
+
+        Returns:
+            Tuple from ImageSearch.read_image
+        """
+        return self._call("read_image", image_id)
+
+    def content_digest(self, image_id):
+        """
+        Hash of one of this shard's images.
+
+        Args:
+            image_id: Id of the image within the shard
+
+        Returns:
+            Digest from ImageSearch.content_digest
+        """
+        return self._call("content_digest", image_id)
+
+    def is_alive(self):
+        """
+        Whether the worker process is still running.
+        """
+        return self.process.is_alive()
+
+    def close(self):
+        """
+        Stop the worker process.
+        """
+        try:
+            with self._lock:
+                self._conn.send(None)
+        except (BrokenPipeError, OSError):
+            pass
+        self.process.join(timeout=5)
+        if self.process.is_alive():
+            self.process.terminate()
+
+class ShardedImageSearch(ImageSearch):
+    """
+    Image search over an index split into shards.
+
+    Each shard is served by its own worker process. Queries are embedded
+    once in this process, sent to every shard in parallel, and the per-shard
+    top-k lists are merged. For Flat shards the merged results are the same
+    as searching one unsharded index.
+
+    Result ids are global: an image with id i in shard s has id
+    i * num_shards + s.
+
+    Workers that die are restarted on the next search, and shards that
+    failed to load are retried, at most every SHARD_RETRY_SECONDS.
+    """
+
+    def __init__(self, index_path="static/index", dataset_path="static/dataset",
+                 num_shards=None, **kwargs):
+        """
+        Initialize the sharded search engine.
+
+        Args:
+            index_path: Top-level directory holding the shard directories
+            dataset_path: Path to the dataset images
+            num_shards: Number of shards, defaults to the saved layout
+            **kwargs: Passed on to ImageSearch for building each shard
+        """
+        super().__init__(index_path=index_path, dataset_path=dataset_path, **kwargs)
+        self.num_shards = num_shards or read_layout(index_path)
+        self.index_file = os.path.join(index_path, LAYOUT_FILE)
+        self._shards = None
+        self._fanout = None
+        self._build_kwargs = kwargs
+        self._context = None
+        self._num_threads = 1
+        self._last_attempt = 0.0
+        self._merged_duplicates = None
+
+    def _ensure_index(self):
+        """
+        Start the shard workers the first time the index is needed, and
+        restart any that have died since.
+        """
+        shards = self._shards
+        if self._index_checked and (shards is None or all(shard.is_alive() for shard in shards)):
+            if shards is not None or time.monotonic() - self._last_attempt < SHARD_RETRY_SECONDS:
+                return
+        with self._index_lock:
+            if not self._index_checked:
+                self._index_checked = True
+                self._last_attempt = time.monotonic()
+                if os.path.exists(self.index_file):
+                    self.load_index()
+                return
+            if time.monotonic() - self._last_attempt < SHARD_RETRY_SECONDS:
+                return
+            self._last_attempt = time.monotonic()
+            if self._shards is None:
+                if os.path.exists(self.index_file):
+                    print("Retrying to load the sharded index")
+                    self.load_index()
+                return
+            for i, shard in enumerate(self._shards):
+                if not shard.is_alive():
+                    self._restart_shard(i)
+
+    def _restart_shard(self, shard_index):
+        """
+        Replace a dead shard worker with a new one.
+
+        Args:
+            shard_index: Position of the shard in the shard list
+        """
+        old = self._shards[shard_index]
+        print(f"Shard worker for {old.index_path} died, restarting it")
+        count_error("shard_worker")
+        try:
+            shard = ShardClient(self._context, old.index_path, self.dataset_path, self._num_threads)
+            shard.wait_ready()
+            old.close()
+            self._shards[shard_index] = shard
+        except Exception as e:
+            print(f"Error restarting shard worker for {old.index_path}: {e}")
+
+    @property
+    def index(self):
+        """
+        List of ShardClient handles, or None if the shards aren't loaded.
+        """
+        self._ensure_index()
+        return self._shards
+
+    def load_index(self):
+        """
+        Start one worker process per shard and wait for each to load its index.
+
+        Returns:
+            Boolean indicating if all shards were loaded
+        """
+        try:
+            num_shards = self.num_shards or read_layout(self.index_path)
+            if not num_shards:
+                print(f"No shard layout found in {self.index_path}")
+                return False
+
+            self.close()
+            # Spawn rather than fork: forking a process that has loaded
+            # TensorFlow is unsafe
+            context = self._context = multiprocessing.get_context("spawn")
+            num_threads = self._num_threads = max(1, (os.cpu_count() or 1) // num_shards)
+            shards = [ShardClient(context, shard_dir(self.index_path, i, num_shards),
+                                  self.dataset_path, num_threads)
+                      for i in range(num_shards)]
+            for shard in shards:
+                shard.wait_ready()
+            
+            # Queries are embedded here, so they must use the shards' backend
+            embedding_configs = [s.embedding_config for s in shards if s.embedding_config]
+            if any(c != embedding_configs[0] for c in embedding_configs):
+                print("Warning: shards were built with different embedding backends")
+            if embedding_configs:
+                self.active_embedding_config = embedding_configs[0]
+
+            self.num_shards = num_shards
+            self._shards = shards
+            self._fanout = ThreadPoolExecutor(max_workers=num_shards)
+            self._index_checked = True
+            atexit.register(self.close)
+
+            print(f"Sharded index loaded with {sum(s.ntotal for s in shards)} images "
+                  f"across {num_shards} shards")
+            return True
+        except Exception as e:
+            print(f"Error loading sharded index: {e}")
+            return False
+
+    def build_index(self, incremental=False, checkpoint_every=50):
+        """
+        Build every shard in turn, sharing this engine's model, then load them.
+
+        Args:
+            incremental: Update each shard instead of rebuilding it
+            checkpoint_every: Number of batches between checkpoints, 0 to disable
+
+        Returns:
+            Boolean indicating if every shard was successfully built
+        """
+        try:
+            if not self.num_shards:
+                print("Number of shards not set")
+                return False
+
+            success = True
+            for i in range(self.num_shards):
+                print(f"Building shard {i + 1} of {self.num_shards}")
+                shard_engine = ImageSearch(index_path=shard_dir(self.index_path, i, self.num_shards),
+                                           dataset_path=self.dataset_path,
+                                           shard=(i, self.num_shards), **self._build_kwargs)
+                shard_engine._model = self.model
+                success = shard_engine.build_index(incremental=incremental,
+                                                   checkpoint_every=checkpoint_every) and success
+
+            write_layout(self.index_path, self.num_shards)
+            return success and self.load_index()
+        except Exception as e:
+            print(f"Error building sharded index: {e}")
+            return False
+
+    def _search_shards(self, query_features, search_shard, limit, distinct=False):
+        """
+        Search every shard in parallel and merge the results.
+
+        Args:
+            query_features: float32 array with one feature vector per query
+            search_shard: Function searching one ShardClient
+            limit: Most results kept per query
+            distinct: Collapse duplicates again across the merged results
+
+        Returns:
+            List with one result list per query, each holding global ids, closest first
+        """
+        with stage("index_search"):
+            per_shard = list(self._fanout.map(search_shard, self._shards))
+        for shard_index, shard_results in enumerate(per_shard):
+            for results in shard_results:
+                for result in results:
+                    result["id"] = result["id"] * self.num_shards + shard_index
+
+        # Distances are "lower is closer" for every metric, so one sort merges them
+        groups = self.duplicate_groups() if distinct else {}
+        all_results = []
+        for row in range(len(query_features)):
+            candidates = [result for shard_results in per_shard for result in shard_results[row]]
+            candidates.sort(key=lambda result: result["distance"])
+            if groups:
+                candidates = collapse_duplicates(candidates, groups, limit)
+            all_results.append(candidates[:limit])
+        return all_results
+
+    def duplicate_groups(self):
+        """
+        Duplicate clusters from every shard's report, plus a report saved
+        next to the shard layout, reloaded when any of them changes.
+
+        Returns:
+            Dict mapping each duplicate's path to its cluster's representative
+            path, empty if there are no reports
+        """
+        shards = self._shards
+        files = [self.duplicates_file]
+        if shards:
+            files.extend(os.path.join(shard.index_path, DUPLICATES_FILE) for shard in shards)
+        key = tuple((path, os.path.getmtime(path)) for path in files if os.path.exists(path))
+        cached = self._merged_duplicates
+        if cached is None or cached[0] != key:
+            groups = {}
+            try:
+                for path, _ in key:
+                    groups.update(load_duplicate_groups(path))
+            except Exception as e:
+                print(f"Error loading duplicate report: {e}")
+                count_error("load_duplicates")
+                return {}
+            cached = self._merged_duplicates = (key, groups)
+        return cached[1]
+
+    def search_batch(self, query_features, top_k=5, min_score=None, distinct=False, search_filter=None):
+        """
+        Search every shard in parallel and merge the results.
+
+        Each shard collapses its own duplicates, and the merged results are
+        collapsed again with every shard's report.
+
+        Args:
+            query_features: Array with one feature vector per query
+            top_k: Number of similar images to return per query
+            min_score: Optional smallest cosine similarity returned
+            distinct: Keep only the best-ranked image of each duplicate cluster
+            search_filter: Optional SearchFilter, applied inside each shard's index
+
+        Returns:
+            List with one result list per query, each holding global ids, paths and distances
+        """
+        try:
+            if self.index is None:
+                print("Index not loaded")
+                return [[] for _ in range(len(query_features))]
+
+            query_features = np.ascontiguousarray(query_features, dtype="float32")
+            return self._search_shards(query_features,
+                                       lambda shard: shard.search(query_features, top_k, min_score,
+                                                                  distinct, search_filter),
+                                       top_k, distinct)
+        except Exception as e:
+            print(f"Error searching sharded index: {e}")
+            count_error("search")
+            return [[] for _ in range(len(query_features))]
+
+    def range_search_batch(self, query_features, min_score, max_results=1000, distinct=False,
+                           search_filter=None):
+        """
+        Range search every shard in parallel and merge the results.
+
+        Args:
+            query_features: Array with one feature vector per query
+            min_score: Smallest cosine similarity returned
+            max_results: Most results returned per query
+            distinct: Keep only the best-ranked image of each duplicate cluster
+            search_filter: Optional SearchFilter, applied inside each shard's index
+
+        Returns:
+            List with one result list per query, each holding global ids, paths and distances
+        """
+        try:
+            if self.index is None:
+                print("Index not loaded")
+                return [[] for _ in range(len(query_features))]
+
+            query_features = np.ascontiguousarray(query_features, dtype="float32")
+            return self._search_shards(query_features,
+                                       lambda shard: shard.range_search(query_features, min_score,
+                                                                        max_results, distinct,
+                                                                        search_filter),
+                                       max_results, distinct)
+        except Exception as e:
+            print(f"Error in sharded range search: {e}")
+            count_error("range_search")
+            return [[] for _ in range(len(query_features))]
+
+    def facet_counts(self, search_filter=None):
+        """
+        Count images per facet across every shard.
+
+        Args:
+            search_filter: Optional SearchFilter restricting the images counted
+
+        Returns:
+            Dict in the format of ImageSearch.facet_counts
+        """
+        try:
+            if self.index is None:
+                print("Index not loaded")
+                return None
+
+            per_shard = list(self._fanout.map(lambda shard: shard.facet_counts(search_filter), self._shards))
+            counts = {"images": sum(c["images"] for c in per_shard)}
+            for facet in FACETS:
+                counts[facet] = {}
+                for shard_counts in per_shard:
+                    for value, total in shard_counts[facet].items():
+                        counts[facet][value] = counts[facet].get(value, 0) + total
+            # ISO 8601 UTC strings sort chronologically
+            mins = [c["date"]["min"] for c in per_shard if c["date"]["min"]]
+            maxes = [c["date"]["max"] for c in per_shard if c["date"]["max"]]
+            counts["date"] = {"min": min(mins) if mins else None, "max": max(maxes) if maxes else None}
+            return counts
+        except Exception as e:
+            print(f"Error counting facets across shards: {e}")
+            count_error("facet_counts")
+            return None
+
+    def read_image(self, image_id):
+        """
+        Read an image from the shard holding it.
+
+        Args:
+            image_id: Global image id
+
+        Returns:
+            Tuple of (path, bytes), or None if the image was removed
+        """
+        shards = self.index
+        if shards is None:
+            return None
+        return shards[image_id % self.num_shards].read_image(image_id // self.num_shards)
+
+    def content_digest(self, image_id):
+        """
+        Hash of an image, from the shard holding it.
+
+        Args:
+            image_id: Global image id
+
+        Returns:
+            SHA-256 hex digest, or None if it isn't known
+        """
+        shards = self.index
+        if shards is None:
+            return None
+        return shards[image_id % self.num_shards].content_digest(image_id // self.num_shards)
+
+    def close(self):
+        """
+        Stop all shard worker processes.
+        """
+        if self._shards:
+            for shard in self._shards:
+                shard.close()
+            self._shards = None
+        if self._fanout is not None:
+            self._fanout.shutdown(wait=False)
+            self._fanout = None
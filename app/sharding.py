@@ -0,0 +1,99 @@
+"""
+InspireSearch - AI-Powered Visual Search Engine
+Helpers for splitting the dataset and index into shards
+
+A sharded index directory looks like:
+
+  shards.json              number of shards
+  shard_0_of_4/            complete index directory for shard 0
+  shard_1_of_4/            ...
+
+Every image belongs to exactly one shard, chosen by a stable hash of its path
+relative to the dataset directory, so shards can be built independently.
+
+Copyright (c) 2025 Nicole LeGuern
+Licensed under MIT License with attribution requirements
+https://github.com/CodeQueenie/InspireSearch---AI_Powered_Visual_Search_Engine
+"""
+import os
+import json
+import zlib
+
+LAYOUT_FILE = "shards.json"
+
+def parse_shard(spec):
+    """
+    Parse a shard specification such as "2/8".
+
+    Args:
+        spec: String of the form "i/N" with 0 <= i < N
+
+    Returns:
+        Tuple of (shard_index, num_shards)
+    """
+    try:
+        shard_index, num_shards = (int(part) for part in spec.split("/"))
+    except ValueError:
+        raise ValueError(f"Invalid shard '{spec}', expected the form i/N")
+    if num_shards < 1 or not 0 <= shard_index < num_shards:
+        raise ValueError(f"Invalid shard '{spec}', need 0 <= i < N")
+    return shard_index, num_shards
+
+def shard_for_path(img_path, dataset_path, num_shards):
+    """
+    Pick the shard an image belongs to.
+
+    Args:
+        img_path: Path to the image
+        dataset_path: Dataset directory the image was found in
+        num_shards: Total number of shards
+
+    Returns:
+        Shard index in [0, num_shards)
+    """
+    relative = os.path.relpath(img_path, dataset_path).replace("\\", "/")
+    return zlib.crc32(relative.encode("utf-8")) % num_shards
+
+def shard_dir(index_path, shard_index, num_shards):
+    """
+    Directory holding one shard's index files.
+
+    Args:
+        index_path: Top-level index directory
+        shard_index: Index of the shard
+        num_shards: Total number of shards
+
+    Returns:
+        Path to the shard directory
+    """
+    return os.path.join(index_path, f"shard_{shard_index}_of_{num_shards}")
+
+def write_layout(index_path, num_shards):
+    """
+    Record how many shards an index directory is split into.
+
+    Args:
+        index_path: Top-level index directory
+        num_shards: Total number of shards
+    """
+    os.makedirs(index_path, exist_ok=True)
+    layout_file = os.path.join(index_path, LAYOUT_FILE)
+    with open(f"{layout_file}.tmp", "w", encoding="utf-8") as f:
+        json.dump({"num_shards": num_shards}, f)
+    os.replace(f"{layout_file}.tmp", layout_file)
+
+def read_layout(index_path):
+    """
+    Read the number of shards of an index directory.
+
+    Args:
+        index_path: Top-level index directory
+
+    Returns:
+        Number of shards, or None if the directory isn't sharded
+    """
+    layout_file = os.path.join(index_path, LAYOUT_FILE)
+    if not os.path.exists(layout_file):
+        return None
+    with open(layout_file, "r", encoding="utf-8") as f:
+        return json.load(f)["num_shards"]
@@ -0,0 +1,129 @@
+"""
+InspireSearch - AI-Powered Visual Search Engine
+Content-addressed cache of result thumbnails
+
+Thumbnails are JPEGs scaled to fit a square of each size in
+THUMBNAIL_SIZES, stored as <cache_dir>/<size>/<aa>/<sha256>.jpg where
+sha256 is the hash of the source image file. An image's thumbnails never
+change, identical images share them, and renamed or re-indexed images
+find theirs again without regenerating anything.
+
+Index builds write them while decoding images for the model (see
+app/feature_pipeline.py), reusing the model's decode when it is large
+enough; the app creates any that are missing when they are first
+requested.
+
+Copyright (c) 2025 Nicole LeGuern
+Licensed under MIT License with attribution requirements
+https://github.com/CodeQueenie/InspireSearch---AI_Powered_Visual_Search_Engine
+"""
+import io
+import os
+import threading
+from PIL import Image
+from app.metrics import count_error
+
+# Longest side of each thumbnail, in pixels
+THUMBNAIL_SIZES = (128, 256, 512)
+
+THUMBNAIL_QUALITY = 85
+
+class ThumbnailStore:
+    """
+    Thumbnail files for image contents, by size.
+
+    Only holds settings, so it can be handed to decode worker processes.
+    """
+
+    def __init__(self, cache_dir="static/thumbnails", sizes=THUMBNAIL_SIZES, quality=THUMBNAIL_QUALITY):
+        """
+        Initialize the store.
+
+        Args:
+            cache_dir: Directory the thumbnails are written to
+            sizes: Longest side of each thumbnail size, in pixels
+            quality: JPEG quality of the thumbnails
+        """
+        self.cache_dir = cache_dir
+        self.sizes = tuple(sorted(int(size) for size in sizes))
+        self.quality = quality
+
+    def path(self, digest, size):
+        """
+        File holding one thumbnail.
+
+        Args:
+            digest: SHA-256 hex digest of the source image file
+            size: One of sizes
+
+        Returns:
+            Path to the thumbnail, which may not exist yet
+        """
+        return os.path.join(self.cache_dir, str(size), digest[:2], f"{digest}.jpg")
+
+    def missing(self, digest):
+        """
+        Sizes not generated yet for an image.
+
+        Args:
+            digest: SHA-256 hex digest of the source image file
+
+        Returns:
+            Tuple of sizes, largest first
+        """
+        return tuple(size for size in reversed(self.sizes)
+                     if not os.path.exists(self.path(digest, size)))
+
+    def write(self, img, digest, sizes):
+        """
+        Save thumbnails of a decoded image.
+
+        Each size is scaled down from the next larger one, so the source is
+        only resampled once.
+
+        Args:
+            img: RGB PIL image at least as large as the largest size, or the
+                original image if it is smaller
+            digest: SHA-256 hex digest of the source image file
+            sizes: Sizes to write
+        """
+        # The caller may still need the full decoded image
+        img = img.copy()
+        for size in sorted(sizes, reverse=True):
+            img.thumbnail((size, size), Image.LANCZOS)
+            path = self.path(digest, size)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Decode workers may write the same thumbnail for duplicate images
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            img.save(tmp_path, "JPEG", quality=self.quality, optimize=True)
+            os.replace(tmp_path, path)
+
+    def create(self, data, digest, decoded=None):
+        """
+        Generate every missing thumbnail of an image from its encoded bytes.
+
+        Args:
+            data: Encoded image bytes
+            digest: SHA-256 hex digest of data
+            decoded: Optional RGB PIL image already decoded from data, used
+                instead of decoding again if it covers the largest missing size
+
+        Returns:
+            Boolean indicating if the thumbnails were written
+        """
+        sizes = self.missing(digest)
+        if not sizes:
+            return True
+        try:
+            if decoded is not None and max(decoded.size) >= sizes[0]:
+                self.write(decoded, digest, sizes)
+                return True
+            with Image.open(io.BytesIO(data)) as img:
+                # JPEGs can decode straight at a fraction of their size
+                img.draft("RGB", (sizes[0], sizes[0]))
+                self.write(img.convert("RGB"), digest, sizes)
+            return True
+        except Exception as e:
+            print(f"Error creating thumbnails for {digest}: {e}")
+            count_error("thumbnail")
+            return False
@@ -81,3 +81,45 @@ def get_relative_path(absolute_path):
     except Exception as e:
         print(f"Error converting path: {e}")
         return absolute_path
+
+def similarity_scores(results):
+    """
+    Convert search results to similarity percentages.
+    
+    Results from cosine indexes carry an absolute score, the cosine
+    similarity, which is shown as a percentage (negative similarity as 0)
+    and can be compared across queries. L2 indexes only have distances, so
+    their scores are relative to the furthest result: the closest match
+    scores highest and the furthest scores 0.
+    
+    Args:
+        results: List of search results with "distance" and "score" keys
+        
+    Returns:
+        List of similarity scores between 0 and 100, rounded to 1 decimal place
+    """
+    if results and all(result.get("score") is not None for result in results):
+        return [round(100 * min(1.0, max(0.0, result["score"])), 1) for result in results]
+    
+    # Ensure we don't divide by zero
+    max_distance = max((result["distance"] for result in results), default=0) or 1
+    
+    # Lower distance means higher similarity
+    return [round(100 * (1 - result["distance"] / max_distance), 1) for result in results]
+
+def parse_box(value):
+    """
+    Parse a crop box given as "left,top,right,bottom" pixel coordinates.
+    
+    Args:
+        value: Box string, or an empty string or None for no crop
+        
+    Returns:
+        Tuple of four floats, or None for no crop
+    """
+    if value is None or not value.strip():
+        return None
+    parts = [float(part) for part in value.split(",")]
+    if len(parts) != 4 or parts[2] <= parts[0] or parts[3] <= parts[1]:
+        raise ValueError(f"Invalid crop box '{value}'")
+    return tuple(parts)
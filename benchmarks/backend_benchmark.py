@@ -0,0 +1,152 @@
+"""
+InspireSearch - AI-Powered Visual Search Engine
+Benchmark comparing embedding backends, quantization and projections
+
+Builds an index for each configuration on the same dataset and reports
+per-query latency, memory (model weights plus index) and recall@k against
+the float32 ResNet50 Flat index as ground truth.
+
+Usage:
+  python benchmarks/backend_benchmark.py --configs resnet50,mobilenet_v2,mobilenet_v2+int8:pca128
+
+Copyright (c) 2025 Nicole LeGuern
+Licensed under MIT License with attribution requirements
+https://github.com/CodeQueenie/InspireSearch---AI_Powered_Visual_Search_Engine
+"""
+import os
+import sys
+import time
+import json
+import argparse
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+from app.image_search import ImageSearch
+
+BASELINE = "resnet50"
+
+def parse_config(spec):
+    """
+    Parse a configuration such as "mobilenet_v2+int8:pca128".
+
+    Args:
+        spec: Backend, optionally followed by "+int8" and ":pca<dim>" or ":opq<dim>"
+
+    Returns:
+        Dict of ImageSearch keyword arguments
+    """
+    spec, _, projection = spec.partition(":")
+    backend, _, quantize = spec.partition("+")
+    kwargs = {"embedding_backend": backend, "quantize": quantize or None}
+    if projection:
+        kwargs["index_params"] = {"projection": projection[:3],
+                                  "projection_dim": int(projection[3:])}
+    return kwargs
+
+def directory_bytes(path):
+    """
+    Total size of the index files in a directory, excluding model exports.
+
+    Args:
+        path: Index directory
+
+    Returns:
+        Number of bytes
+    """
+    return sum(os.path.getsize(os.path.join(path, name)) for name in os.listdir(path)
+               if not name.endswith(".tflite"))
+
+def run_config(spec, args, query_paths):
+    """
+    Build and query an index for one configuration.
+
+    Args:
+        spec: Configuration string, see parse_config
+        args: Parsed command line arguments
+        query_paths: Images used as queries
+
+    Returns:
+        Tuple of (result dict, list of result path lists per query)
+    """
+    index_path = os.path.join(args.work_dir, spec.replace(":", "_").replace("+", "_"))
+    search_engine = ImageSearch(index_path=index_path, dataset_path=args.dataset,
+                                **parse_config(spec))
+    if not search_engine.build_index():
+        raise RuntimeError(f"Could not build the index for {spec}")
+    search_engine.warm_up()
+
+    latencies = []
+    neighbours = []
+    for path in query_paths:
+        start = time.perf_counter()
+        features = search_engine.extract_features(path)
+        results = search_engine.search_by_features(features, top_k=args.k)
+        latencies.append(time.perf_counter() - start)
+        neighbours.append([result["path"] for result in results])
+
+    latencies = np.array(latencies)
+    index_config = search_engine.active_index_config
+    dimension = (index_config["params"]["projection_dim"] if index_config["params"]["projection"] != "none"
+                 else search_engine.model.dimension)
+    return {
+        "config": spec,
+        "dimension": dimension,
+        "p50_ms": float(np.percentile(latencies, 50) * 1000),
+        "p99_ms": float(np.percentile(latencies, 99) * 1000),
+        "model_mb": search_engine.model.memory_bytes() / 2 ** 20,
+        "index_mb": directory_bytes(index_path) / 2 ** 20,
+    }, neighbours
+
+def main():
+    """
+    Benchmark each configuration and print a comparison table.
+    """
+    try:
+        parser = argparse.ArgumentParser(description="Compare InspireSearch embedding backends")
+        parser.add_argument("--dataset", type=str, default=os.path.join(ROOT, "static", "dataset"),
+                            help="Path to the dataset directory")
+        parser.add_argument("--work-dir", type=str,
+                            default=os.path.join(ROOT, "static", "backend_benchmark"),
+                            help="Directory for the benchmark indexes")
+        parser.add_argument("--configs", type=str,
+                            default="resnet50,resnet50+int8,mobilenet_v2,mobilenet_v2+int8,"
+                                    "efficientnet_b0,mobilenet_v2+int8:pca128",
+                            help="Comma separated configurations to compare")
+        parser.add_argument("--k", type=int, default=5, help="Number of neighbours compared")
+        parser.add_argument("--queries", type=int, default=50, help="Number of query images")
+        parser.add_argument("--json", type=str, default=None,
+                            help="Optional path to write the results to")
+        args = parser.parse_args()
+
+        # The baseline runs first, its neighbours are the ground truth
+        specs = [BASELINE] + [spec for spec in args.configs.split(",") if spec != BASELINE]
+
+        image_files = ImageSearch(index_path=args.work_dir, dataset_path=args.dataset)._list_image_files()
+        step = max(1, len(image_files) // args.queries)
+        query_paths = image_files[::step][:args.queries]
+
+        results = []
+        baseline = None
+        for spec in specs:
+            result, neighbours = run_config(spec, args, query_paths)
+            if spec == BASELINE:
+                baseline = neighbours
+            hits = [len(set(found) & set(truth)) for found, truth in zip(neighbours, baseline)]
+            result["recall"] = sum(hits) / max(1, sum(len(truth) for truth in baseline))
+            results.append(result)
+
+        print(f"{'config':<28} {'dim':>5} {f'recall@{args.k}':>9} {'p50 ms':>8} "
+              f"{'p99 ms':>8} {'model MB':>9} {'index MB':>9}")
+        for r in results:
+            print(f"{r['config']:<28} {r['dimension']:>5} {r['recall']:>9.3f} {r['p50_ms']:>8.1f} "
+                  f"{r['p99_ms']:>8.1f} {r['model_mb']:>9.1f} {r['index_mb']:>9.2f}")
+
+        if args.json:
+            with open(args.json, "w", encoding="utf-8") as f:
+                json.dump(results, f, indent=2)
+    except Exception as e:
+        print(f"Error running backend benchmark: {e}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+InspireSearch - AI-Powered Visual Search Engine
+Benchmark of image decode time per megapixel
+
+Decodes every image in a directory to the model input size, first at full
+resolution and then with reduced-scale JPEG (draft mode) decoding, and
+reports the cost per megapixel of source image for each. Unreadable images
+are counted and skipped.
+
+Usage:
+  python benchmarks/decode_benchmark.py --dir static/dataset
+
+Copyright (c) 2025 Nicole LeGuern
+Licensed under MIT License with attribution requirements
+https://github.com/CodeQueenie/InspireSearch---AI_Powered_Visual_Search_Engine
+"""
+import os
+import sys
+import time
+import json
+import argparse
+from PIL import Image
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+from app.feature_pipeline import load_image
+
+def measure(image_files, draft, repeats):
+    """
+    Decode each image and time it.
+
+    Args:
+        image_files: Paths of the images
+        draft: Whether to use reduced-scale JPEG decoding
+        repeats: Number of passes over the images
+
+    Returns:
+        Dict with totals and the cost per megapixel
+    """
+    seconds = 0.0
+    megapixels = 0.0
+    decoded = 0
+    failed = 0
+    for _ in range(repeats):
+        for path in image_files:
+            try:
+                with Image.open(path) as img:
+                    size = img.width * img.height / 1e6
+                start = time.perf_counter()
+                load_image(path, draft=draft)
+                seconds += time.perf_counter() - start
+            except Exception:
+                failed += 1
+                continue
+            megapixels += size
+            decoded += 1
+
+    return {
+        "mode": "draft" if draft else "full",
+        "images": decoded,
+        "failed": failed,
+        "megapixels": megapixels,
+        "seconds": seconds,
+        "ms_per_image": seconds * 1000 / decoded if decoded else 0.0,
+        "ms_per_megapixel": seconds * 1000 / megapixels if megapixels else 0.0,
+    }
+
+def main():
+    """
+    Compare full and draft-mode decoding on a sample directory.
+    """
+    try:
+        parser = argparse.ArgumentParser(description="Measure image decode time per megapixel")
+        parser.add_argument("--dir", type=str, default=os.path.join(ROOT, "static", "dataset"),
+                            help="Directory of sample images")
+        parser.add_argument("--repeats", type=int, default=3, help="Passes over the images")
+        parser.add_argument("--json", type=str, default=None,
+                            help="Optional path to write the results to")
+        args = parser.parse_args()
+
+        image_files = sorted(os.path.join(root, name)
+                             for root, _, files in os.walk(args.dir) for name in files
+                             if name.lower().endswith((".png", ".jpg", ".jpeg")))
+        if not image_files:
+            print(f"No images found in {args.dir}")
+            return
+
+        results = [measure(image_files, draft, args.repeats) for draft in (False, True)]
+
+        print(f"{'mode':<6} {'images':>7} {'failed':>7} {'avg MP':>7} {'ms/image':>9} {'ms/MP':>8}")
+        for r in results:
+            average_mp = r["megapixels"] / r["images"] if r["images"] else 0.0
+            print(f"{r['mode']:<6} {r['images']:>7} {r['failed']:>7} {average_mp:>7.1f} "
+                  f"{r['ms_per_image']:>9.2f} {r['ms_per_megapixel']:>8.2f}")
+        if results[1]["ms_per_megapixel"]:
+            print(f"Draft decoding is {results[0]['ms_per_megapixel'] / results[1]['ms_per_megapixel']:.1f}x "
+                  f"faster per megapixel")
+
+        if args.json:
+            with open(args.json, "w", encoding="utf-8") as f:
+                json.dump(results, f, indent=2)
+    except Exception as e:
+        print(f"Error running decode benchmark: {e}")
+
+if __name__ == "__main__":
+    main()
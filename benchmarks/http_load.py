@@ -0,0 +1,160 @@
+"""
+InspireSearch - AI-Powered Visual Search Engine
+HTTP load generator measuring saturation throughput
+
+Posts query images to a running server's /api/v1/search endpoint from an
+increasing number of concurrent clients, each sending its next request as
+soon as the last one returns. For each level it reports successful
+requests per second, the share of requests turned away with 503 and the
+p50/p99 latency of successful ones. The saturation throughput is the
+highest successful rate reached; past it, more clients only add latency
+or 503s.
+
+Each upload gets a unique suffix after the image data so the server's
+embedding cache can't answer it and every request reaches the model,
+unless --allow-cache is given.
+
+Usage:
+  python serve.py &
+  python benchmarks/http_load.py --url http://127.0.0.1:8000 --concurrency 1,4,16,64
+
+Copyright (c) 2025 Nicole LeGuern
+Licensed under MIT License with attribution requirements
+https://github.com/CodeQueenie/InspireSearch---AI_Powered_Visual_Search_Engine
+"""
+import os
+import sys
+import time
+import json
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import requests
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+from app.utils import allowed_file
+
+def run_level(url, images, concurrency, duration, top_k, allow_cache=False):
+    """
+    Keep a number of clients searching for a fixed time.
+
+    Args:
+        url: Search endpoint
+        images: List of (filename, bytes) query images, used round-robin
+        concurrency: Number of concurrent clients
+        duration: Seconds to run
+        top_k: Results per search
+        allow_cache: Send identical bytes for repeated images
+
+    Returns:
+        Dict with throughput, rejection rate and latency percentiles
+    """
+    latencies = []
+    counts = {"ok": 0, "busy": 0, "failed": 0}
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def client(worker):
+        session = requests.Session()
+        i = worker
+        while time.perf_counter() < deadline:
+            filename, data = images[i % len(images)]
+            i += concurrency
+            if not allow_cache:
+                # Decoders stop at the end of the image, so the suffix only changes the cache key
+                data += f"{worker}:{i}:{time.perf_counter()}".encode("ascii")
+            start = time.perf_counter()
+            try:
+                response = session.post(url, files={"file": (filename, data)},
+                                        data={"top_k": top_k}, timeout=60)
+                status = response.status_code
+            except requests.RequestException:
+                status = None
+            elapsed = time.perf_counter() - start
+            with lock:
+                if status == 200:
+                    counts["ok"] += 1
+                    latencies.append(elapsed)
+                elif status == 503:
+                    counts["busy"] += 1
+                else:
+                    counts["failed"] += 1
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(client, range(concurrency)))
+    elapsed = time.perf_counter() - start
+
+    total = sum(counts.values())
+    return {
+        "concurrency": concurrency,
+        "requests": total,
+        "ok": counts["ok"],
+        "rejected": counts["busy"],
+        "failed": counts["failed"],
+        "throughput_rps": counts["ok"] / elapsed,
+        "rejected_rate": counts["busy"] / total if total else 0.0,
+        "p50_ms": float(np.percentile(latencies, 50) * 1000) if latencies else None,
+        "p99_ms": float(np.percentile(latencies, 99) * 1000) if latencies else None,
+    }
+
+def main():
+    """
+    Run each concurrency level against the server and report saturation throughput.
+    """
+    try:
+        parser = argparse.ArgumentParser(description="Measure InspireSearch saturation throughput over HTTP")
+        parser.add_argument("--url", type=str, default="http://127.0.0.1:8000",
+                            help="Base URL of a running server")
+        parser.add_argument("--images", type=str, default=os.path.join(ROOT, "static", "dataset"),
+                            help="Directory of query images")
+        parser.add_argument("--max-images", type=int, default=64,
+                            help="Most query images loaded into memory")
+        parser.add_argument("--concurrency", type=str, default="1,4,16,64",
+                            help="Comma separated numbers of concurrent clients")
+        parser.add_argument("--duration", type=float, default=10.0,
+                            help="Seconds to run each concurrency level")
+        parser.add_argument("--top-k", type=int, default=5, help="Results per search")
+        parser.add_argument("--allow-cache", action="store_true",
+                            help="Let repeated images hit the server's embedding cache")
+        parser.add_argument("--json", type=str, default=None,
+                            help="Optional path to write the results to")
+        args = parser.parse_args()
+
+        images = []
+        for dirpath, _, filenames in os.walk(args.images):
+            for filename in sorted(filenames):
+                if allowed_file(filename) and len(images) < args.max_images:
+                    with open(os.path.join(dirpath, filename), "rb") as f:
+                        images.append((filename, f.read()))
+        if not images:
+            print(f"No query images found in {args.images}")
+            return
+
+        url = args.url.rstrip("/") + "/api/v1/search"
+        results = []
+        print(f"{'clients':>7} {'requests':>9} {'ok/s':>9} {'503 %':>7} {'p50 ms':>9} {'p99 ms':>9}")
+        for concurrency in [int(c) for c in args.concurrency.split(",")]:
+            result = run_level(url, images, concurrency, args.duration, args.top_k, args.allow_cache)
+            results.append(result)
+            p50 = f"{result['p50_ms']:.1f}" if result["p50_ms"] is not None else "-"
+            p99 = f"{result['p99_ms']:.1f}" if result["p99_ms"] is not None else "-"
+            print(f"{concurrency:>7} {result['requests']:>9} {result['throughput_rps']:>9.1f} "
+                  f"{result['rejected_rate'] * 100:>7.1f} {p50:>9} {p99:>9}")
+            if result["failed"]:
+                print(f"  {result['failed']} requests failed with an error other than 503")
+
+        saturation = max(results, key=lambda r: r["throughput_rps"])
+        print(f"Saturation throughput: {saturation['throughput_rps']:.1f} req/s "
+              f"at {saturation['concurrency']} clients")
+        if args.json:
+            with open(args.json, "w", encoding="utf-8") as f:
+                json.dump({"levels": results, "saturation_rps": saturation["throughput_rps"],
+                           "saturation_concurrency": saturation["concurrency"]}, f, indent=2)
+    except Exception as e:
+        print(f"Error running HTTP load test: {e}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""
+InspireSearch - AI-Powered Visual Search Engine
+Load test comparing per-request search against coalesced micro-batches
+
+Fires concurrent searches at an ImageSearch engine, first with one model
+call and one index search per request, then through a QueryCoalescer, and
+reports throughput and p50/p99 latency for each.
+
+Usage:
+  python benchmarks/load_test.py --concurrency 1,8,32 --requests 256
+
+Copyright (c) 2025 Nicole LeGuern
+Licensed under MIT License with attribution requirements
+https://github.com/CodeQueenie/InspireSearch---AI_Powered_Visual_Search_Engine
+"""
+import os
+import sys
+import time
+import json
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+from app.image_search import ImageSearch
+from app.request_coalescer import QueryCoalescer
+
+def run_load(search_fn, image_paths, concurrency, num_requests):
+    """
+    Issue searches from a pool of threads and time each one.
+
+    Args:
+        search_fn: Function taking an image path and running one search
+        image_paths: Query images, used round-robin
+        concurrency: Number of concurrent callers
+        num_requests: Total number of searches
+
+    Returns:
+        Dict with throughput and latency percentiles
+    """
+    def one_request(i):
+        start = time.perf_counter()
+        search_fn(image_paths[i % len(image_paths)])
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        latencies = np.array(list(pool.map(one_request, range(num_requests))))
+    elapsed = time.perf_counter() - start
+
+    return {
+        "throughput_rps": num_requests / elapsed,
+        "p50_ms": float(np.percentile(latencies, 50) * 1000),
+        "p99_ms": float(np.percentile(latencies, 99) * 1000),
+    }
+
+def main():
+    """
+    Run the load test for each concurrency level, with and without coalescing.
+    """
+    try:
+        parser = argparse.ArgumentParser(description="Load test InspireSearch search throughput")
+        parser.add_argument("--dataset", type=str, default=os.path.join(ROOT, "static", "dataset"),
+                            help="Path to the dataset directory")
+        parser.add_argument("--index", type=str, default=os.path.join(ROOT, "static", "index"),
+                            help="Path to the index (built if missing)")
+        parser.add_argument("--concurrency", type=str, default="1,8,32",
+                            help="Comma separated numbers of concurrent callers")
+        parser.add_argument("--requests", type=int, default=256,
+                            help="Number of searches per run")
+        parser.add_argument("--top-k", type=int, default=5, help="Results per search")
+        parser.add_argument("--max-batch", type=int, default=16,
+                            help="Coalescer batch size limit")
+        parser.add_argument("--max-wait-ms", type=float, default=5.0,
+                            help="Coalescer flush window in milliseconds")
+        parser.add_argument("--json", type=str, default=None,
+                            help="Optional path to write the results to")
+        args = parser.parse_args()
+
+        search_engine = ImageSearch(index_path=args.index, dataset_path=args.dataset)
+        if search_engine.index is None and not search_engine.build_index():
+            print("Could not build the index")
+            return
+        search_engine.warm_up()
+
+        image_paths = search_engine._list_image_files()
+        coalescer = QueryCoalescer(search_engine, max_batch_size=args.max_batch,
+                                   max_wait_ms=args.max_wait_ms)
+
+        def direct(path):
+            features = search_engine.extract_features(path)
+            return search_engine.search_by_features(features, top_k=args.top_k)
+
+        def coalesced(path):
+            image = search_engine.load_query_image(path)
+            return coalescer.search(image=image, top_k=args.top_k)
+
+        results = []
+        print(f"{'mode':<10} {'callers':>7} {'req/s':>9} {'p50 ms':>9} {'p99 ms':>9} {'batch':>6}")
+        for concurrency in [int(c) for c in args.concurrency.split(",")]:
+            for mode, search_fn in (("direct", direct), ("coalesced", coalesced)):
+                coalescer.batches = coalescer.queries = 0
+                result = run_load(search_fn, image_paths, concurrency, args.requests)
+                result.update({"mode": mode, "concurrency": concurrency})
+                batch = coalescer.stats()["mean_batch_size"] if mode == "coalesced" else 1.0
+                result["mean_batch_size"] = batch
+                results.append(result)
+                print(f"{mode:<10} {concurrency:>7} {result['throughput_rps']:>9.1f} "
+                      f"{result['p50_ms']:>9.1f} {result['p99_ms']:>9.1f} {batch:>6.1f}")
+
+        coalescer.close()
+        if args.json:
+            with open(args.json, "w", encoding="utf-8") as f:
+                json.dump(results, f, indent=2)
+    except Exception as e:
+        print(f"Error running load test: {e}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""
+InspireSearch - AI-Powered Visual Search Engine
+Benchmark of import-to-first-request latency for app.py
+
+Each scenario runs in a fresh Python process so nothing is cached between runs:
+
+  cold     import app.py, serve "/", then the first and a second /search
+  warm_up  import app.py, call search_engine.warm_up(), then the first /search
+
+Usage:
+  python benchmarks/startup_benchmark.py --repeat 3
+
+Copyright (c) 2025 Nicole LeGuern
+Licensed under MIT License with attribution requirements
+https://github.com/CodeQueenie/InspireSearch---AI_Powered_Visual_Search_Engine
+"""
+import os
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Runs inside the child process. Prints a JSON dict of timings in seconds.
+CHILD = r"""
+import json, os, sys, time
+start = time.perf_counter()
+import importlib.util
+spec = importlib.util.spec_from_file_location("inspiresearch_app", os.path.join(os.getcwd(), "app.py"))
+module = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(module)
+timings = {"import": time.perf_counter() - start}
+client = module.app.test_client()
+scenario, first_image, second_image = sys.argv[1:4]
+
+def post(path):
+    with open(path, "rb") as f:
+        t = time.perf_counter()
+        response = client.post("/search", data={"file": (f, os.path.basename(path))},
+                               content_type="multipart/form-data")
+        assert response.status_code == 200, response.status_code
+        return time.perf_counter() - t
+
+if scenario == "cold":
+    t = time.perf_counter()
+    client.get("/")
+    timings["first_page"] = time.perf_counter() - t
+else:
+    t = time.perf_counter()
+    module.search_engine.warm_up()
+    timings["warm_up"] = time.perf_counter() - t
+
+timings["first_search"] = post(first_image)
+timings["import_to_first_search"] = time.perf_counter() - start
+timings["second_search"] = post(second_image)
+print("BENCHMARK_RESULT " + json.dumps(timings))
+"""
+
+def run_scenario(scenario, first_image, second_image):
+    """
+    Run one scenario in a fresh interpreter.
+
+    Args:
+        scenario: "cold" or "warm_up"
+        first_image: Query image for the first search
+        second_image: Query image for the second search
+
+    Returns:
+        Dict of timings in seconds
+    """
+    output = subprocess.run(
+        [sys.executable, "-c", CHILD, scenario, first_image, second_image],
+        cwd=ROOT, capture_output=True, text=True, check=True).stdout
+    for line in output.splitlines():
+        if line.startswith("BENCHMARK_RESULT "):
+            return json.loads(line[len("BENCHMARK_RESULT "):])
+    raise RuntimeError(f"No benchmark result in output:\n{output}")
+
+def main():
+    """
+    Run every scenario and print median timings.
+    """
+    try:
+        parser = argparse.ArgumentParser(description="Benchmark InspireSearch startup latency")
+        parser.add_argument("--dataset", type=str, default=os.path.join(ROOT, "static", "dataset"),
+                            help="Directory to take the two query images from")
+        parser.add_argument("--repeat", type=int, default=3,
+                            help="Number of fresh processes per scenario")
+        parser.add_argument("--json", type=str, default=None,
+                            help="Optional path to write the raw results to")
+        args = parser.parse_args()
+
+        images = sorted(os.path.join(args.dataset, f) for f in os.listdir(args.dataset)
+                        if f.lower().endswith((".png", ".jpg", ".jpeg")))
+        if len(images) < 2:
+            print(f"Need at least two images in {args.dataset}")
+            return
+
+        results = {}
+        for scenario in ("cold", "warm_up"):
+            runs = [run_scenario(scenario, images[0], images[1]) for _ in range(args.repeat)]
+            results[scenario] = runs
+            print(f"{scenario} (median of {args.repeat} runs)")
+            for key in runs[0]:
+                median = statistics.median(run[key] for run in runs)
+                print(f"  {key:<24} {median * 1000:>10.1f} ms")
+
+        if args.json:
+            with open(args.json, "w", encoding="utf-8") as f:
+                json.dump(results, f, indent=2)
+    except Exception as e:
+        print(f"Error running startup benchmark: {e}")
+
+if __name__ == "__main__":
+    main()
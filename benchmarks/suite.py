@@ -0,0 +1,499 @@
+"""
+InspireSearch - AI-Powered Visual Search Engine
+Reproducible benchmark suite for indexing and search
+
+Creates synthetic image datasets offline and measures, for each dataset
+size, build_index throughput, load_index time, single and batched search
+latency, peak memory and index file size. Each size runs in a fresh Python
+process so memory peaks and warm caches don't carry over. Results are
+written as JSON, and two result files can be compared to flag regressions.
+
+Models:
+  random    the backend's architecture with seeded random weights: the same
+            cost as the pretrained model, with no download (default)
+  stub      a fixed random projection of the pixels instead of a network, to
+            measure the decode pipeline and index quickly on large datasets
+  imagenet  the pretrained weights, if they are available
+
+Usage:
+  python benchmarks/suite.py run --sizes 1000,10000,100000 --out results.json
+  python benchmarks/suite.py compare baseline.json results.json --threshold 0.1
+
+Copyright (c) 2025 Nicole LeGuern
+Licensed under MIT License with attribution requirements
+https://github.com/CodeQueenie/InspireSearch---AI_Powered_Visual_Search_Engine
+"""
+import os
+import sys
+import time
+import json
+import shutil
+import argparse
+import platform
+import tempfile
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from importlib import metadata
+import numpy as np
+from PIL import Image
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+from app.image_search import ImageSearch
+from app.embedding_backends import BACKENDS, EmbeddingModel, resolve_embedding_config
+from app.feature_pipeline import IMAGE_SIZE
+from app.index_factory import INDEX_TYPES
+
+SUITE_VERSION = 1
+DEFAULT_SIZES = "1000,10000,100000"
+MODELS = ("random", "stub", "imagenet")
+
+# Metrics compared between runs: whether higher values are better, and the
+# smallest absolute change treated as more than timer noise
+METRICS = {
+    "build_images_per_sec": (True, 0.0),
+    "load_seconds": (False, 0.01),
+    "single_search_p50_ms": (False, 1.0),
+    "single_search_p99_ms": (False, 1.0),
+    "batch_search_ms_per_query": (False, 1.0),
+    "index_search_p50_ms": (False, 0.05),
+    "index_search_p99_ms": (False, 0.05),
+    "peak_rss_mb": (False, 5.0),
+    "index_bytes": (False, 0.0),
+}
+
+# Child output line carrying the measurements, so library logging can't corrupt them
+RESULT_PREFIX = "BENCHMARK_RESULT "
+
+def generate_dataset(path, count, image_size=256, seed=0):
+    """
+    Write a deterministic synthetic dataset, reusing it if already present.
+
+    Images are smooth random colour fields with a little noise, so they
+    compress and decode like photos and each one has different features.
+
+    Args:
+        path: Dataset directory
+        count: Number of images
+        image_size: Width and height of each JPEG
+        seed: Random seed; the same seed always gives the same images
+    """
+    marker = os.path.join(path, "DATASET.json")
+    spec = {"count": count, "image_size": image_size, "seed": seed, "version": 1}
+    try:
+        with open(marker, "r", encoding="utf-8") as f:
+            if json.load(f) == spec:
+                return
+    except (OSError, ValueError):
+        pass
+
+    shutil.rmtree(path, ignore_errors=True)
+    # 1000 images per directory keeps listings fast on every filesystem
+    for i in range(0, count, 1000):
+        os.makedirs(os.path.join(path, f"{i // 1000:04d}"))
+
+    def write(i):
+        rng = np.random.default_rng([seed, i])
+        low = Image.fromarray(rng.integers(0, 256, size=(8, 8, 3), dtype=np.uint8))
+        pixels = np.asarray(low.resize((image_size, image_size), Image.BILINEAR), dtype=np.int16)
+        pixels = pixels + rng.integers(-12, 13, size=pixels.shape)
+        image = Image.fromarray(np.clip(pixels, 0, 255).astype(np.uint8))
+        image.save(os.path.join(path, f"{i // 1000:04d}", f"img_{i:06d}.jpg"), quality=85)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=os.cpu_count() or 4) as pool:
+        list(pool.map(write, range(count)))
+    with open(marker, "w", encoding="utf-8") as f:
+        json.dump(spec, f)
+    print(f"Generated {count} images in {time.perf_counter() - start:.1f}s")
+
+class StubEmbeddingModel:
+    """
+    Stand-in for EmbeddingModel: a fixed random projection of the image
+    averaged over 14x14 pixel blocks.
+    """
+
+    def __init__(self, config, dimension, seed=0):
+        """
+        Initialize the stub.
+
+        Args:
+            config: Embedding configuration the stub stands in for
+            dimension: Feature dimension, matching the real backend
+            seed: Random seed for the projection
+        """
+        self.config = config
+        self.dimension = dimension
+        self.grid = (IMAGE_SIZE[1] // 14, IMAGE_SIZE[0] // 14)
+        rng = np.random.default_rng(seed)
+        self._projection = rng.standard_normal((self.grid[0] * self.grid[1] * 3, dimension)).astype("float32")
+
+    @staticmethod
+    def preprocess(x):
+        """
+        Scale pixels to [-1, 1].
+        """
+        return x / 127.5 - 1.0
+
+    def predict(self, x, batch_size=None):
+        """
+        Project a preprocessed batch to feature vectors.
+        """
+        n = len(x)
+        pooled = x.reshape(n, self.grid[0], 14, self.grid[1], 14, 3).mean(axis=(2, 4)).reshape(n, -1)
+        return np.maximum(pooled @ self._projection, 0.0).astype("float32")
+
+    def memory_bytes(self):
+        """
+        Size of the projection matrix.
+        """
+        return self._projection.nbytes
+
+def make_model(model, backend, model_dir, seed):
+    """
+    Create the embedding model for a run.
+
+    Args:
+        model: One of MODELS
+        backend: Embedding backend name
+        model_dir: Directory for any exported model files
+        seed: Random seed for random weights and the stub
+
+    Returns:
+        Object with the EmbeddingModel interface
+    """
+    config = resolve_embedding_config(backend)
+    if model == "stub":
+        return StubEmbeddingModel(config, BACKENDS[backend][2], seed=seed)
+    if model == "random":
+        import tensorflow as tf
+        tf.keras.utils.set_random_seed(seed)
+        return EmbeddingModel(config, model_dir, weights=None)
+    return EmbeddingModel(config, model_dir)
+
+def percentiles(seconds):
+    """
+    Latency summary in milliseconds.
+
+    Args:
+        seconds: List of durations
+
+    Returns:
+        Tuple of (p50, p99, mean)
+    """
+    ms = np.array(seconds) * 1000
+    return float(np.percentile(ms, 50)), float(np.percentile(ms, 99)), float(ms.mean())
+
+def peak_rss_mb():
+    """
+    Peak resident memory of this process and of its reaped children.
+
+    Returns:
+        Tuple of (self MB, children MB), None where unavailable
+    """
+    try:
+        import resource
+    except ImportError:
+        return None, None
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    scale = 1 if sys.platform == "darwin" else 1024
+    return tuple(resource.getrusage(who).ru_maxrss * scale / 2 ** 20
+                 for who in (resource.RUSAGE_SELF, resource.RUSAGE_CHILDREN))
+
+def directory_bytes(path):
+    """
+    Total size of the files under a directory.
+
+    Args:
+        path: Directory
+
+    Returns:
+        Byte count
+    """
+    return sum(os.path.getsize(os.path.join(root, name))
+               for root, _, files in os.walk(path) for name in files)
+
+def measure(args):
+    """
+    Build, load and search one dataset, in this process.
+
+    Args:
+        args: Parsed "measure" arguments
+
+    Returns:
+        Dict of measurements
+    """
+    shutil.rmtree(args.index, ignore_errors=True)
+    model = make_model(args.model, args.backend, args.index, args.seed)
+
+    # Build from scratch
+    engine = ImageSearch(index_path=args.index, dataset_path=args.dataset,
+                         batch_size=args.batch_size, index_type=args.index_type,
+                         embedding_backend=args.backend,
+                         decode_in_processes=not args.decode_threads)
+    engine._model = model
+    start = time.perf_counter()
+    if not engine.build_index():
+        raise RuntimeError("build_index failed")
+    build_seconds = time.perf_counter() - start
+    indexed = engine.index.ntotal
+    del engine
+
+    # Load it as a fresh server process would
+    loaded = ImageSearch(index_path=args.index, dataset_path=args.dataset)
+    start = time.perf_counter()
+    if not loaded.load_index():
+        raise RuntimeError("load_index failed")
+    load_seconds = time.perf_counter() - start
+    loaded._model = model
+
+    # Query images spread evenly over the dataset, the same on every run
+    image_files = loaded._list_image_files()
+    step = max(1, len(image_files) // args.queries)
+    queries = image_files[::step][:args.queries]
+    loaded.search(queries[0], top_k=args.top_k)
+
+    single = []
+    for path in queries:
+        start = time.perf_counter()
+        loaded.search(path, top_k=args.top_k)
+        single.append(time.perf_counter() - start)
+
+    # Decode, one model call and one index search per batch of queries
+    batch_seconds = 0.0
+    features = []
+    for i in range(0, len(queries), args.query_batch):
+        start = time.perf_counter()
+        arrays = [loaded.load_query_image(path) for path in queries[i:i + args.query_batch]]
+        batch_features = loaded.extract_features_from_arrays(arrays)
+        loaded.search_batch(batch_features, top_k=args.top_k)
+        batch_seconds += time.perf_counter() - start
+        features.extend(batch_features)
+
+    # Index search alone, with the model out of the way
+    index_only = []
+    for row in features:
+        start = time.perf_counter()
+        loaded.search_by_features(row, top_k=args.top_k)
+        index_only.append(time.perf_counter() - start)
+
+    single_p50, single_p99, single_mean = percentiles(single)
+    index_p50, index_p99, _ = percentiles(index_only)
+    rss, children_rss = peak_rss_mb()
+    return {
+        "images": indexed,
+        "build_seconds": build_seconds,
+        "build_images_per_sec": indexed / build_seconds if build_seconds else 0.0,
+        "load_seconds": load_seconds,
+        "queries": len(queries),
+        "single_search_p50_ms": single_p50,
+        "single_search_p99_ms": single_p99,
+        "single_search_mean_ms": single_mean,
+        "batch_size": args.query_batch,
+        "batch_search_ms_per_query": batch_seconds * 1000 / len(queries),
+        "index_search_p50_ms": index_p50,
+        "index_search_p99_ms": index_p99,
+        "peak_rss_mb": rss,
+        "peak_rss_children_mb": children_rss,
+        "index_bytes": directory_bytes(args.index),
+    }
+
+def environment():
+    """
+    Describe the machine and library versions a run used.
+
+    Returns:
+        Dict suitable for JSON
+    """
+    versions = {}
+    for package in ("numpy", "faiss-cpu", "faiss", "tensorflow", "tensorflow-cpu", "Pillow"):
+        try:
+            versions[package] = metadata.version(package)
+        except metadata.PackageNotFoundError:
+            pass
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                                capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        "platform": platform.platform(),
+        "python": platform.python_version(),
+        "cpu_count": os.cpu_count(),
+        "packages": versions,
+        "commit": commit,
+    }
+
+# Options shared by "run" and the per-size "measure" child
+SHARED_OPTIONS = ("model", "backend", "index_type", "batch_size", "queries", "query_batch",
+                  "top_k", "seed")
+
+def add_shared_options(parser):
+    """
+    Add the options that control what is measured.
+
+    Args:
+        parser: argparse parser
+    """
+    parser.add_argument("--model", choices=MODELS, default="random", help="Embedding model, see above")
+    parser.add_argument("--backend", choices=list(BACKENDS), default="resnet50", help="Embedding backend")
+    parser.add_argument("--index-type", choices=list(INDEX_TYPES), default="flat", help="Faiss index type")
+    parser.add_argument("--batch-size", type=int, default=32, help="Images per model call when building")
+    parser.add_argument("--queries", type=int, default=200, help="Query images per size")
+    parser.add_argument("--query-batch", type=int, default=16, help="Queries per batched search")
+    parser.add_argument("--top-k", type=int, default=5, help="Results per search")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed for datasets and models")
+    parser.add_argument("--decode-threads", action="store_true",
+                        help="Decode with threads instead of worker processes")
+
+def run(args):
+    """
+    Measure every dataset size in its own process and write the results.
+
+    Args:
+        args: Parsed "run" arguments
+
+    Returns:
+        Exit code
+    """
+    sizes = [int(size) for size in args.sizes.split(",") if size]
+    os.makedirs(args.work_dir, exist_ok=True)
+
+    results = {}
+    for size in sizes:
+        dataset_path = os.path.join(args.work_dir, f"dataset_{size}_{args.image_size}_{args.seed}")
+        generate_dataset(dataset_path, size, image_size=args.image_size, seed=args.seed)
+
+        command = [sys.executable, os.path.abspath(__file__), "measure",
+                   "--dataset", dataset_path, "--index", os.path.join(args.work_dir, f"index_{size}")]
+        for name in SHARED_OPTIONS:
+            command += [f"--{name.replace('_', '-')}", str(getattr(args, name))]
+        if args.decode_threads:
+            command.append("--decode-threads")
+
+        print(f"Measuring {size} images with the {args.model} {args.backend} model...")
+        child = subprocess.run(command, cwd=ROOT, capture_output=True, text=True)
+        lines = [line for line in child.stdout.splitlines() if line.startswith(RESULT_PREFIX)]
+        if child.returncode != 0 or not lines:
+            print(f"Measurement of {size} images failed:\n{(child.stdout + child.stderr)[-2000:]}")
+            results[str(size)] = {"error": f"exit code {child.returncode}"}
+            continue
+        results[str(size)] = json.loads(lines[-1][len(RESULT_PREFIX):])
+
+    report = {
+        "suite_version": SUITE_VERSION,
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "config": {name: getattr(args, name) for name in SHARED_OPTIONS + ("image_size", "decode_threads")},
+        "environment": environment(),
+        "results": results,
+    }
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+
+    print(f"{'images':>8} {'build img/s':>12} {'load s':>7} {'search p50':>11} {'p99':>8} "
+          f"{'batch ms/q':>11} {'index p50':>10} {'peak MB':>8} {'index MB':>9}")
+    for size, r in results.items():
+        if "error" in r:
+            print(f"{size:>8} {r['error']}")
+            continue
+        print(f"{size:>8} {r['build_images_per_sec']:>12.1f} {r['load_seconds']:>7.2f} "
+              f"{r['single_search_p50_ms']:>11.1f} {r['single_search_p99_ms']:>8.1f} "
+              f"{r['batch_search_ms_per_query']:>11.1f} {r['index_search_p50_ms']:>10.2f} "
+              f"{r['peak_rss_mb'] or 0:>8.0f} {r['index_bytes'] / 2 ** 20:>9.1f}")
+    print(f"Results written to {args.out}")
+    return 1 if any("error" in r for r in results.values()) else 0
+
+def compare(args):
+    """
+    Compare two result files and flag metrics that got worse by more than
+    the threshold.
+
+    Args:
+        args: Parsed "compare" arguments
+
+    Returns:
+        Exit code, 1 if there are regressions
+    """
+    with open(args.baseline, "r", encoding="utf-8") as f:
+        baseline = json.load(f)
+    with open(args.candidate, "r", encoding="utf-8") as f:
+        candidate = json.load(f)
+
+    differing = sorted(name for name in set(baseline["config"]) | set(candidate["config"])
+                       if baseline["config"].get(name) != candidate["config"].get(name))
+    if differing:
+        print(f"Warning: the runs used different settings ({', '.join(differing)}), "
+              f"so differences may not be regressions")
+
+    regressions = []
+    print(f"{'images':>8} {'metric':<28} {'baseline':>12} {'candidate':>12} {'change':>8}")
+    sizes = sorted(set(baseline["results"]) & set(candidate["results"]), key=int)
+    for size in sizes:
+        old_results, new_results = baseline["results"][size], candidate["results"][size]
+        for metric, (higher_is_better, noise) in METRICS.items():
+            old, new = old_results.get(metric), new_results.get(metric)
+            if old is None or new is None:
+                continue
+            change = (new - old) / old if old else 0.0
+            worse = -change if higher_is_better else change
+            significant = abs(new - old) > noise
+            flag = ""
+            if significant and worse > args.threshold:
+                flag = "REGRESSION"
+                regressions.append((size, metric, change))
+            elif significant and worse < -args.threshold:
+                flag = "improved"
+            print(f"{size:>8} {metric:<28} {old:>12.2f} {new:>12.2f} {change:>+8.1%} {flag}")
+
+    if regressions:
+        print(f"{len(regressions)} regression(s) beyond {args.threshold:.0%}")
+        return 1
+    print(f"No regressions beyond {args.threshold:.0%}")
+    return 0
+
+def main():
+    """
+    Parse the command line and run the requested command.
+
+    Returns:
+        Exit code
+    """
+    parser = argparse.ArgumentParser(description="Benchmark indexing and search on synthetic datasets")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="Measure each dataset size and write JSON results")
+    run_parser.add_argument("--sizes", type=str, default=DEFAULT_SIZES,
+                            help="Comma-separated dataset sizes")
+    run_parser.add_argument("--image-size", type=int, default=256, help="Synthetic image width and height")
+    run_parser.add_argument("--work-dir", type=str,
+                            default=os.path.join(tempfile.gettempdir(), "inspiresearch_benchmarks"),
+                            help="Directory for datasets, reused across runs, and indexes")
+    run_parser.add_argument("--out", type=str, default="benchmark_results.json",
+                            help="Path to write the results to")
+    add_shared_options(run_parser)
+
+    measure_parser = commands.add_parser("measure", help="Measure one dataset (used by run)")
+    measure_parser.add_argument("--dataset", type=str, required=True, help="Dataset directory")
+    measure_parser.add_argument("--index", type=str, required=True, help="Index directory to build")
+    add_shared_options(measure_parser)
+
+    compare_parser = commands.add_parser("compare", help="Flag regressions between two result files")
+    compare_parser.add_argument("baseline", type=str, help="Results of the earlier run")
+    compare_parser.add_argument("candidate", type=str, help="Results of the run to check")
+    compare_parser.add_argument("--threshold", type=float, default=0.1,
+                                help="Relative change counted as a regression, e.g. 0.1 for 10%%")
+
+    args = parser.parse_args()
+    try:
+        if args.command == "run":
+            return run(args)
+        if args.command == "measure":
+            print(RESULT_PREFIX + json.dumps(measure(args)), flush=True)
+            return 0
+        return compare(args)
+    except Exception as e:
+        print(f"Error running benchmark suite: {e}")
+        return 2
+
+if __name__ == "__main__":
+    sys.exit(main())
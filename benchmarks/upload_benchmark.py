@@ -0,0 +1,154 @@
+"""
+InspireSearch - AI-Powered Visual Search Engine
+Benchmark of per-request latency and disk writes for uploaded queries
+
+Compares the old request path, which saved each upload to static/uploads
+and reopened it by path, with searching the upload's bytes from memory.
+Disk writes are counted as files and bytes added to the upload folder,
+plus the process's write counters from /proc/self/io where available.
+
+Usage:
+  python benchmarks/upload_benchmark.py --requests 100
+
+Copyright (c) 2025 Nicole LeGuern
+Licensed under MIT License with attribution requirements
+https://github.com/CodeQueenie/InspireSearch---AI_Powered_Visual_Search_Engine
+"""
+import os
+import io
+import sys
+import time
+import json
+import shutil
+import argparse
+import tempfile
+import numpy as np
+from werkzeug.datastructures import FileStorage
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+from app.image_search import ImageSearch
+from app.utils import save_uploaded_file
+
+def process_write_bytes():
+    """
+    Bytes this process has passed to write calls so far.
+
+    Returns:
+        Byte count, or None if /proc/self/io isn't available
+    """
+    try:
+        with open("/proc/self/io", "r", encoding="utf-8") as f:
+            for line in f:
+                if line.startswith("wchar:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+def folder_usage(path):
+    """
+    Number of files and total bytes in a directory.
+
+    Args:
+        path: Directory to measure
+
+    Returns:
+        Tuple of (files, bytes)
+    """
+    names = os.listdir(path)
+    return len(names), sum(os.path.getsize(os.path.join(path, name)) for name in names)
+
+def run_mode(mode, search_engine, uploads, upload_folder, top_k):
+    """
+    Serve every upload with one request path and measure it.
+
+    Args:
+        mode: "disk" to save uploads before searching, "memory" to search their bytes
+        search_engine: ImageSearch with a loaded index
+        uploads: List of (filename, bytes) tuples
+        upload_folder: Directory uploads are saved to in disk mode
+        top_k: Number of results per search
+
+    Returns:
+        Dict with latency percentiles and disk writes
+    """
+    start_files, start_bytes = folder_usage(upload_folder)
+    start_written = process_write_bytes()
+
+    latencies = []
+    for filename, data in uploads:
+        start = time.perf_counter()
+        if mode == "disk":
+            upload = FileStorage(stream=io.BytesIO(data), filename=filename)
+            search_engine.search(save_uploaded_file(upload, upload_folder), top_k=top_k)
+        else:
+            search_engine.search(data, top_k=top_k)
+        latencies.append(time.perf_counter() - start)
+
+    end_files, end_bytes = folder_usage(upload_folder)
+    end_written = process_write_bytes()
+    latencies = np.array(latencies)
+    return {
+        "mode": mode,
+        "mean_ms": float(latencies.mean() * 1000),
+        "p50_ms": float(np.percentile(latencies, 50) * 1000),
+        "p99_ms": float(np.percentile(latencies, 99) * 1000),
+        "files_written": end_files - start_files,
+        "bytes_written": end_bytes - start_bytes,
+        "process_write_bytes": (end_written - start_written
+                                if start_written is not None else None),
+    }
+
+def main():
+    """
+    Run both request paths over the same uploads and print a comparison.
+    """
+    upload_folder = tempfile.mkdtemp(prefix="inspiresearch_uploads_")
+    try:
+        parser = argparse.ArgumentParser(description="Compare on-disk and in-memory query uploads")
+        parser.add_argument("--dataset", type=str, default=os.path.join(ROOT, "static", "dataset"),
+                            help="Path to the dataset directory")
+        parser.add_argument("--index", type=str, default=os.path.join(ROOT, "static", "index"),
+                            help="Path to the index (built if missing)")
+        parser.add_argument("--requests", type=int, default=100, help="Number of searches per mode")
+        parser.add_argument("--top-k", type=int, default=5, help="Results per search")
+        parser.add_argument("--json", type=str, default=None,
+                            help="Optional path to write the results to")
+        args = parser.parse_args()
+
+        search_engine = ImageSearch(index_path=args.index, dataset_path=args.dataset)
+        if search_engine.index is None and not search_engine.build_index():
+            print("Could not build the index")
+            return
+        search_engine.warm_up()
+
+        # Read the query images up front so both modes start from bytes in memory
+        image_files = search_engine._list_image_files()
+        uploads = []
+        for i in range(args.requests):
+            path = image_files[i % len(image_files)]
+            with open(path, "rb") as f:
+                uploads.append((os.path.basename(path), f.read()))
+
+        results = [run_mode(mode, search_engine, uploads, upload_folder, args.top_k)
+                   for mode in ("disk", "memory")]
+
+        print(f"{'mode':<8} {'mean ms':>8} {'p50 ms':>8} {'p99 ms':>8} {'files':>6} "
+              f"{'MB written':>11} {'process MB':>11}")
+        for r in results:
+            process_mb = (f"{r['process_write_bytes'] / 2 ** 20:>11.2f}"
+                          if r["process_write_bytes"] is not None else f"{'n/a':>11}")
+            print(f"{r['mode']:<8} {r['mean_ms']:>8.1f} {r['p50_ms']:>8.1f} {r['p99_ms']:>8.1f} "
+                  f"{r['files_written']:>6} {r['bytes_written'] / 2 ** 20:>11.2f} {process_mb}")
+
+        if args.json:
+            with open(args.json, "w", encoding="utf-8") as f:
+                json.dump(results, f, indent=2)
+    except Exception as e:
+        print(f"Error running upload benchmark: {e}")
+    finally:
+        shutil.rmtree(upload_folder, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
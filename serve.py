@@ -0,0 +1,73 @@
+"""
+InspireSearch - AI-Powered Visual Search Engine
+Production server
+
+Serves the Flask app with a pool of request threads in front of the
+inference pool configured in app.py: request threads decode uploads and
+render pages, while model calls go through the bounded inference queue and
+are turned away with 503 and Retry-After once it is full. Uses waitress if
+it is installed, otherwise Werkzeug's threaded server.
+
+Usage:
+  python serve.py --host 0.0.0.0 --port 8000 --threads 16
+
+Copyright (c) 2025 Nicole LeGuern
+Licensed under MIT License with attribution requirements
+https://github.com/CodeQueenie/InspireSearch---AI_Powered_Visual_Search_Engine
+"""
+import os
+import argparse
+import importlib.util
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+def load_app():
+    """
+    Import app.py, which shares its name with the app package.
+
+    Returns:
+        The app.py module
+    """
+    spec = importlib.util.spec_from_file_location("inspiresearch_app", os.path.join(ROOT, "app.py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+def main():
+    """
+    Prepare the index and model, then serve until interrupted.
+    """
+    try:
+        parser = argparse.ArgumentParser(description="Serve InspireSearch in production")
+        parser.add_argument("--host", type=str, default="127.0.0.1", help="Address to listen on")
+        parser.add_argument("--port", type=int, default=8000, help="Port to listen on")
+        parser.add_argument("--threads", type=int, default=16,
+                            help="Request threads (waitress only); model calls are limited by INFERENCE_WORKERS instead")
+        args = parser.parse_args()
+
+        # Paths in app.py are relative to the project root
+        os.chdir(ROOT)
+        module = load_app()
+        app = module.app
+
+        if not module.ensure_index():
+            print("No index yet, building it in the background; searches get a 503 until it is ready")
+        if app.config["WARM_UP_ON_START"]:
+            module.search_engine.warm_up()
+
+        print(f"Serving on http://{args.host}:{args.port} with {args.threads} request threads, "
+              f"{app.config['INFERENCE_WORKERS']} inference threads and room for "
+              f"{app.config['INFERENCE_QUEUE_SIZE']} queued queries")
+        try:
+            from waitress import serve
+        except ImportError:
+            print("waitress not installed, using Werkzeug's threaded server. "
+                  "Install waitress for production use.")
+            app.run(host=args.host, port=args.port, threaded=True, debug=False, use_reloader=False)
+            return
+        serve(app, host=args.host, port=args.port, threads=args.threads)
+    except Exception as e:
+        print(f"Error starting server: {e}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""
+InspireSearch - AI-Powered Visual Search Engine
+Shared test fixtures: a small generated dataset and engines using the
+benchmark suite's stub model, so no test loads TensorFlow
+
+Copyright (c) 2025 Nicole LeGuern
+Licensed under MIT License with attribution requirements
+https://github.com/CodeQueenie/InspireSearch---AI_Powered_Visual_Search_Engine
+"""
+import os
+import sys
+import numpy as np
+import pytest
+from PIL import Image
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+from benchmarks.suite import make_model
+from app.image_search import ImageSearch
+
+def write_image(path, seed, size=(96, 64)):
+    """
+    Write a JPEG of smooth random colours.
+
+    Args:
+        path: File to write
+        seed: Random seed, so the same seed gives the same image
+        size: (width, height) of the image
+    """
+    rng = np.random.default_rng(seed)
+    corners = rng.uniform(0, 255, (2, 2, 3))
+    ys = np.linspace(0, 1, size[1])[:, None, None]
+    xs = np.linspace(0, 1, size[0])[None, :, None]
+    pixels = (corners[0, 0] * (1 - ys) * (1 - xs) + corners[0, 1] * (1 - ys) * xs +
+              corners[1, 0] * ys * (1 - xs) + corners[1, 1] * ys * xs)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    Image.fromarray(pixels.astype(np.uint8)).save(path, quality=90)
+
+@pytest.fixture
+def dataset(tmp_path):
+    """
+    Directory of 12 images in two category folders.
+    """
+    root = tmp_path / "dataset"
+    for i in range(12):
+        write_image(str(root / ("cats" if i % 2 else "dogs") / f"img_{i:02d}.jpg"), seed=i)
+    return str(root)
+
+@pytest.fixture(scope="session")
+def stub_model():
+    """
+    Random projection standing in for the ResNet50 backend.
+    """
+    return make_model("stub", "resnet50", None, seed=0)
+
+@pytest.fixture
+def make_engine(stub_model):
+    """
+    Factory for ImageSearch engines that embed with the stub model.
+    """
+    def make(index_path, dataset_path, **kwargs):
+        kwargs.setdefault("decode_in_processes", False)
+        engine = ImageSearch(index_path=str(index_path), dataset_path=dataset_path, **kwargs)
+        engine._model = stub_model
+        return engine
+    return make
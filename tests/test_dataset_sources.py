@@ -0,0 +1,102 @@
+"""
+InspireSearch - AI-Powered Visual Search Engine
+Tests for reading images from tar and zip archives
+
+Copyright (c) 2025 Nicole LeGuern
+Licensed under MIT License with attribution requirements
+https://github.com/CodeQueenie/InspireSearch---AI_Powered_Visual_Search_Engine
+"""
+import io
+import os
+import glob
+import tarfile
+import zipfile
+import pytest
+from app.dataset_sources import ArchiveSource, open_dataset, split_locator, LOCATOR_SEPARATOR
+
+@pytest.fixture
+def images(dataset):
+    """
+    Map from member name to bytes of the dataset's images.
+    """
+    members = {}
+    for path in sorted(glob.glob(os.path.join(dataset, "*", "*.jpg"))):
+        with open(path, "rb") as f:
+            members[os.path.relpath(path, dataset).replace(os.sep, "/")] = f.read()
+    return members
+
+def _write_tar(path, images):
+    with tarfile.open(path, "w") as tar:
+        for name, data in images.items():
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            info.mtime = 1700000000
+            tar.addfile(info, fileobj=io.BytesIO(data))
+        tar.addfile(tarfile.TarInfo("notes.txt"))
+
+def _write_zip(path, images):
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as zf:
+        for name, data in images.items():
+            zf.writestr(name, data)
+        zf.writestr("notes.txt", b"")
+
+@pytest.mark.parametrize("extension, write", [(".tar", _write_tar), (".zip", _write_zip)])
+def test_archive_list_and_read(tmp_path, images, extension, write):
+    archive = str(tmp_path / f"shard{extension}")
+    write(archive, images)
+    source = open_dataset(archive)
+    assert isinstance(source, ArchiveSource)
+
+    locators = source.list()
+    assert locators == sorted(f"{archive}{LOCATOR_SEPARATOR}{name}" for name in images)
+
+    for locator in locators:
+        expected = images[split_locator(locator)[1]]
+        assert source.read(locator, *source.locate(locator)) == expected
+        # Without a stored offset it is looked up in the member headers
+        assert source.read(locator) == expected
+        assert source.stat(locator)[0] == len(expected)
+
+    streamed = dict(source.iter_data(reversed(locators)))
+    assert {split_locator(l)[1]: data for l, data in streamed.items()} == images
+
+def test_archive_attributes_use_member_folders(tmp_path, images):
+    archive = str(tmp_path / "shard.tar")
+    _write_tar(archive, images)
+    source = open_dataset(archive)
+
+    attributes = source.attributes(source.list()[0], 1700000000.0)
+
+    assert attributes["category"] in ("cats", "dogs")
+    assert attributes["folder"] == attributes["category"]
+
+def test_glob_of_archives(tmp_path, images):
+    names = sorted(images)
+    _write_tar(str(tmp_path / "a.tar"), {name: images[name] for name in names[:5]})
+    _write_zip(str(tmp_path / "b.zip"), {name: images[name] for name in names[5:]})
+
+    source = open_dataset(str(tmp_path / "*"))
+
+    assert len(source.list()) == len(images)
+
+def test_compressed_tars_are_rejected(tmp_path, images):
+    archive = str(tmp_path / "shard.tar.gz")
+    with tarfile.open(archive, "w:gz"):
+        pass
+
+    with pytest.raises(ValueError):
+        open_dataset(archive)
+    assert ArchiveSource(str(tmp_path / "*")).archives == []
+
+def test_index_built_from_an_archive_serves_its_images(tmp_path, images, make_engine):
+    archive = str(tmp_path / "shard.tar")
+    _write_tar(archive, images)
+    engine = make_engine(tmp_path / "index", archive)
+    assert engine.build_index()
+
+    reloaded = make_engine(tmp_path / "index", archive)
+    assert reloaded.load_index()
+    assert reloaded.index.ntotal == len(images)
+    for image_id in range(len(images)):
+        path, data = reloaded.read_image(image_id)
+        assert data == images[split_locator(path)[1]]
@@ -0,0 +1,97 @@
+"""
+InspireSearch - AI-Powered Visual Search Engine
+Tests for streaming dataset changes into the live index
+
+Copyright (c) 2025 Nicole LeGuern
+Licensed under MIT License with attribution requirements
+https://github.com/CodeQueenie/InspireSearch---AI_Powered_Visual_Search_Engine
+"""
+import os
+import time
+import pytest
+from app.index_versions import build_new_version, current_version
+from app.dataset_watcher import DatasetWatcher
+from conftest import write_image
+
+@pytest.fixture
+def live(tmp_path, dataset, make_engine):
+    """
+    Engine serving a freshly built, versioned index.
+    """
+    root = tmp_path / "index"
+    root.mkdir()
+    build_new_version(make_engine(root, dataset), incremental=False)
+    engine = make_engine(root, dataset)
+    assert engine.load_index()
+    return engine
+
+def test_sync_adds_and_removes_images(live, dataset):
+    added = os.path.join(dataset, "cats", "new.jpg")
+    removed = os.path.join(dataset, "dogs", "img_00.jpg")
+    write_image(added, seed=99)
+    os.remove(removed)
+
+    assert live.sync_dataset() == (1, 1)
+
+    paths = [r["path"] for r in live.search(added, top_k=12)]
+    assert paths[0] == added
+    assert removed not in paths
+    assert live.sync_dataset() == (0, 0)
+
+def test_persist_publishes_a_new_version(live, dataset, make_engine):
+    old_version = live.version
+    write_image(os.path.join(dataset, "cats", "new.jpg"), seed=99)
+    live.sync_dataset()
+
+    assert live.persist(keep_versions=5)
+
+    assert current_version(live.index_root) == live.version != old_version
+    reloaded = make_engine(live.index_root, dataset)
+    assert reloaded.index.ntotal == 13
+
+def test_hnsw_removals_are_skipped_by_searches(tmp_path, dataset, make_engine):
+    engine = make_engine(tmp_path / "index", dataset, index_type="hnsw")
+    assert engine.build_index()
+    removed = os.path.join(dataset, "dogs", "img_00.jpg")
+    os.remove(removed)
+
+    assert engine.sync_dataset() == (0, 1)
+
+    # The vector stays in the graph, but its path is gone
+    assert engine.index.ntotal == 12
+    assert removed not in [r["path"] for r in engine.search(os.path.join(dataset, "dogs", "img_02.jpg"),
+                                                            top_k=12)]
+
+def test_hnsw_removals_do_not_shorten_results(tmp_path, dataset, make_engine):
+    engine = make_engine(tmp_path / "index", dataset, index_type="hnsw")
+    assert engine.build_index()
+    removed = [os.path.join(dataset, "dogs", f"img_{i:02d}.jpg") for i in (0, 2, 4)]
+    query = engine.extract_features(removed[0])
+    for path in removed:
+        os.remove(path)
+
+    assert engine.sync_dataset() == (0, 3)
+
+    # Every remaining image, although the removed ones are the closest vectors
+    results = engine.search_by_features(query, top_k=9)
+    assert len(results) == 9 and not set(removed) & {r["path"] for r in results}
+    assert engine.save_index()
+    reloaded = make_engine(tmp_path / "index", dataset)
+    assert len(reloaded.search_by_features(query, top_k=9)) == 9
+
+def test_polling_watcher_picks_up_new_images(live, dataset):
+    watcher = DatasetWatcher(live, interval=0.05, persist_seconds=0, use_events=False)
+    watcher.start()
+    try:
+        write_image(os.path.join(dataset, "dogs", "new.jpg"), seed=42)
+        deadline = time.monotonic() + 10
+        while watcher.persisted == 0 and time.monotonic() < deadline:
+            time.sleep(0.05)
+    finally:
+        watcher.stop()
+
+    status = watcher.status()
+    assert status["mode"] == "poll"
+    assert status["embedded"] == 1 and status["last_error"] is None
+    assert watcher.persisted >= 1
+    assert live.index.ntotal == 13
@@ -0,0 +1,48 @@
+"""
+InspireSearch - AI-Powered Visual Search Engine
+Tests for finding duplicate clusters and collapsing them in results
+
+Copyright (c) 2025 Nicole LeGuern
+Licensed under MIT License with attribution requirements
+https://github.com/CodeQueenie/InspireSearch---AI_Powered_Visual_Search_Engine
+"""
+import os
+import shutil
+from PIL import Image
+from app.dedupe import find_duplicates, save_report, collapse_duplicates
+
+def _result(image_id, distance, score=None):
+    return {"id": image_id, "path": f"img_{image_id}.jpg", "distance": distance, "score": score}
+
+def test_collapse_duplicates_keeps_best_of_each_cluster():
+    results = [_result(i, i / 10) for i in range(5)]
+    groups = {"img_1.jpg": "img_3.jpg", "img_3.jpg": "img_3.jpg", "img_4.jpg": "img_0.jpg"}
+
+    distinct = collapse_duplicates(results, groups, top_k=5)
+
+    assert [r["id"] for r in distinct] == [0, 1, 2]
+
+def test_collapse_duplicates_stops_at_top_k():
+    results = [_result(i, i / 10) for i in range(5)]
+
+    assert [r["id"] for r in collapse_duplicates(results, {}, top_k=2)] == [0, 1]
+
+def test_copies_and_re_encodes_form_one_cluster(tmp_path, dataset, make_engine):
+    original = os.path.join(dataset, "dogs", "img_00.jpg")
+    copy = os.path.join(dataset, "dogs", "copy.jpg")
+    re_encoded = os.path.join(dataset, "cats", "re_encoded.jpg")
+    shutil.copyfile(original, copy)
+    Image.open(original).save(re_encoded, quality=60)
+    engine = make_engine(tmp_path / "index", dataset)
+    assert engine.build_index()
+
+    report = find_duplicates(engine, threshold=0.98)
+
+    assert report["duplicate_images"] == 2
+    assert {m["path"] for m in report["clusters"][0]["members"]} == {original, copy, re_encoded}
+    assert [sorted(group) for group in report["exact_duplicates"]] == [sorted([original, copy])]
+
+    save_report(report, engine.duplicates_file)
+    results = engine.search(original, top_k=3, distinct=True)
+    assert len(results) == 3
+    assert sum(r["path"] in (original, copy, re_encoded) for r in results) == 1
@@ -0,0 +1,59 @@
+"""
+InspireSearch - AI-Powered Visual Search Engine
+Tests for embedding backend selection and PCA/OPQ projection
+
+Copyright (c) 2025 Nicole LeGuern
+Licensed under MIT License with attribution requirements
+https://github.com/CodeQueenie/InspireSearch---AI_Powered_Visual_Search_Engine
+"""
+import numpy as np
+import pytest
+from benchmarks.suite import make_model
+from app.embedding_backends import resolve_embedding_config, describe_embedding
+from app.embedding_cache import EmbeddingCache
+from app.index_factory import resolve_index_config, create_index, benchmark_index_configs, describe_config
+
+def test_embedding_configs():
+    assert resolve_embedding_config() == {"backend": "resnet50", "quantize": None}
+    assert describe_embedding(resolve_embedding_config("mobilenet_v2", "int8")) == "mobilenet_v2+int8"
+    with pytest.raises(ValueError):
+        resolve_embedding_config("vgg16")
+    with pytest.raises(ValueError):
+        resolve_embedding_config("resnet50", "int4")
+
+def test_cache_keys_differ_between_backends():
+    data = b"same upload"
+
+    assert EmbeddingCache.key_for(data, "resnet50") != EmbeddingCache.key_for(data, "mobilenet_v2+int8")
+
+def test_pca_shrinks_stored_vectors_and_keeps_recall():
+    rng = np.random.default_rng(0)
+    latent = rng.standard_normal((1000, 16))
+    features = (latent @ rng.standard_normal((16, 128)) + 0.1 * rng.standard_normal((1000, 128))).astype("float32")
+    config = resolve_index_config("flat", {"projection": "pca", "projection_dim": 32})
+
+    index = create_index(config, 128)
+    assert index.d == 128
+    assert not index.is_trained
+
+    results = {r["label"]: r["recall"] for r in benchmark_index_configs(features, [config], k=10)}
+    assert results[describe_config(config)] >= 0.9
+
+def test_invalid_projections_are_rejected():
+    config = resolve_index_config("flat", {"projection": "pca", "projection_dim": 256})
+
+    with pytest.raises(ValueError):
+        create_index(config, 128)
+    # OPQ sub-quantizers must also divide the projected dimension
+    with pytest.raises(ValueError):
+        create_index(resolve_index_config("flat", {"projection": "opq", "projection_dim": 48}), 128)
+
+def test_saved_index_keeps_its_backend(tmp_path, dataset, make_engine):
+    engine = make_engine(tmp_path / "index", dataset, embedding_backend="mobilenet_v2")
+    engine._model = make_model("stub", "mobilenet_v2", None, seed=0)
+    assert engine.build_index()
+    assert engine.index.d == 1280
+
+    reloaded = make_engine(tmp_path / "index", dataset)
+    assert reloaded.load_index()
+    assert reloaded.embedding_id == "mobilenet_v2"
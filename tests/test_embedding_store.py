@@ -0,0 +1,116 @@
+"""
+InspireSearch - AI-Powered Visual Search Engine
+Tests for the saved embedding matrix and reindexing from it
+
+Copyright (c) 2025 Nicole LeGuern
+Licensed under MIT License with attribution requirements
+https://github.com/CodeQueenie/InspireSearch---AI_Powered_Visual_Search_Engine
+"""
+import os
+import json
+import numpy as np
+import pytest
+from app.embedding_store import EmbeddingStore, EMBEDDINGS_FILE
+from app.index_versions import build_new_version, link_index_files
+from app.dedupe import DUPLICATES_FILE
+from conftest import write_image
+
+@pytest.mark.parametrize("dtype", ["float32", "float16"])
+def test_embedding_store_appends_in_place(tmp_path, dtype):
+    rng = np.random.default_rng(0)
+    first, second = rng.standard_normal((5, 8)), rng.standard_normal((3, 8))
+
+    store = EmbeddingStore(dtype)
+    store.append(first)
+    store.save(str(tmp_path))
+    inode = os.stat(tmp_path / EMBEDDINGS_FILE).st_ino
+
+    reopened = EmbeddingStore.open(str(tmp_path))
+    reopened.append(second)
+    reopened.save(str(tmp_path))
+
+    assert os.stat(tmp_path / EMBEDDINGS_FILE).st_ino == inode
+    matrix = EmbeddingStore.open(str(tmp_path)).matrix()
+    assert matrix.dtype == np.dtype(dtype)
+    np.testing.assert_allclose(matrix, np.vstack([first, second]).astype(dtype))
+
+def test_embedding_store_ignores_rows_past_the_index(tmp_path):
+    store = EmbeddingStore()
+    store.append(np.ones((4, 3), dtype="float32"))
+    store.save(str(tmp_path))
+
+    assert EmbeddingStore.open(str(tmp_path), rows=2).matrix().shape == (2, 3)
+    assert EmbeddingStore.open(str(tmp_path), rows=5) is None
+
+def test_embedding_store_links_into_new_versions(tmp_path):
+    old, new, other = tmp_path / "old", tmp_path / "new", tmp_path / "other"
+    for directory in (old, new, other):
+        directory.mkdir()
+    store = EmbeddingStore()
+    store.append(np.zeros((2, 3), dtype="float32"))
+    store.save(str(old))
+
+    # Two versions grow from the same saved rows
+    first = EmbeddingStore.open(str(old))
+    second = EmbeddingStore.open(str(old))
+    first.append(np.ones((1, 3), dtype="float32"))
+    first.save(str(new))
+    second.append(np.full((2, 3), 2.0, dtype="float32"))
+    second.save(str(other))
+
+    assert os.path.samefile(old / EMBEDDINGS_FILE, new / EMBEDDINGS_FILE)
+    assert not os.path.samefile(old / EMBEDDINGS_FILE, other / EMBEDDINGS_FILE)
+    np.testing.assert_array_equal(EmbeddingStore.open(str(new)).matrix()[:, 0], [0, 0, 1])
+    np.testing.assert_array_equal(EmbeddingStore.open(str(other)).matrix()[:, 0], [0, 0, 2, 2])
+    assert EmbeddingStore.open(str(old), rows=2).matrix().shape == (2, 3)
+
+def test_link_index_files_shares_files(tmp_path):
+    source, target = tmp_path / "source", tmp_path / "target"
+    source.mkdir()
+    target.mkdir()
+    (source / "faiss_index.bin").write_bytes(b"index")
+    (source / "faiss_index.bin.tmp").write_bytes(b"partial")
+
+    link_index_files(str(source), str(target))
+
+    assert os.listdir(target) == ["faiss_index.bin"]
+    assert os.path.samefile(source / "faiss_index.bin", target / "faiss_index.bin")
+
+def test_persist_links_embeddings_and_keeps_the_duplicate_report(tmp_path, dataset, make_engine):
+    root = tmp_path / "index"
+    root.mkdir()
+    _, engine = build_new_version(make_engine(root, dataset), incremental=False)
+    query = os.path.join(dataset, "dogs", "img_00.jpg")
+    report = {"clusters": [{"representative": query, "members": [{"path": query}]}]}
+    with open(os.path.join(engine.index_path, DUPLICATES_FILE), "w", encoding="utf-8") as f:
+        json.dump(report, f)
+
+    live = make_engine(root, dataset)
+    live.load_index()
+    write_image(os.path.join(dataset, "cats", "new.jpg"), seed=99)
+    live.sync_dataset()
+    assert live.persist(keep_versions=5)
+
+    assert os.path.exists(os.path.join(live.index_path, DUPLICATES_FILE))
+    assert os.path.samefile(os.path.join(engine.index_path, EMBEDDINGS_FILE),
+                            os.path.join(live.index_path, EMBEDDINGS_FILE))
+    ids, features = make_engine(root, dataset).saved_embeddings()
+    assert features.shape == (13, 2048)
+    # The previous version still sees only its own rows
+    assert EmbeddingStore.open(engine.index_path, rows=12).matrix().shape == (12, 2048)
+
+def test_reindex_switches_index_type_without_the_model(tmp_path, dataset, make_engine):
+    engine = make_engine(tmp_path / "index", dataset)
+    assert engine.build_index()
+    query = os.path.join(dataset, "cats", "img_03.jpg")
+    expected = [r["path"] for r in engine.search(query, top_k=5)]
+
+    reindexer = make_engine(tmp_path / "index", dataset, index_type="hnsw")
+    reindexer._model = None
+    assert reindexer.reindex()
+    assert reindexer._model is None
+
+    reloaded = make_engine(tmp_path / "index", dataset)
+    assert reloaded.load_index()
+    assert reloaded.active_index_config["type"] == "hnsw"
+    assert [r["path"] for r in reloaded.search(query, top_k=5)] == expected
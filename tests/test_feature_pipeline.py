@@ -0,0 +1,52 @@
+"""
+InspireSearch - AI-Powered Visual Search Engine
+Tests for batched, pipelined feature extraction
+
+Copyright (c) 2025 Nicole LeGuern
+Licensed under MIT License with attribution requirements
+https://github.com/CodeQueenie/InspireSearch---AI_Powered_Visual_Search_Engine
+"""
+import os
+import glob
+import numpy as np
+from app.feature_pipeline import BatchFeatureExtractor
+
+class _CountingModel:
+    """
+    Stub model recording the size of every model call.
+    """
+
+    def __init__(self, model):
+        self.model = model
+        self.calls = []
+
+    def predict(self, x, batch_size=None):
+        self.calls.append(len(x))
+        return self.model.predict(x, batch_size)
+
+def test_batches_match_one_image_at_a_time(dataset, stub_model):
+    paths = sorted(glob.glob(os.path.join(dataset, "*", "*.jpg")))
+    model = _CountingModel(stub_model)
+    extractor = BatchFeatureExtractor(model, stub_model.preprocess, batch_size=5, num_workers=2)
+
+    valid_paths, features = extractor.extract(paths)
+
+    assert valid_paths == paths
+    assert model.calls == [5, 5, 2]
+    single = BatchFeatureExtractor(stub_model, stub_model.preprocess, batch_size=1, num_workers=1)
+    for path, row in zip(paths, features):
+        np.testing.assert_allclose(single.extract([path])[1][0], row, rtol=1e-5, atol=1e-4)
+
+def test_unreadable_images_are_skipped_without_failing_their_batch(dataset, stub_model):
+    paths = sorted(glob.glob(os.path.join(dataset, "*", "*.jpg")))
+    bad = os.path.join(dataset, "bad.jpg")
+    with open(bad, "wb") as f:
+        f.write(b"not an image")
+    extractor = BatchFeatureExtractor(stub_model, stub_model.preprocess, batch_size=4, num_workers=2)
+
+    valid_paths, features = extractor.extract(paths[:3] + [bad] + paths[3:])
+
+    assert valid_paths == paths
+    assert features.shape == (len(paths), stub_model.dimension)
+    assert list(extractor.failed) == [bad]
+    assert sorted(extractor.digests) == paths
@@ -0,0 +1,79 @@
+"""
+InspireSearch - AI-Powered Visual Search Engine
+Tests for searches filtered by category, folder and date
+
+Copyright (c) 2025 Nicole LeGuern
+Licensed under MIT License with attribution requirements
+https://github.com/CodeQueenie/InspireSearch---AI_Powered_Visual_Search_Engine
+"""
+import os
+import json
+import pytest
+from werkzeug.datastructures import MultiDict
+from app import index_factory
+from app.facets import SearchFilter, parse_date
+
+INDEX_TYPES = [
+    ("flat", {}),
+    ("ivf_flat", {"nlist": 2, "nprobe": 1}),
+    ("hnsw", {}),
+]
+
+def test_filter_from_request_parameters():
+    params = MultiDict([("category", "cats, dogs"), ("category", "birds"), ("date_to", "2024-05-31")])
+
+    search_filter = SearchFilter.from_params(params)
+
+    assert search_filter.categories == ["birds", "cats", "dogs"]
+    assert search_filter.date_before == parse_date("2024-06-01")
+    assert SearchFilter.from_params(MultiDict()) is None
+
+@pytest.mark.parametrize("index_type, params", INDEX_TYPES)
+def test_filtered_search_ranks_matches_like_an_exact_search(tmp_path, dataset, make_engine,
+                                                            index_type, params):
+    engine = make_engine(tmp_path / "index", dataset, index_type=index_type, index_params=params)
+    assert engine.build_index()
+    query = engine.extract_features(os.path.join(dataset, "dogs", "img_00.jpg"))
+    exact = make_engine(tmp_path / "exact", dataset)
+    assert exact.build_index()
+    expected = [r["path"] for r in exact.search_by_features(query, top_k=12) if "/cats/" in r["path"]]
+
+    results = engine.search_by_features(query, top_k=3, search_filter=SearchFilter(categories=["cats"]))
+
+    assert [r["path"] for r in results] == expected[:3]
+
+@pytest.mark.parametrize("index_type, params", [
+    ("flat", {}),
+    # Only filtering inside the index widens nprobe for the filter
+    ("ivf_flat", {"nlist": 2, "nprobe": 2}),
+    ("hnsw", {}),
+])
+def test_filtering_results_matches_filtering_inside_the_index(tmp_path, dataset, make_engine, monkeypatch,
+                                                              index_type, params):
+    engine = make_engine(tmp_path / "index", dataset, index_type=index_type, index_params=params)
+    assert engine.build_index()
+    query = engine.extract_features(os.path.join(dataset, "dogs", "img_00.jpg"))
+    search_filter = SearchFilter(categories=["cats"])
+    inside = engine.search_by_features(query, top_k=3, search_filter=search_filter)
+
+    # Faiss releases without SearchParameters filter a wider search's results
+    monkeypatch.setattr(index_factory, "_UNSUPPORTED_SEARCH_PARAMS", {index_type})
+    after = engine.search_by_features(query, top_k=3, search_filter=search_filter)
+
+    assert [r["path"] for r in after] == [r["path"] for r in inside]
+
+def test_sidecar_dates_filter_and_count(tmp_path, dataset, make_engine):
+    dated = os.path.join(dataset, "dogs", "img_02.jpg")
+    with open(dated + ".json", "w", encoding="utf-8") as f:
+        json.dump({"category": "posters", "date": "2020-01-15"}, f)
+    engine = make_engine(tmp_path / "index", dataset)
+    assert engine.build_index()
+
+    old = SearchFilter(date_before=parse_date("2021-01-01"))
+    results = engine.search(dated, top_k=5, search_filter=old)
+    assert [r["path"] for r in results] == [dated]
+
+    counts = engine.facet_counts()
+    assert counts["category"] == {"cats": 6, "dogs": 5, "posters": 1}
+    assert counts["folder"] == {"cats": 6, "dogs": 6}
+    assert engine.facet_counts(SearchFilter(folder="dogs"))["images"] == 6
@@ -0,0 +1,56 @@
+"""
+InspireSearch - AI-Powered Visual Search Engine
+Tests for the selectable Faiss index types
+
+Copyright (c) 2025 Nicole LeGuern
+Licensed under MIT License with attribution requirements
+https://github.com/CodeQueenie/InspireSearch---AI_Powered_Visual_Search_Engine
+"""
+import os
+import numpy as np
+import pytest
+from app.index_factory import resolve_index_config, benchmark_index_configs, describe_config
+
+def _clustered(count, dimension=64, clusters=20, seed=0):
+    rng = np.random.default_rng(seed)
+    centres = rng.standard_normal((clusters, dimension)) * 3
+    points = centres[rng.integers(0, clusters, count)] + rng.standard_normal((count, dimension))
+    return points.astype("float32")
+
+def test_approximate_indexes_recall_exact_neighbours():
+    configs = [
+        resolve_index_config("ivf_flat", {"nlist": 16, "nprobe": 4}),
+        resolve_index_config("ivf_pq", {"nlist": 16, "nprobe": 16, "m": 16}),
+        resolve_index_config("hnsw"),
+        resolve_index_config("hnsw", {"metric": "l2"}),
+    ]
+
+    results = {r["label"]: r["recall"] for r in benchmark_index_configs(_clustered(3000), configs, k=10)}
+
+    assert results["flat()"] == 1.0
+    assert results[describe_config(configs[0])] >= 0.9
+    # Product quantization trades recall for 16-byte codes
+    assert results[describe_config(configs[1])] >= 0.3
+    assert results[describe_config(configs[2])] >= 0.9
+    assert results[describe_config(configs[3])] >= 0.9
+
+def test_unknown_index_type_is_rejected():
+    with pytest.raises(ValueError):
+        resolve_index_config("lsh")
+
+@pytest.mark.parametrize("index_type, params", [
+    ("flat", {}),
+    ("ivf_flat", {"nlist": 2, "nprobe": 2}),
+    ("hnsw", {}),
+])
+def test_engine_builds_and_searches_each_type(tmp_path, dataset, make_engine, index_type, params):
+    engine = make_engine(tmp_path / "index", dataset, index_type=index_type, index_params=params)
+    assert engine.build_index()
+
+    reloaded = make_engine(tmp_path / "index", dataset)
+    assert reloaded.load_index()
+    assert reloaded.active_index_config["type"] == index_type
+    query = os.path.join(dataset, "cats", "img_05.jpg")
+    results = reloaded.search(query, top_k=3)
+    assert len(results) == 3
+    assert results[0]["path"] == query
@@ -0,0 +1,69 @@
+"""
+InspireSearch - AI-Powered Visual Search Engine
+Tests for versioned index directories and background rebuilds
+
+Copyright (c) 2025 Nicole LeGuern
+Licensed under MIT License with attribution requirements
+https://github.com/CodeQueenie/InspireSearch---AI_Powered_Visual_Search_Engine
+"""
+import os
+from app.index_versions import (create_version, publish_version, prune_versions, current_version,
+                                list_versions, version_dir, build_new_version, BackgroundIndexBuilder)
+
+def test_create_publish_and_prune(tmp_path):
+    root = str(tmp_path)
+    assert current_version(root) is None
+
+    versions = [create_version(root)[0] for _ in range(4)]
+    assert versions == ["v000001", "v000002", "v000003", "v000004"]
+
+    publish_version(root, "v000002")
+    assert current_version(root) == "v000002"
+
+    prune_versions(root, keep=1)
+    assert list_versions(root) == ["v000002", "v000004"]
+
+def test_build_new_version_publishes_a_searchable_index(tmp_path, dataset, make_engine):
+    root = tmp_path / "index"
+    root.mkdir()
+
+    version, engine = build_new_version(make_engine(root, dataset), incremental=False)
+
+    assert current_version(str(root)) == version
+    assert engine.index_path == version_dir(str(root), version)
+    assert engine.index.ntotal == 12
+    # The top hit for an indexed image is itself
+    query = os.path.join(dataset, "dogs", "img_00.jpg")
+    assert engine.search(query, top_k=1)[0]["path"] == query
+
+def test_background_build_swaps_into_the_serving_engine(tmp_path, dataset, make_engine):
+    root = tmp_path / "index"
+    root.mkdir()
+    engine = make_engine(root, dataset)
+    assert engine.index is None
+    builder = BackgroundIndexBuilder(engine)
+
+    assert builder.start(incremental=False)
+    builder._thread.join(timeout=30)
+
+    assert builder.state == "idle"
+    assert engine.version == current_version(str(root))
+    assert engine.index.ntotal == 12
+    assert builder.status()["active_images"] == 12
+
+def test_failed_build_is_not_restarted_by_every_request(tmp_path, make_engine):
+    root = tmp_path / "index"
+    root.mkdir()
+    empty = tmp_path / "empty"
+    empty.mkdir()
+    builder = BackgroundIndexBuilder(make_engine(root, str(empty)), retry_seconds=60)
+
+    assert builder.start_if_needed()
+    builder._thread.join(timeout=30)
+    assert builder.state == "failed"
+    assert builder.status()["last_error"] and builder.status()["retry_at"]
+
+    assert not builder.start_if_needed()
+    builder.retry_seconds = 0
+    assert builder.start_if_needed()
+    builder._thread.join(timeout=30)
@@ -0,0 +1,83 @@
+"""
+InspireSearch - AI-Powered Visual Search Engine
+Tests for the incremental indexing manifest
+
+Copyright (c) 2025 Nicole LeGuern
+Licensed under MIT License with attribution requirements
+https://github.com/CodeQueenie/InspireSearch---AI_Powered_Visual_Search_Engine
+"""
+import os
+import glob
+from app.manifest import IndexManifest, file_hash
+
+def _record_all(manifest, paths):
+    for image_id, path in enumerate(paths):
+        manifest.record(path, image_id)
+
+def test_diff_finds_new_removed_and_changed_images(dataset):
+    paths = sorted(glob.glob(os.path.join(dataset, "*", "*.jpg")))
+    manifest = IndexManifest()
+    _record_all(manifest, paths[:-1])
+
+    with open(paths[0], "ab") as f:
+        f.write(b"changed")
+    to_embed, to_remove = manifest.diff(paths[1:])
+
+    assert sorted(to_embed) == sorted([paths[-1]])
+    assert to_remove == [paths[0]]
+
+def test_diff_rehashes_touched_files_without_reembedding(dataset):
+    paths = sorted(glob.glob(os.path.join(dataset, "*", "*.jpg")))
+    manifest = IndexManifest()
+    _record_all(manifest, paths)
+
+    stat = os.stat(paths[0])
+    os.utime(paths[0], (stat.st_atime, stat.st_mtime + 10))
+    to_embed, to_remove = manifest.diff(paths)
+
+    assert to_embed == [] and to_remove == []
+    assert manifest.entries[paths[0]]["mtime"] == os.stat(paths[0]).st_mtime
+    assert manifest.entries[paths[0]]["sha256"] == file_hash(paths[0])
+
+def test_changed_content_is_reembedded_under_a_new_entry(dataset):
+    paths = sorted(glob.glob(os.path.join(dataset, "*", "*.jpg")))
+    manifest = IndexManifest()
+    _record_all(manifest, paths)
+
+    with open(paths[3], "ab") as f:
+        f.write(b"x")
+    to_embed, to_remove = manifest.diff(paths)
+
+    assert to_embed == [paths[3]] and to_remove == [paths[3]]
+
+def test_failed_images_are_skipped_until_they_change(dataset, tmp_path):
+    paths = sorted(glob.glob(os.path.join(dataset, "*", "*.jpg")))
+    bad = os.path.join(dataset, "bad.jpg")
+    with open(bad, "wb") as f:
+        f.write(b"not an image")
+    manifest = IndexManifest()
+    _record_all(manifest, paths)
+    manifest.record_failure(bad, "cannot identify image file")
+
+    manifest_file = str(tmp_path / "manifest.json")
+    manifest.save(manifest_file)
+    manifest = IndexManifest.load(manifest_file)
+    assert manifest.diff(paths + [bad]) == ([], [])
+
+    with open(bad, "ab") as f:
+        f.write(b" still not")
+    assert manifest.diff(paths + [bad]) == ([bad], [])
+
+    manifest.record(bad, len(paths))
+    assert bad not in manifest.failed
+
+def test_failed_images_are_forgotten_once_gone(dataset):
+    bad = os.path.join(dataset, "bad.jpg")
+    with open(bad, "wb") as f:
+        f.write(b"not an image")
+    manifest = IndexManifest()
+    manifest.record_failure(bad, "cannot identify image file")
+    os.remove(bad)
+
+    assert manifest.diff_paths([bad]) == ([], [])
+    assert manifest.failed == {}
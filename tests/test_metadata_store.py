@@ -0,0 +1,59 @@
+"""
+InspireSearch - AI-Powered Visual Search Engine
+Tests for the memory-mapped metadata store
+
+Copyright (c) 2025 Nicole LeGuern
+Licensed under MIT License with attribution requirements
+https://github.com/CodeQueenie/InspireSearch---AI_Powered_Visual_Search_Engine
+"""
+import os
+import numpy as np
+from app.metadata_store import MetadataStore, FIELDS_FILE
+
+def test_metadata_store_round_trip(tmp_path):
+    paths = ["a/one.jpg", None, "b/three.jpg", "b/fünf.jpg"]
+    fields = {"size": [10, 0, 30, 40], "sha256": [b"ab" * 32, b"", b"cd" * 32, b""]}
+    MetadataStore.write(str(tmp_path), paths, fields, info={"index_config": {"type": "flat"}})
+
+    store = MetadataStore.open(str(tmp_path))
+    assert list(store) == paths
+    assert len(store) == 4
+    assert store.live_ids().tolist() == [0, 2, 3]
+    assert store.get_fields(2)["size"] == 30
+    assert store.field("sha256")[0] == b"ab" * 32
+    assert store.info["index_config"] == {"type": "flat"}
+
+    restored_paths, restored_fields = store.to_lists()
+    assert restored_paths == paths
+    assert restored_fields["size"] == [10, 0, 30, 40]
+
+def test_loaded_index_reads_paths_from_the_store(tmp_path, dataset, make_engine):
+    assert make_engine(tmp_path / "index", dataset).build_index()
+
+    engine = make_engine(tmp_path / "index", dataset)
+    assert engine.load_index()
+
+    assert isinstance(engine.image_paths, MetadataStore)
+    assert len(engine.image_paths) == 12
+    assert engine.get_image_info(0)["path"] == engine.image_paths[0]
+
+def test_stores_without_newer_fields_still_load(tmp_path, dataset, make_engine):
+    assert make_engine(tmp_path / "index", dataset).build_index()
+    # Rewrite the fields the way stores were saved before facets and offsets
+    fields_file = str(tmp_path / "index" / FIELDS_FILE)
+    fields = np.load(fields_file)
+    old = np.zeros(len(fields), dtype=[("size", "int64"), ("mtime", "float64")])
+    old["size"], old["mtime"] = fields["size"], fields["mtime"]
+    np.save(fields_file, old)
+
+    engine = make_engine(tmp_path / "index", dataset)
+    assert engine.load_index()
+
+    info = engine.get_image_info(3)
+    assert info["category"] == "" and info["date"] == 0.0 and info["size"] == fields["size"][3]
+    path, data = engine.read_image(3)
+    with open(path, "rb") as f:
+        assert data == f.read()
+    assert engine.content_digest(3) is None
+    query = os.path.join(dataset, "cats", "img_01.jpg")
+    assert engine.search(query, top_k=1)[0]["path"] == query
@@ -0,0 +1,74 @@
+"""
+InspireSearch - AI-Powered Visual Search Engine
+Tests for searching with several images or regions as one query
+
+Copyright (c) 2025 Nicole LeGuern
+Licensed under MIT License with attribution requirements
+https://github.com/CodeQueenie/InspireSearch---AI_Powered_Visual_Search_Engine
+"""
+import os
+import numpy as np
+import pytest
+from app.query_fusion import reciprocal_rank_fusion, combine_embeddings, RRF_K
+
+def _result(image_id, distance, score=None):
+    return {"id": image_id, "path": f"img_{image_id}.jpg", "distance": distance, "score": score}
+
+def test_reciprocal_rank_fusion_favours_images_found_by_several_queries():
+    first = [_result(1, 0.1, 90.0), _result(2, 0.2, 80.0)]
+    second = [_result(3, 0.05, 95.0), _result(2, 0.3, 70.0)]
+
+    fused = reciprocal_rank_fusion([first, second])
+
+    assert [r["id"] for r in fused] == [2, 3, 1]
+    assert fused[0]["fused_score"] == pytest.approx(1 / (RRF_K + 2) + 1 / (RRF_K + 2))
+    assert fused[0]["distance"] == 0.2
+    assert fused[0]["score"] == 80.0
+
+def test_reciprocal_rank_fusion_breaks_ties_by_distance():
+    fused = reciprocal_rank_fusion([[_result(1, 0.4)], [_result(2, 0.1)]])
+
+    assert [r["id"] for r in fused] == [2, 1]
+
+def test_combined_embedding_weighs_each_image_equally():
+    features = np.array([[3.0, 0.0], [0.0, 1.0]], dtype="float32")
+
+    combined = combine_embeddings(features)
+
+    assert combined.shape == (1, 2)
+    assert combined[0, 0] == pytest.approx(combined[0, 1])
+    assert np.linalg.norm(combined) == pytest.approx(2.0)
+
+@pytest.fixture
+def engine(tmp_path, dataset, make_engine):
+    engine = make_engine(tmp_path / "index", dataset)
+    assert engine.build_index()
+    return engine
+
+def test_rrf_query_finds_each_image(engine, dataset):
+    queries = [os.path.join(dataset, "dogs", "img_00.jpg"), os.path.join(dataset, "cats", "img_07.jpg")]
+
+    results = engine.search_multi(queries, top_k=4, combine="rrf")
+
+    assert len(results) == 4
+    assert {r["path"] for r in results[:2]} == set(queries)
+    assert all(r["fused_score"] > 0 for r in results)
+
+def test_mean_query_of_one_image_is_a_plain_search(engine, dataset):
+    query = os.path.join(dataset, "dogs", "img_04.jpg")
+
+    combined = engine.search_multi([query], top_k=3, combine="mean")
+
+    assert [r["path"] for r in combined] == [r["path"] for r in engine.search(query, top_k=3)]
+    with pytest.raises(ValueError):
+        engine.search_combined(np.ones((1, 2048), dtype="float32"), combine="max")
+
+def test_crop_box_limits_the_query_region(engine, dataset):
+    query = os.path.join(dataset, "dogs", "img_04.jpg")
+
+    whole = engine.load_query_image(query, box=(0, 0, 96, 64))
+    left = engine.load_query_image(query, box=(0, 0, 40, 64))
+
+    np.testing.assert_array_equal(whole, engine.load_query_image(query))
+    assert left.shape == whole.shape
+    assert not np.allclose(left, whole)
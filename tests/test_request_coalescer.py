@@ -0,0 +1,94 @@
+"""
+InspireSearch - AI-Powered Visual Search Engine
+Tests for query batching, backpressure and timeouts in the inference pool
+
+Copyright (c) 2025 Nicole LeGuern
+Licensed under MIT License with attribution requirements
+https://github.com/CodeQueenie/InspireSearch---AI_Powered_Visual_Search_Engine
+"""
+import threading
+import numpy as np
+import pytest
+from app.request_coalescer import QueryCoalescer, QueueFullError
+
+class _Engine:
+    """
+    Search engine whose model calls can be held up, recording batch sizes.
+    """
+
+    def __init__(self):
+        self.gate = threading.Event()
+        self.gate.set()
+        self.started = threading.Event()
+        self.calls = []
+
+    def extract_features_from_arrays(self, arrays):
+        self.started.set()
+        self.gate.wait(timeout=10)
+        self.calls.append(len(arrays))
+        return np.stack([np.full(4, a[0], dtype="float32") for a in arrays])
+
+    def search_batch(self, features, top_k, min_score=None, search_filter=None):
+        return [[{"id": int(f[0]), "path": str(int(f[0])), "distance": 0.0, "score": None}]
+                for f in features]
+
+    def duplicate_groups(self):
+        return {}
+
+@pytest.fixture
+def engine():
+    return _Engine()
+
+def _image(value):
+    return np.full(3, value, dtype="float32")
+
+def test_embed_keeps_a_request_in_one_model_call(engine):
+    coalescer = QueryCoalescer(engine, max_batch_size=4, max_wait_ms=1)
+
+    features = coalescer.embed([_image(i) for i in range(10)], timeout=5)
+
+    assert features[:, 0].tolist() == list(range(10))
+    assert engine.calls == [10]
+    coalescer.close()
+
+def test_concurrent_searches_share_a_batch(engine):
+    coalescer = QueryCoalescer(engine, max_batch_size=8, max_wait_ms=50)
+    futures = [coalescer.submit(image=_image(i), top_k=1) for i in range(5)]
+
+    assert [f.result(timeout=5)[1][0]["id"] for f in futures] == list(range(5))
+    assert engine.calls == [5]
+    coalescer.close()
+
+def test_full_queue_rejects_new_queries(engine):
+    coalescer = QueryCoalescer(engine, max_batch_size=1, max_wait_ms=0, max_queue=2)
+    engine.gate.clear()
+    running = coalescer.submit(image=_image(0))
+    assert engine.started.wait(timeout=5)
+    queued = [coalescer.submit(image=_image(i)) for i in (1, 2)]
+
+    with pytest.raises(QueueFullError):
+        coalescer.submit(image=_image(3))
+    # A request's images are accepted or rejected together
+    with pytest.raises(QueueFullError):
+        coalescer.embed([_image(4)])
+
+    engine.gate.set()
+    assert [f.result(timeout=5)[1][0]["id"] for f in [running] + queued] == [0, 1, 2]
+    stats = coalescer.stats()
+    assert stats["rejected"] == 2 and stats["queue_depth"] == 0
+    coalescer.close()
+
+def test_slow_queries_time_out_and_are_skipped(engine):
+    coalescer = QueryCoalescer(engine, max_batch_size=1, max_wait_ms=0)
+    engine.gate.clear()
+    coalescer.submit(image=_image(0))
+    assert engine.started.wait(timeout=5)
+
+    with pytest.raises(QueueFullError):
+        coalescer.search(image=_image(1), timeout=0.05)
+
+    engine.gate.set()
+    coalescer.close()
+    assert coalescer.stats()["timed_out"] == 1
+    # The abandoned query never reached the model
+    assert engine.calls == [1]
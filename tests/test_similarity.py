@@ -0,0 +1,68 @@
+"""
+InspireSearch - AI-Powered Visual Search Engine
+Tests for cosine scores, score cutoffs and range search
+
+Copyright (c) 2025 Nicole LeGuern
+Licensed under MIT License with attribution requirements
+https://github.com/CodeQueenie/InspireSearch---AI_Powered_Visual_Search_Engine
+"""
+import os
+import glob
+import numpy as np
+import pytest
+from app.utils import similarity_scores
+
+@pytest.fixture
+def indexed(tmp_path, dataset, make_engine):
+    """
+    Engine with a cosine Flat index, and the exact cosine similarity of
+    the first image to every image.
+    """
+    engine = make_engine(tmp_path / "index", dataset)
+    assert engine.build_index()
+    paths, features = engine.extract_features_batch(sorted(glob.glob(os.path.join(dataset, "*", "*.jpg"))))
+    normalised = features / np.linalg.norm(features, axis=1, keepdims=True)
+    cosines = dict(zip(paths, normalised @ normalised[0]))
+    return engine, features[0], cosines
+
+def test_results_carry_absolute_cosine_scores(indexed):
+    engine, query, cosines = indexed
+
+    results = engine.search_by_features(query, top_k=5)
+
+    for result in results:
+        assert result["score"] == pytest.approx(cosines[result["path"]], abs=1e-4)
+        assert result["distance"] == pytest.approx(1.0 - result["score"])
+    assert results[0]["score"] == pytest.approx(1.0, abs=1e-4)
+    assert similarity_scores(results)[0] == 100.0
+
+def test_min_score_cuts_off_weaker_results(indexed):
+    engine, query, cosines = indexed
+    threshold = float(np.median(list(cosines.values())))
+
+    results = engine.search_by_features(query, top_k=12, min_score=threshold)
+
+    assert {r["path"] for r in results} == {p for p, c in cosines.items() if c >= threshold}
+
+def test_range_search_returns_every_match_above_the_threshold(indexed):
+    engine, query, cosines = indexed
+    threshold = float(np.percentile(list(cosines.values()), 25))
+
+    results = engine.range_search_batch(np.array([query]), threshold)[0]
+
+    assert {r["path"] for r in results} == {p for p, c in cosines.items() if c >= threshold}
+    scores = [r["score"] for r in results]
+    assert scores == sorted(scores, reverse=True)
+    assert len(engine.range_search_batch(np.array([query]), threshold, max_results=3)[0]) == 3
+
+def test_l2_indexes_ignore_min_score(tmp_path, dataset, make_engine):
+    engine = make_engine(tmp_path / "index", dataset, index_params={"metric": "l2"})
+    assert engine.build_index()
+    query = os.path.join(dataset, "dogs", "img_00.jpg")
+
+    results = engine.search(query, top_k=4, min_score=0.99)
+
+    assert len(results) == 4
+    assert all(r["score"] is None for r in results)
+    # Range search needs absolute scores
+    assert engine.range_search_batch(np.array([engine.extract_features(query)]), 0.5) == [[]]